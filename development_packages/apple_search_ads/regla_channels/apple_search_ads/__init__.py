@@ -1 +1,2 @@
-from .apple_search_ads_channel import AppleSearchAdsChannel as Channel
\ No newline at end of file
+from .apple_search_ads_channel import AppleSearchAdsChannel as Channel
+from .apple_search_ads_session import AppleSearchAdsSession as Session
\ No newline at end of file
@@ -1,4 +1,9 @@
+import contextlib
+
+from ..apple_search_ads_session import AppleSearchAdsSessionAPI
 from regla import RuleAction
 
 class SearchAdsAction(RuleAction):
-  pass
\ No newline at end of file
+  def session(self, api: any):
+    # heathcliff models update entities outside the API object, so actions activate its session themselves
+    return api.session if isinstance(api, AppleSearchAdsSessionAPI) else contextlib.nullcontext()
@@ -7,7 +7,8 @@ import pdb
 class SearchAdsBidAction(SearchAdsAction):
     def adjust(self, api, campaign, report, dryRun=False):
         bidManager = BidManager(campaign=campaign, keywordData=report, adjustmentMultiplier=self.adjustmentValue, limit=self.adjustmentLimit)
-        result = bidManager.adjustBids(dryRun=dryRun)
+        with self.session(api):
+            result = bidManager.adjustBids(dryRun=dryRun)
 
         return result
 
@@ -10,7 +10,8 @@ class SearchAdsCPAGoalAction(SearchAdsAction):
             adjustmentMultiplier=self.adjustmentValue,
             limit=self.adjustmentLimit
         )
-        result = goalManager.adjustGoal(dryRun=dryRun)
+        with self.session(api):
+            result = goalManager.adjustGoal(dryRun=dryRun)
         return result
 
 class CPAGoalManager(object):
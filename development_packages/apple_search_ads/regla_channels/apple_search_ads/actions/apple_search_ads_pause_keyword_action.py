@@ -6,7 +6,8 @@ from regla import RuleActionResult, RuleActionLog, RuleActionTargetType
 class SearchAdsPauseKeywordAction(SearchAdsAction):
     def adjust(self, api, campaign, report, dryRun=False):
         pauseKeywordManager = PauseKeywordManager(campaign=campaign, keywordData=report)
-        result = pauseKeywordManager.pauseKeywords(dryRun=dryRun)
+        with self.session(api):
+            result = pauseKeywordManager.pauseKeywords(dryRun=dryRun)
 
         return result
 
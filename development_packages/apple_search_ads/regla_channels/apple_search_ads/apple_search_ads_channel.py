@@ -1,19 +1,17 @@
-import os
 import pandas as pd
 
 from .apple_search_ads_reporter import SearchAdsReporter
+from .apple_search_ads_session import AppleSearchAdsSession, AppleSearchAdsSessionAPI
 from .actions import SearchAdsBidAction, SearchAdsPauseKeywordAction, SearchAdsCPAGoalAction, SearchAdsNoAction
 
 from regla import Channel, ChannelEntity, RuleAction, RuleActionType, RuleReportType, RuleReporter, RuleReportGranularity, Rule, RuleContext
-from heathcliff import AppleSearchAdsCertificate
 from heathcliff.mutating import SearchAdsAccount, SearchAds
 from bson import ObjectId
 from datetime import datetime
 from typing import Optional, List, Dict
 
 class AppleSearchAdsChannel(Channel[SearchAds, any]):
-  certificate: Optional[AppleSearchAdsCertificate]=None
-  parent_environ: Optional[Dict[str, any]]=None
+  session: Optional[AppleSearchAdsSession]=None
 
   @property
   def identifier(self) -> str:
@@ -23,24 +21,20 @@ class AppleSearchAdsChannel(Channel[SearchAds, any]):
   def title(self) -> str:
     return 'Apple'
 
+  @property
+  def concurrency_limit(self) -> Optional[int]:
+    # heathcliff only reads the certificate paths from the process environment, so rules cannot overlap
+    return 1
+
   def connect(self, credentials: Dict[str, any]):
-    self.certificate = AppleSearchAdsCertificate(certificate=credentials)
-    self.certificate.connect()
-    self.parent_environ = dict(os.environ)
-    certs = {
-      'SEARCH-ADS-PEM': self.certificate.pem_path,
-      'SEARCH-ADS-KEY': self.certificate.key_path,
-    }
-    os.environ.update(certs)
-    self.api = SearchAds(org_name=self.certificate.org_name)
+    self.session = AppleSearchAdsSession.session(credentials=credentials)
+    with self.session:
+      # the session is activated around each API call rather than while connected
+      self.api = AppleSearchAdsSessionAPI(api=SearchAds(org_name=self.session.org_name), session=self.session)
   
   def disconnect(self):
     super().disconnect()
-    os.environ.clear()
-    os.environ.update(self.parent_environ)
-    self.parent_environ = None
-    self.certificate.disconnect()
-    self.certificate = None
+    self.session = None
 
   def rule_context(self, options: Dict[str, any]={}) -> any:
     rule: Rule = options[RuleContext.rule.value]
@@ -105,13 +99,14 @@ class AppleSearchAdsChannel(Channel[SearchAds, any]):
   
   def get_entities(self, entity_type: ChannelEntity, parent_ids: Dict[ChannelEntity, str]={}) -> List[Dict[str, any]]:
     if entity_type is ChannelEntity.org:
-      account = SearchAdsAccount()
       orgs = []
-      for api in account.apis:
-        orgs.append({
-          'id' : int(api.org_id),
-          'name' : api.org_name,
-        })
+      with self.session:
+        account = SearchAdsAccount()
+        for api in account.apis:
+          orgs.append({
+            'id' : int(api.org_id),
+            'name' : api.org_name,
+          })
       return orgs
     elif entity_type is ChannelEntity.campaign:
       self.api.org_id = int(parent_ids[ChannelEntity.org])
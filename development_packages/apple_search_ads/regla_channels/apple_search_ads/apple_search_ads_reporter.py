@@ -2,6 +2,7 @@ import pandas as pd
 
 from time import sleep
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 from moda import log
 from regla import RuleReporter, RuleReportType, RuleReportGranularity
 
@@ -16,6 +17,34 @@ class SearchAdsReporter(RuleReporter):
     else:
       raise ValueError('Unsupported search ads report type', self.reportType)
 
+  @property
+  def raw_report_entity_columns(self) -> Optional[List[str]]:
+    if self.reportType is RuleReportType.searchTerm:
+      return None
+    return super().raw_report_entity_columns
+
+  @property
+  def raw_report_metric_columns(self) -> List[str]:
+    return [
+      'impressions',
+      'taps',
+      'installs',
+      'newDownloads',
+      'redownloads',
+      'latOnInstalls',
+      'latOffInstalls',
+      'localSpend',
+    ]
+
+  @property
+  def raw_report_ratio_columns(self) -> Dict[str, Tuple[str, str]]:
+    return {
+      'avgCPA': ('localSpend', 'installs'),
+      'avgCPT': ('localSpend', 'taps'),
+      'ttr': ('taps', 'impressions'),
+      'conversionRate': ('installs', 'taps'),
+    }
+
   def _getRawReport(self, startDate, endDate, granularity, api, campaign, adGroupIDs):
     tries = 3
     while True:
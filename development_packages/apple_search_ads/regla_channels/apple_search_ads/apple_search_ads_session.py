@@ -0,0 +1,116 @@
+from __future__ import annotations
+import os
+import json
+import hashlib
+import functools
+import threading
+
+from heathcliff import AppleSearchAdsCertificate
+from heathcliff.mutating import SearchAds
+from typing import Optional, Dict
+
+class AppleSearchAdsSession:
+  sessions: Dict[str, AppleSearchAdsSession] = {}
+  sessions_lock = threading.Lock()
+  environment_condition = threading.Condition()
+  active_session: Optional[AppleSearchAdsSession] = None
+  active_count: int = 0
+  parent_environ: Dict[str, Optional[str]] = {}
+
+  fingerprint: str
+  certificate: AppleSearchAdsCertificate
+
+  def __init__(self, fingerprint: str, certificate: AppleSearchAdsCertificate):
+    self.fingerprint = fingerprint
+    self.certificate = certificate
+
+  @classmethod
+  def credentials_fingerprint(cls, credentials: Dict[str, any]) -> str:
+    return hashlib.sha256(json.dumps(credentials, sort_keys=True, default=str).encode()).hexdigest()
+
+  @classmethod
+  def session(cls, credentials: Dict[str, any]) -> AppleSearchAdsSession:
+    fingerprint = cls.credentials_fingerprint(credentials=credentials)
+    with cls.sessions_lock:
+      if fingerprint not in cls.sessions:
+        certificate = AppleSearchAdsCertificate(certificate=credentials)
+        certificate.connect()
+        cls.sessions[fingerprint] = cls(fingerprint=fingerprint, certificate=certificate)
+      return cls.sessions[fingerprint]
+
+  @classmethod
+  def close_sessions(cls):
+    with cls.sessions_lock:
+      with cls.environment_condition:
+        assert cls.active_session is None, 'Cannot close Apple Search Ads sessions while a session is active'
+        for session in cls.sessions.values():
+          session.certificate.disconnect()
+        cls.sessions = {}
+
+  @property
+  def org_name(self) -> str:
+    return self.certificate.org_name
+
+  @property
+  def environ(self) -> Dict[str, str]:
+    return {
+      'SEARCH-ADS-PEM': self.certificate.pem_path,
+      'SEARCH-ADS-KEY': self.certificate.key_path,
+    }
+
+  def __enter__(self):
+    self.activate()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.deactivate()
+
+  def activate(self):
+    # heathcliff reads the certificate paths from the environment, so sessions for the same certificate share it while sessions for other certificates wait
+    # sessions are only active around API calls, so a waiting session never waits on a connected but idle channel
+    cls = self.__class__
+    with cls.environment_condition:
+      while cls.active_session is not None and cls.active_session is not self:
+        cls.environment_condition.wait()
+      if cls.active_session is None:
+        cls.parent_environ = {k: os.environ.get(k) for k in self.environ}
+        os.environ.update(self.environ)
+        cls.active_session = self
+      cls.active_count += 1
+
+  def deactivate(self):
+    cls = self.__class__
+    with cls.environment_condition:
+      assert cls.active_session is self, 'Apple Search Ads session is not active'
+      cls.active_count -= 1
+      if cls.active_count:
+        return
+      for key, value in cls.parent_environ.items():
+        if value is None:
+          os.environ.pop(key, None)
+        else:
+          os.environ[key] = value
+      cls.parent_environ = {}
+      cls.active_session = None
+      cls.environment_condition.notify_all()
+
+class AppleSearchAdsSessionAPI:
+  api: SearchAds
+  session: AppleSearchAdsSession
+
+  def __init__(self, api: SearchAds, session: AppleSearchAdsSession):
+    object.__setattr__(self, 'api', api)
+    object.__setattr__(self, 'session', session)
+
+  def __getattr__(self, name: str) -> any:
+    value = getattr(self.api, name)
+    if not callable(value):
+      return value
+    @functools.wraps(value)
+    def call(*args, **kwargs):
+      with self.session:
+        return value(*args, **kwargs)
+    return call
+
+  def __setattr__(self, name: str, value: any):
+    setattr(self.api, name, value)
@@ -1,3 +1,4 @@
+import os
 import pandas as pd
 import pytest
 
@@ -6,6 +7,7 @@ from typing import Dict, List
 from unittest import mock
 from ..apple_search_ads_channel import AppleSearchAdsChannel
 from ..apple_search_ads_reporter import SearchAdsReporter
+from ..apple_search_ads_session import AppleSearchAdsSession
 from ..actions import SearchAdsBidAction, SearchAdsCPAGoalAction, SearchAdsPauseKeywordAction, SearchAdsNoAction
 from regla import ChannelEntity, RuleActionType, RuleReportType, RuleReportGranularity, Rule
 from heathcliff.models import Campaign, AdGroup 
@@ -43,6 +45,9 @@ def search_ads_account(credentials: Dict[str, any]) -> SearchAdsAccount:
 def test_identifier(channel: AppleSearchAdsChannel):
   assert channel.identifier == 'apple_search_ads'
 
+def test_concurrency_limit(channel: AppleSearchAdsChannel):
+  assert channel.concurrency_limit == 1
+
 class TestRuleContext:
   def test_rule_context_campaign_mismatch(self, channel: AppleSearchAdsChannel, credentials: Dict[str, any]):
     with channel.connected(credentials=credentials):
@@ -402,3 +407,34 @@ class TestGranularityIsCompatible:
   def test(self, output, label, input, channel: AppleSearchAdsChannel):
     assert label and output is channel.granularity_is_compatible(**input)
 
+class TestSession:
+  @pytest.fixture(autouse=True)
+  def certificate(self):
+    def certificate_side_effect(certificate: Dict[str, any]):
+      return mock.Mock(org_name=certificate['org_name'], pem_path=f'{certificate["org_name"]}.pem', key_path=f'{certificate["org_name"]}.key')
+    with mock.patch('regla_channels.apple_search_ads.apple_search_ads_session.AppleSearchAdsCertificate', side_effect=certificate_side_effect) as certificate:
+      AppleSearchAdsSession.sessions = {}
+      yield certificate
+      AppleSearchAdsSession.close_sessions()
+
+  def test_session_reuse(self, certificate: mock.Mock, credentials: Dict[str, any]):
+    assert AppleSearchAdsSession.session(credentials=credentials) is AppleSearchAdsSession.session(credentials=dict(credentials))
+    assert certificate.call_count == 1
+
+  def test_session_environ(self, credentials: Dict[str, any]):
+    environ = dict(os.environ)
+    first = AppleSearchAdsChannel()
+    second = AppleSearchAdsChannel()
+    other = AppleSearchAdsChannel()
+    first.connect(credentials=credentials)
+    second.connect(credentials=credentials)
+    other.connect(credentials={**credentials, 'org_name': 'other'})
+    assert first.session is second.session
+    assert dict(os.environ) == environ
+    with mock.patch.object(SearchAds, 'get_campaigns', side_effect=lambda **kwargs: os.environ['SEARCH-ADS-PEM']):
+      assert first.api.get_campaigns() == first.session.certificate.pem_path
+      assert other.api.get_campaigns() == other.session.certificate.pem_path
+    assert dict(os.environ) == environ
+    first.disconnect()
+    second.disconnect()
+    other.disconnect()
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 from regla import RuleAction, RuleActionResult, RuleActionLog, RuleActionTargetType, RuleActionPreference, RuleActionReportColumn, RuleReportColumn, RuleContext, RuleMultiplierAction, RuleNoAction, RuleActionAdjustmentType
@@ -41,6 +42,17 @@ class GoogleAdsAction(RuleAction):
   def preferences_title(self) -> str:
     return 'UAC best practices'
 
+  @property
+  def history_fields(self) -> Optional[List[str]]:
+    return ['adjustmentType', 'ruleID', 'ruleDescription']
+
+  def history_lookback(self, context: any) -> Optional[timedelta]:
+    wait_days = context[RuleContext.rule_options.value][GoogleAdsOption.wait_days.value]
+    if wait_days <= 0:
+      return timedelta()
+    # wait metrics are counted from the start of the hour
+    return timedelta(days=wait_days, hours=1)
+
   def get_raw_action_report(self, entity_ids: List[str], api: GoogleAdsAPI, report: pd.DataFrame, context: any) -> pd.DataFrame:
     reporter = GoogleAdsReporter(api=api)
     action_report = reporter.get_safety_report(
@@ -147,12 +159,18 @@ class GoogleAdsPauseCampaignAction(GoogleAdsCampaignAction):
   def entity_adjustment(self, entity_series: str, context: any) -> any:
     return None if entity_series[RuleActionReportColumn.unadjusted_state.value] == 'PAUSED' else 'PAUSED'
 
+  def entities_adjustment(self, location: pd.DataFrame, context: any) -> Optional[pd.Series]:
+    return self.entities_column(location=location, values=np.where(location[RuleActionReportColumn.unadjusted_state.value] == 'PAUSED', None, 'PAUSED'))
+
   def action_description(self, entity_series: str, context: any) -> str:
     return 'paused campaign'
 
   def entity_request(self, entity_series: pd.Series, api: GoogleAdsAPI, context: any) -> Optional[any]:
     return True
 
+  def entities_request(self, location: pd.DataFrame, api: GoogleAdsAPI, context: any) -> Optional[pd.Series]:
+    return self.entities_column(location=location, values=True)
+
   def mutate_entity(self, entity_series: pd.Series, api: GoogleAdsAPI, context: any) -> Optional[any]:
     mutator = GoogleAdsCampaignPauseMutator(
       api=api,
@@ -167,6 +185,13 @@ class GoogleAdsCampaignMultiplierAction(GoogleAdsCampaignAction, RuleMultiplierA
   def relative_adjustment_limit(self) -> float:
     return 0.2
 
+  @property
+  def history_fields(self) -> Optional[List[str]]:
+    return [*super().history_fields, 'adjustmentFrom']
+
+  def history_lookback(self, context: any) -> Optional[timedelta]:
+    return max(super().history_lookback(context=context), timedelta(days=1))
+
   def supplement_action_report(self, action_report: pd.DataFrame, api: GoogleAdsAPI, context: any) -> pd.DataFrame:
     action_report = super().supplement_action_report(
       action_report=action_report,
@@ -198,7 +223,7 @@ class GoogleAdsCampaignMultiplierAction(GoogleAdsCampaignAction, RuleMultiplierA
       relative_adjustment = entity_series[RuleActionReportColumn.adjustment.value] / entity_series[RuleActionReportColumn.prehistoric_state.value]
       # if the current state is already adjusted at least to the limit, and we would adjust in the same direction
       if abs(current_relative_adjustment - 1) >= self.relative_adjustment_limit and (current_relative_adjustment - 1) * (relative_adjustment - 1) > 0:
-        entity_series[RuleActionReportColumn.preference.value] = RuleActionPreference.prevent_adjustment
+        entity_series[RuleActionReportColumn.preference.value] = RuleActionPreference.prevent_adjustment.code
         entity_series[RuleActionReportColumn.preference_messages.value].append(f'Limit 1 day adjustment to {self.relative_adjustment_limit :0.0%}% of {entity_series[RuleActionReportColumn.prehistoric_state.value] :0.2f} (already {abs(current_relative_adjustment - 1) :0.0%} at {entity_series[RuleActionReportColumn.unadjusted_state.value] :0.2f})')
         return
       if abs(relative_adjustment - 1) > self.relative_adjustment_limit:
@@ -228,9 +253,23 @@ class GoogleAdsCampaignMultiplierAction(GoogleAdsCampaignAction, RuleMultiplierA
       return None
     return adjustment
 
+  def entities_adjustment(self, location: pd.DataFrame, context: any) -> Optional[pd.Series]:
+    adjustments = super().entities_adjustment(
+      location=location,
+      context=context
+    )
+    if adjustments is None:
+      return None
+    adjusted = adjustments.dropna().astype(float)
+    unchanged = (adjusted * 1000000).astype(int) == (location.loc[adjusted.index, RuleActionReportColumn.unadjusted_state.value].astype(float) * 1000000).astype(int)
+    return self.entities_column(location=location, values=np.where(location.index.isin(unchanged.index[unchanged]), None, adjustments))
+
   def entity_request(self, entity_series: pd.Series, api: GoogleAdsAPI, context: any) -> Optional[any]:
     return True
 
+  def entities_request(self, location: pd.DataFrame, api: GoogleAdsAPI, context: any) -> Optional[pd.Series]:
+    return self.entities_column(location=location, values=True)
+
 class GoogleAdsTargetCPACampaignAction(GoogleAdsCampaignMultiplierAction):
   @property
   def adjustment_type(self) -> RuleActionAdjustmentType:
@@ -299,3 +338,6 @@ class GoogleAdsCampaignBudgetAction(GoogleAdsCampaignMultiplierAction):
 class GoogleAdsNoAction(GoogleAdsCampaignAction, RuleNoAction):
   def entity_adjustment(self, entity_series: pd.Series, context: any) -> Optional[any]:
     return None
+
+  def entities_adjustment(self, location: pd.DataFrame, context: any) -> Optional[pd.Series]:
+    return self.entities_column(location=location, values=None)
@@ -30,6 +30,8 @@ class GoogleAdsChannel(Channel[GoogleAdsAPI, Dict[str, any]]):
         RuleContext.rule,
         RuleContext.rule_collection,
         RuleContext.history_collection,
+        RuleContext.mutation_coalescer,
+        RuleContext.mutation_journal,
       ]},
       RuleContext.rule_options.value: {
         **RuleOption.get_defaults(),
@@ -2,7 +2,7 @@ import pandas as pd
 
 from regla import RuleReportColumn, RuleReporter, RuleReportType, RuleContext, RuleOption
 from hazel import GoogleAdsReporter as HazelReporter
-from typing import Dict
+from typing import Dict, Optional, Tuple
 from .google_ads_context import GoogleAdsContext, GoogleAdsOption, add_report_time
 
 class GoogleAdsReporter(RuleReporter):
@@ -41,6 +41,19 @@ class GoogleAdsReporter(RuleReporter):
       location = report.loc[report.campaign_selective_optimization_conversion_actions.notna()]
       report.loc[location.index, RuleReportColumn.conversions.value] = location.selected_conversions
 
+  def raw_report_dates(self, rawReport: pd.DataFrame) -> Optional[pd.Series]:
+    # account time zone dates, matching the dates the report is requested with
+    columns = {c.replace('#', '_'): c for c in rawReport.columns}
+    if 'segments_date' not in columns:
+      return None
+    dates = pd.to_datetime(rawReport[columns['segments_date']])
+    if 'segments_hour' in columns:
+      dates = dates + pd.to_timedelta(rawReport[columns['segments_hour']].astype(int), unit='h')
+    return dates
+
+  def raw_report_options(self, campaign) -> Tuple:
+    return (campaign[RuleContext.rule_options.value][GoogleAdsOption.use_optimized_conversions.value],)
+
   def _getRawReport(self, startDate, endDate, granularity, api, campaign, adGroupIDs):
     reporter = HazelReporter(api=api)
     report = reporter.get_performance_report(
@@ -60,10 +73,11 @@ class GoogleAdsReporter(RuleReporter):
       )
     return report
 
-  def _filterByLastActionDate(self, report, historyCollection):
+  def _lastActionDateMask(self, report, mask, historyCollection):
     if not self.context[RuleContext.rule_options.value][RuleOption.dynamic_window.value]:
-      return
-    return super()._filterByLastActionDate(
+      return None
+    return super()._lastActionDateMask(
       report=report,
+      mask=mask,
       historyCollection=historyCollection
     )
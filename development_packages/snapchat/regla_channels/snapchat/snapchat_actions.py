@@ -1,7 +1,7 @@
 import pandas as pd
 
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timedelta
 from regla import RuleContext, RuleAction, RulePauseAction, RuleActionTargetType, RuleNoAction, RuleReportGranularity, RuleActionReportColumn, RuleMultiplierAction, RuleActionAdjustmentType, RuleActionPreference
 from azrael import SnapchatAPI, SnapchatCampaignPauseMutator, SnapchatCampaignBudgetMutator
 from .snapchat_reporters import SnapchatRawCampaignReporter
@@ -20,6 +20,13 @@ class SnapchatAction(RuleAction):
   def preferences_title(self) -> str:
     return 'Snapchat requirements'
 
+  @property
+  def history_fields(self) -> Optional[List[str]]:
+    return []
+
+  def history_lookback(self, context: any) -> Optional[timedelta]:
+    return timedelta()
+
 class SnapchatCampaignAction(SnapchatAction):
   @property
   def entity_granularity(self) -> RuleActionTargetType:
@@ -49,10 +56,16 @@ class SnapchatCampaignAction(SnapchatAction):
   def entity_request(self, entity_series: pd.Series, api: SnapchatAPI, context: any) -> Optional[any]:
     return True
 
+  def entities_request(self, location: pd.DataFrame, api: SnapchatAPI, context: any) -> Optional[pd.Series]:
+    return self.entities_column(location=location, values=True)
+
 class SnapchatCampaignNoAction(SnapchatCampaignAction, RuleNoAction):
   def entity_request(self, entity_series: pd.Series, api: SnapchatAPI, context: any) -> Optional[any]:
     return None
 
+  def entities_request(self, location: pd.DataFrame, api: SnapchatAPI, context: any) -> Optional[pd.Series]:
+    return self.entities_column(location=location, values=None)
+
 class SnapchatPauseCampaignAction(SnapchatCampaignAction, RulePauseAction):
   @property
   def raw_columns(self) -> List[str]:
@@ -120,7 +133,7 @@ class SnapchatCampaignBudgetAction(SnapchatCampaignAction, RuleMultiplierAction)
       if adjustment >= minimum_budget:
         return
       if unadjusted <= minimum_budget:
-        entity_series[RuleActionReportColumn.preference.value] = RuleActionPreference.prevent_adjustment
+        entity_series[RuleActionReportColumn.preference.value] = RuleActionPreference.prevent_adjustment.code
         entity_series[RuleActionReportColumn.preference_messages.value].append(f'Snapchat does not support campaign budgets of less than {minimum_budget :0.2f} (already at {unadjusted :0.2f})')
       else:
         entity_series[RuleActionReportColumn.preferred_adjustment.value] = minimum_budget
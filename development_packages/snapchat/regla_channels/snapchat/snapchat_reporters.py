@@ -42,6 +42,11 @@ class SnapchatReporter(MapReporter):
       column_map[RuleReportColumn.ad_group_id] = 'adsquad_id'
     return column_map
 
+  def raw_report_dates(self, rawReport: pd.DataFrame) -> Optional[pd.Series]:
+    if 'start_time' not in rawReport.columns:
+      return None
+    return convert_time_series_to_utc(rawReport['start_time'])
+
   def _map_rule_columns(self, report: pd.DataFrame):
     report[RuleReportColumn.conversions.value] = None
     report[RuleReportColumn.date.value] = convert_time_series_to_utc(report['start_time'])
@@ -1,11 +1,19 @@
 from .models.context_models import RuleContext, RuleContextOption, RuleOption
-from .models.channel_models import Channel, ChannelEntity
-from .models.report_models import RuleReportColumn, RuleReporter, RuleReportType, RuleReportGranularity
+from .models.channel_models import Channel, ChannelEntity, ChannelOption
+from .models.rate_limit_models import RuleRateLimiter
+from .models.report_models import RuleReportColumn, RuleReporter, RuleReportType, RuleReportGranularity, RuleRawReportStore, RuleIncrementalRawReportStore
+from .models.report_cache_models import RuleRawReportCache
 from .models.action_types import RuleActionType
 from .models.action_models import RuleAction, RuleActionTargetType, RuleActionResult, RuleActionLog, RuleActionPreference, RuleActionReportColumn, RuleMultiplierAction, RuleNoAction, RulePauseAction, RuleActionAdjustmentType
 from .models.rule_model import Rule
+from .models.runner_models import RuleRunner, RuleRunResult
+from .models.batch_models import RuleBatchExecutor
+from .models.mutation_models import RuleMutationCoalescer, RuleCoalescedMutation
+from .models.journal_models import RuleMutationJournal, RuleJournalEntry, RuleJournalStatus
+from .models.history_models import RuleHistorySink
+from .models.monitor_models import RuleMonitorFormat
 from .models.condition_models import RuleKPI
 from .models.rule_serializer import RuleSerializer
 from .models.map_report_models import MapReporter, RawReporter
-from .factories import channel_factory
+from .factories import channel_factory, ChannelPool
 from . import errors
\ No newline at end of file
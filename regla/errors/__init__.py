@@ -1 +1 @@
-from .error import RuleError, RuleActionError, RuleActionMissingTargetError, RuleActionEntityError
\ No newline at end of file
+from .error import RuleError, RuleActionError, RuleActionMissingTargetError, RuleActionEntityError, RuleReportError, RuleReporterError, RuleReportersError
\ No newline at end of file
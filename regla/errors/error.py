@@ -1,3 +1,5 @@
+from typing import List
+
 class RuleError(Exception):
   pass
 
@@ -10,4 +12,23 @@ class RuleActionMissingTargetError(RuleActionError):
 
 class RuleActionEntityError(RuleActionError):
   def __init__(self, target_id: str, error: Exception, traceback: str):
-    super().__init__(f'Action entity error for target ID {target_id} error:\n{repr(error)}\ntraceback:\n{traceback}')
\ No newline at end of file
+    super().__init__(f'Action entity error for target ID {target_id} error:\n{repr(error)}\ntraceback:\n{traceback}')
+
+class RuleReportError(RuleError):
+  pass
+
+class RuleReporterError(RuleReportError):
+  report_type: str
+  error: Exception
+
+  def __init__(self, report_type: str, error: Exception, traceback: str):
+    self.report_type = report_type
+    self.error = error
+    super().__init__(f'Reporter error for report type {report_type} error:\n{repr(error)}\ntraceback:\n{traceback}')
+
+class RuleReportersError(RuleReportError):
+  errors: List[RuleReporterError]
+
+  def __init__(self, errors: List[RuleReporterError]):
+    self.errors = errors
+    super().__init__('\n\n'.join(str(e) for e in errors))
@@ -1 +1,2 @@
-from .channel_factory import channel_factory
\ No newline at end of file
+from .channel_factory import channel_factory
+from .channel_pool import ChannelPool
\ No newline at end of file
@@ -0,0 +1,87 @@
+import json
+import hashlib
+import threading
+
+from time import monotonic
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from ..models.channel_models import Channel
+from .channel_factory import channel_factory
+
+class ChannelPool:
+  max_size: int
+  idle_timeout: Optional[float]
+  idle_channels: OrderedDict
+  channel_keys: Dict[int, Tuple[str, str, str]]
+  lock: threading.Lock
+
+  def __init__(self, max_size: int=32, idle_timeout: Optional[float]=600):
+    self.max_size = max_size
+    self.idle_timeout = idle_timeout
+    # (key, channel id) → (channel, release time), least recently released first
+    self.idle_channels = OrderedDict()
+    self.channel_keys = {}
+    self.lock = threading.Lock()
+
+  @classmethod
+  def credentials_fingerprint(cls, credentials: any) -> str:
+    return hashlib.sha256(json.dumps(credentials, sort_keys=True, default=str).encode()).hexdigest()
+
+  def channel_key(self, channel_identifier: str, credentials: any, options: Dict[str, any]={}) -> Tuple[str, str, str]:
+    return (channel_identifier, self.credentials_fingerprint(credentials=credentials), self.credentials_fingerprint(credentials=options))
+
+  def acquire(self, channel_identifier: str, credentials: any, options: Dict[str, any]={}) -> Channel:
+    key = self.channel_key(channel_identifier=channel_identifier, credentials=credentials, options=options)
+    self.evict_idle()
+    channel = None
+    with self.lock:
+      for idle_key in reversed(self.idle_channels):
+        if idle_key[0] == key:
+          channel, _ = self.idle_channels.pop(idle_key)
+          break
+    if channel is not None:
+      channel.resume()
+      return channel
+
+    channel = channel_factory(channel_identifier=channel_identifier, options=options)
+    channel.connect(credentials=credentials)
+    with self.lock:
+      self.channel_keys[id(channel)] = key
+    return channel
+
+  def release(self, channel: Channel):
+    with self.lock:
+      key = self.channel_keys[id(channel)]
+    channel.suspend()
+    evicted = []
+    with self.lock:
+      self.idle_channels[(key, id(channel))] = (channel, monotonic())
+      while len(self.idle_channels) > self.max_size:
+        evicted.append(self._pop_idle_channel())
+    self._disconnect(channels=evicted)
+
+  def evict_idle(self):
+    if self.idle_timeout is None:
+      return
+    evicted = []
+    with self.lock:
+      expiration = monotonic() - self.idle_timeout
+      while self.idle_channels and next(iter(self.idle_channels.values()))[1] < expiration:
+        evicted.append(self._pop_idle_channel())
+    self._disconnect(channels=evicted)
+
+  def close(self):
+    evicted = []
+    with self.lock:
+      while self.idle_channels:
+        evicted.append(self._pop_idle_channel())
+    self._disconnect(channels=evicted)
+
+  def _pop_idle_channel(self) -> Channel:
+    _, (channel, _) = self.idle_channels.popitem(last=False)
+    del self.channel_keys[id(channel)]
+    return channel
+
+  def _disconnect(self, channels: List[Channel]):
+    for channel in channels:
+      channel.disconnect()
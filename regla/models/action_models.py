@@ -1,13 +1,17 @@
 import json
 import bson
+import numbers
 import traceback
+import numpy as np
 import pandas as pd
 
 from enum import Enum
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Callable
 from functools import total_ordering
 from .context_models import RuleContext, RuleOption
+from .rate_limit_models import RuleRateLimiter
 from .report_models import RuleReportColumn
 from .action_types import RuleActionType
 from ..errors import RuleActionMissingTargetError, RuleActionEntityError
@@ -30,7 +34,7 @@ class RuleActionResult:
     def serialize_result(self):
         return {
             "report": self.report.to_csv() if self.report is not None and not self.report.empty else "",
-            "action_report": self.action_report.to_csv() if self.action_report is not None and not self.action_report.empty else "",
+            "action_report": self.action_report.assign(**{RuleActionReportColumn.preference.value: self.action_report[RuleActionReportColumn.preference.value].map(lambda c: RuleActionPreference.from_code(c).value)}).to_csv() if self.action_report is not None and not self.action_report.empty else "",
             "apiResponse": self.apiResponse,
             "logs": self.logs,
             "dryRun": self.dryRun,
@@ -46,8 +50,16 @@ class RuleActionPreference(Enum):
   def __lt__(self, other):
     if self.__class__ is not other.__class__:
       return NotImplemented
-    cases = list(self.__class__)
-    return cases.index(self) < cases.index(other)
+    return self.code < other.code
+
+  @property
+  def code(self) -> int:
+    # action reports store preferences as these ordered codes so that they can be compared as integers
+    return list(self.__class__).index(self)
+
+  @classmethod
+  def from_code(cls, code: int):
+    return list(cls)[code]
 
 class RuleActionReportColumn(Enum):
   target_id = 'target_id'
@@ -66,6 +78,7 @@ class RuleActionReportColumn(Enum):
   api_request = 'api_request'
   api_response = 'api_response'
   dry_run = 'dry_run'
+  last_data_checked_date = 'last_data_checked_date'
 
 class RuleActionTargetType(Enum):
   campaign = 'campaign'
@@ -109,6 +122,20 @@ class RuleActionLog:
     self.actionDescription = actionDescription
     self.consumedData = consumedData
 
+  @classmethod
+  def logWithDBRepresentation(cls, data: Dict[str, any]):
+    return cls(
+      targetID=data['targetID'],
+      targetType=RuleActionTargetType(data['targetType']),
+      targetChannel=data['targetChannel'],
+      adjustmentType=RuleActionAdjustmentType(data['adjustmentType']) if data['adjustmentType'] is not None else None,
+      adjustmentFrom=data['adjustmentFrom'],
+      adjustmentTo=data['adjustmentTo'],
+      targetDescription=data['targetDescription'],
+      actionDescription=data['actionDescription'],
+      consumedData=data['consumedData']
+    )
+
   @property
   def dbRepresentation(self):
     return {
@@ -180,16 +207,36 @@ class RuleAction:
       dry_run=dryRun,
       context=campaign
     )
-    action_report = self.interpret_action_report(
-      api=api,
-      action_report=action_report,
-      context=campaign
-    )
-    self.execute_action_report(
-      api=api,
-      action_report=action_report,
-      context=campaign
-    )
+    coalescer = campaign.get(RuleContext.mutation_coalescer.value)
+    if coalescer is None:
+      action_report = self.interpret_action_report(
+        api=api,
+        action_report=action_report,
+        context=campaign
+      )
+      self.execute_action_report(
+        api=api,
+        action_report=action_report,
+        context=campaign
+      )
+    else:
+      # rules in the same cycle adjust one after another so that each sees the states left by the others
+      with coalescer.lock:
+        coalescer.apply_pending_states(
+          action=self,
+          action_report=action_report,
+          context=campaign
+        )
+        action_report = self.interpret_action_report(
+          api=api,
+          action_report=action_report,
+          context=campaign
+        )
+        self.execute_action_report(
+          api=api,
+          action_report=action_report,
+          context=campaign
+        )
 
     return RuleActionResult(
       apiResponse=list(action_report[RuleActionReportColumn.api_response.value]),
@@ -226,6 +273,39 @@ class RuleAction:
     for index in location.index:
       action_report.loc[index, :] = apply_transformer(location.loc[index].copy())
 
+  def entity_apply_columns(self, action_report: pd.DataFrame, columns_transformer: Callable[[pd.DataFrame], Optional[Dict[str, pd.Series]]], transformer: Callable[[pd.Series], Optional[pd.Series]], location: Optional[pd.DataFrame]=None):
+    if location is None:
+      location = action_report
+    if location.empty:
+      return
+
+    try:
+      columns = columns_transformer(location)
+    except (KeyboardInterrupt, SystemExit):
+      raise
+    except Exception:
+      # the row-wise transformer records the error for each entity that fails
+      columns = None
+    if columns is None:
+      self.entity_apply(
+        action_report=action_report,
+        transformer=transformer,
+        location=location
+      )
+      return
+
+    for column, values in columns.items():
+      action_report.loc[location.index, column] = values
+
+  def is_vectorized(self, entities_method: str, entity_method: str) -> bool:
+    # a subclass that overrides only the row-wise method must not be bypassed by an inherited vectorized method
+    cls = self.__class__
+    owner = next(c for c in cls.__mro__ if entities_method in vars(c))
+    return getattr(cls, entity_method) is getattr(owner, entity_method)
+
+  def entities_column(self, location: pd.DataFrame, values: any) -> pd.Series:
+    return pd.Series(values if isinstance(values, (list, np.ndarray)) else [values] * len(location), index=location.index, dtype=object)
+
   #-------------------------------------
   # Generate Action Report
   #-------------------------------------
@@ -250,6 +330,8 @@ class RuleAction:
       dry_run=dry_run,
       context=context
     )
+    # journaled mutations are logged with the date of the data they were decided on, even when replayed
+    action_report[RuleActionReportColumn.last_data_checked_date.value] = report[RuleReportColumn.date.value].max() if RuleReportColumn.date.value in report.columns else None
     self.add_action_report_history(
       entity_ids=entity_ids,
       action_report=action_report,
@@ -289,10 +371,10 @@ class RuleAction:
     assert not action_report[RuleActionReportColumn.target_id.value].duplicated().any(), 'Duplicate entity IDs in action report'
     assert action_report[RuleActionReportColumn.target_id.value].isna().unique() == [False], 'N/A entity IDs in action report'
 
-    action_report[RuleActionReportColumn.preference.value] = RuleActionPreference.make_adjustment
+    action_report[RuleActionReportColumn.preference.value] = RuleActionPreference.make_adjustment.code
     action_report[RuleActionReportColumn.override_preference.value] = not context[RuleContext.rule.value].safe_mode
     action_report[RuleActionReportColumn.preference_messages.value] = [[] for _ in range(len(action_report))]
-    action_report[RuleActionReportColumn.dry_run.value] = dry_run
+    action_report[RuleActionReportColumn.dry_run.value] = bool(dry_run)
     for column in self.action_report_columns:
       if column not in action_report.columns:
         action_report[column] = None
@@ -303,15 +385,23 @@ class RuleAction:
       entity_ids=action_report[RuleActionReportColumn.target_id.value].tolist(),
       context=context
     )
-    def add_history(entity_series: pd.Series):
-      entity_history = sorted(filter(lambda h: 'targetID' in h and str(h['targetID']) == entity_series[RuleActionReportColumn.target_id.value], history), key=lambda h: h['historyCreationDate'])
-      entity_series[RuleActionReportColumn.history.value] = entity_history
-    self.entity_apply(
-      action_report=action_report,
-      transformer=add_history
-    )
+    target_history: Dict[str, List[Dict[str, any]]] = {}
+    # the history is usually sorted by the query already, in which case sorting is a single linear pass
+    for entry in sorted(filter(lambda h: 'targetID' in h, history), key=lambda h: h['historyCreationDate']):
+      target_history.setdefault(str(entry['targetID']), []).append(entry)
+    action_report[RuleActionReportColumn.history.value] = [target_history.get(i, []) for i in action_report[RuleActionReportColumn.target_id.value]]
+
+  @property
+  def history_fields(self) -> Optional[List[str]]:
+    return None
+
+  def history_lookback(self, context: any) -> Optional[timedelta]:
+    return None
 
   def get_entity_history(self, entity_ids: List[str], context: any) -> List[Dict[str, any]]:
+    lookback = self.history_lookback(context=context)
+    if lookback is not None and lookback <= timedelta():
+      return []
     user_id = context[RuleContext.rule.value].userID
     channel_identifier = context[RuleContext.channel.value].identifier
     history_collection = context[RuleContext.history_collection.value]
@@ -325,7 +415,11 @@ class RuleAction:
     }
     if not context[RuleContext.rule_options.value][RuleOption.use_dry_run_history.value]:
       history_conditions['dryRun'] = False
-    entity_history = list(history_collection.find(history_conditions).sort('historyCreationDate'))
+    if lookback is not None:
+      history_conditions['historyCreationDate'] = {'$gte': context[RuleContext.now.value] - lookback}
+    fields = self.history_fields
+    projection = {f: True for f in ['targetID', 'historyCreationDate', *fields]} if fields is not None else None
+    entity_history = list(history_collection.find(history_conditions, projection).sort('historyCreationDate'))
     return entity_history
 
   def supplement_action_report(self, action_report: pd.DataFrame, api: any, context: any) -> pd.DataFrame:
@@ -356,14 +450,23 @@ class RuleAction:
     return action_report
 
   def add_action_report_adjustments(self, action_report: pd.DataFrame, api: any, context: any):
+    def add_ajustments(location: pd.DataFrame):
+      if not self.is_vectorized(entities_method='entities_adjustment', entity_method='entity_adjustment'):
+        return None
+      adjustments = self.entities_adjustment(
+        location=location,
+        context=context
+      )
+      return {RuleActionReportColumn.adjustment.value: adjustments} if adjustments is not None else None
     def add_ajustment(entity_series: pd.Series):
       entity_series[RuleActionReportColumn.adjustment.value] = self.entity_adjustment(
       entity_series=entity_series,
       context=context
     )
     location = action_report.loc[action_report[RuleActionReportColumn.error.value].isna()]
-    self.entity_apply(
+    self.entity_apply_columns(
       action_report=action_report,
+      columns_transformer=add_ajustments,
       transformer=add_ajustment,
       location=location
     )
@@ -371,15 +474,25 @@ class RuleAction:
   def entity_adjustment(self, entity_series: pd.Series, context: any) -> Optional[any]:
     raise NotImplementedError()
 
+  def entities_adjustment(self, location: pd.DataFrame, context: any) -> Optional[pd.Series]:
+    return None
+
   def set_action_report_preferences(self, action_report: pd.DataFrame, api: any, context: any):
     pass
   
   def add_preference(self, action_report: pd.DataFrame, location: pd.DataFrame, preference: RuleActionPreference, message_callback: Callable[[any], str]):
+    def update_preferences(location: pd.DataFrame):
+      preferences = np.maximum(location[RuleActionReportColumn.preference.value].astype(int), preference.code)
+      messages = [message_callback(entity_series) for _, entity_series in location.iterrows()]
+      for entity_messages, message in zip(action_report.loc[location.index, RuleActionReportColumn.preference_messages.value], messages):
+        entity_messages.append(message)
+      return {RuleActionReportColumn.preference.value: preferences}
     def update_preference(entity_series: pd.Series):
-      entity_series[RuleActionReportColumn.preference.value] = max(entity_series[RuleActionReportColumn.preference.value], preference)
+      entity_series[RuleActionReportColumn.preference.value] = max(entity_series[RuleActionReportColumn.preference.value], preference.code)
       entity_series[RuleActionReportColumn.preference_messages.value].append(message_callback(entity_series))
-    self.entity_apply(
+    self.entity_apply_columns(
       action_report=action_report,
+      columns_transformer=update_preferences,
       transformer=update_preference,
       location=location
     )
@@ -446,7 +559,7 @@ class RuleAction:
       entity_series=entity_series,
       context=context
     )
-    log.consumedData = bool(entity_series[RuleActionReportColumn.override_preference.value]) or entity_series[RuleActionReportColumn.preference.value] is not RuleActionPreference.prevent_adjustment
+    log.consumedData = bool(entity_series[RuleActionReportColumn.override_preference.value]) or entity_series[RuleActionReportColumn.preference.value] != RuleActionPreference.prevent_adjustment.code
     return log
 
   def entity_action_description(self, entity_series: pd.Series, context: any) -> str:
@@ -456,16 +569,17 @@ class RuleAction:
     )
     if base_action_description is None:
       return None
-    if entity_series[RuleActionReportColumn.preference.value] is RuleActionPreference.make_adjustment:
+    preference = RuleActionPreference.from_code(entity_series[RuleActionReportColumn.preference.value])
+    if preference is RuleActionPreference.make_adjustment:
       return base_action_description
 
     if entity_series[RuleActionReportColumn.override_preference.value]:
       action_prefix = ''
       preference_treatment = 'overriding'
-    elif entity_series[RuleActionReportColumn.preference.value] is RuleActionPreference.modify_adjustment:
+    elif preference is RuleActionPreference.modify_adjustment:
       action_prefix = 'moderately '
       preference_treatment = 'using'
-    elif entity_series[RuleActionReportColumn.preference.value] is RuleActionPreference.prevent_adjustment:
+    elif preference is RuleActionPreference.prevent_adjustment:
       action_prefix = 'should have '
       preference_treatment = 'but did not due to'
     return f'{action_prefix}{base_action_description} {preference_treatment} {self.preferences_title}: {", ".join(entity_series[RuleActionReportColumn.preference_messages.value])}'
@@ -474,15 +588,25 @@ class RuleAction:
     raise NotImplementedError()
 
   def add_action_report_requests(self, api: any, action_report: pd.DataFrame, context: any):
+    def add_requests(location: pd.DataFrame):
+      if not self.is_vectorized(entities_method='entities_request', entity_method='entity_request'):
+        return None
+      requests = self.entities_request(
+        location=location,
+        api=api,
+        context=context
+      )
+      return {RuleActionReportColumn.api_request.value: requests} if requests is not None else None
     def add_request(entity_series: pd.Series):
       entity_series[RuleActionReportColumn.api_request.value] = self.entity_request(
         entity_series=entity_series,
         api=api,
         context=context
       )
-    location = action_report.loc[(action_report[RuleActionReportColumn.error.value].isna()) & (action_report[RuleActionReportColumn.log.value].notna()) & ((action_report[RuleActionReportColumn.override_preference.value]) | (action_report[RuleActionReportColumn.preference.value].apply(lambda p: p is not RuleActionPreference.prevent_adjustment)))]
-    self.entity_apply(
+    location = action_report.loc[(action_report[RuleActionReportColumn.error.value].isna()) & (action_report[RuleActionReportColumn.log.value].notna()) & ((action_report[RuleActionReportColumn.override_preference.value]) | (action_report[RuleActionReportColumn.preference.value] != RuleActionPreference.prevent_adjustment.code))]
+    self.entity_apply_columns(
       action_report=action_report,
+      columns_transformer=add_requests,
       transformer=add_request,
       location=location
     )
@@ -490,23 +614,181 @@ class RuleAction:
   def entity_request(self, entity_series: pd.Series, api: any, context: any) -> Optional[any]:
     raise NotImplementedError()
 
+  def entities_request(self, location: pd.DataFrame, api: any, context: any) -> Optional[pd.Series]:
+    return None
+
   def commit_action_report_requests(self, api: any, action_report: pd.DataFrame, context: any):
     def commit_adjustment(entity_series: pd.Series):
-        entity_series[RuleActionReportColumn.api_response.value] = self.mutate_entity(
+        entity_series[RuleActionReportColumn.api_response.value] = self.mutate_journaled_entity(
           entity_series=entity_series,
           api=api,
-          context=context
+          context=context,
+          journal=journal,
+          journal_id=journal_ids.get(entity_series.name)
         )
     location = action_report.loc[(action_report[RuleActionReportColumn.error.value].isna()) & (action_report[RuleActionReportColumn.api_request.value].notna()) & (~action_report[RuleActionReportColumn.dry_run.value])]
-    self.entity_apply(
+    if location.empty:
+      return
+    coalescer = context.get(RuleContext.mutation_coalescer.value)
+    if coalescer is not None:
+      coalescer.defer(
+        action=self,
+        action_report=action_report,
+        location=location,
+        api=api,
+        context=context
+      )
+      return
+    channel = context.get(RuleContext.channel.value)
+    workers = channel.mutation_workers if channel is not None else 1
+    limiter = channel.mutation_rate_limiter if channel is not None else None
+    journal = context.get(RuleContext.mutation_journal.value)
+    journal_ids = self.journal_entities(
+      journal=journal,
+      location=location,
+      context=context
+    )
+    committed = self.commit_action_report_batches(
       action_report=action_report,
-      transformer=commit_adjustment,
-      location=location
+      location=location,
+      api=api,
+      context=context,
+      limiter=limiter,
+      journal=journal,
+      journal_ids=journal_ids
+    )
+    location = location.iloc[committed:]
+    if location.empty:
+      return
+    if workers <= 1 and limiter is None:
+      self.entity_apply(
+        action_report=action_report,
+        transformer=commit_adjustment,
+        location=location
+      )
+      return
+
+    def mutate(entity_series: pd.Series) -> any:
+      if limiter is not None:
+        limiter.acquire()
+      try:
+        return self.mutate_journaled_entity(
+          entity_series=entity_series,
+          api=api,
+          context=context,
+          journal=journal,
+          journal_id=journal_ids.get(entity_series.name)
+        )
+      except (KeyboardInterrupt, SystemExit):
+        raise
+      except Exception as e:
+        return e
+    # responses are recorded by index once every mutation completes, so the action report does not depend on completion order
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+      responses = list(executor.map(mutate, [location.loc[i].copy() for i in location.index]))
+    self.add_entity_responses(
+      action_report=action_report,
+      index=location.index,
+      responses=responses
+    )
+
+  def commit_action_report_batches(self, action_report: pd.DataFrame, location: pd.DataFrame, api: any, context: any, limiter: Optional[RuleRateLimiter], journal: Optional[any]=None, journal_ids: Dict[any, int]={}) -> int:
+    # the base batch hook mutates nothing, so actions that do not implement it spend no rate limit tokens on batches
+    if type(self).mutate_entities is RuleAction.mutate_entities or not self.is_vectorized(entities_method='mutate_entities', entity_method='mutate_entity'):
+      return 0
+    batch_size = self.mutation_batch_size if self.mutation_batch_size is not None else len(location)
+    for start in range(0, len(location), batch_size):
+      batch = location.iloc[start:start + batch_size]
+      try:
+        if limiter is not None:
+          limiter.acquire()
+        responses = self.mutate_entities(
+          location=batch,
+          api=api,
+          context=context
+        )
+      except (KeyboardInterrupt, SystemExit):
+        raise
+      except Exception as e:
+        # the batch may have been partially applied, so its entities are not retried one by one
+        responses = [e] * len(batch)
+      if responses is None:
+        return start
+      self.add_entity_responses(
+        action_report=action_report,
+        index=batch.index,
+        responses=responses
+      )
+      if journal is not None:
+        for entity_index, response in zip(batch.index, responses):
+          if isinstance(response, Exception):
+            journal.mark_failed(id=journal_ids[entity_index], error=response)
+          else:
+            journal.mark_committed(id=journal_ids[entity_index], response=response)
+    return len(location)
+
+  @property
+  def journal_columns(self) -> List[str]:
+    return [
+      RuleActionReportColumn.target_id.value,
+      RuleActionReportColumn.target_name.value,
+      RuleActionReportColumn.unadjusted_state.value,
+      RuleActionReportColumn.adjustment.value,
+      RuleActionReportColumn.api_request.value,
+      RuleActionReportColumn.last_data_checked_date.value,
+    ]
+
+  def journal_entities(self, journal: Optional[any], location: pd.DataFrame, context: any) -> Dict[any, int]:
+    if journal is None:
+      return {}
+    ids = journal.record(
+      rule_id=str(context[RuleContext.rule.value]._id),
+      channel_identifier=context[RuleContext.channel.value].identifier,
+      action=self,
+      entities=[location.loc[i] for i in location.index]
     )
+    return dict(zip(location.index, ids))
+
+  def mutate_journaled_entity(self, entity_series: pd.Series, api: any, context: any, journal: Optional[any], journal_id: Optional[int]) -> Optional[any]:
+    try:
+      response = self.mutate_entity(
+        entity_series=entity_series,
+        api=api,
+        context=context
+      )
+    except (KeyboardInterrupt, SystemExit):
+      # an interrupted mutation may not have reached the channel, so it stays pending and is replayed on recovery
+      raise
+    except Exception as e:
+      if journal is not None:
+        journal.mark_failed(id=journal_id, error=e)
+      raise
+    if journal is not None:
+      journal.mark_committed(id=journal_id, response=response)
+    return response
+
+  def add_entity_responses(self, action_report: pd.DataFrame, index: pd.Index, responses: List[any]):
+    assert len(responses) == len(index), 'Mutation responses do not match the mutated entities'
+    for entity_index, response in zip(index, responses):
+      if isinstance(response, Exception):
+        action_report.at[entity_index, RuleActionReportColumn.error.value] = RuleActionEntityError(
+          target_id=action_report.at[entity_index, RuleActionReportColumn.target_id.value],
+          error=response,
+          traceback=''.join(traceback.format_exception(type(response), response, response.__traceback__))
+        )
+      else:
+        action_report.at[entity_index, RuleActionReportColumn.api_response.value] = response
 
   def mutate_entity(self, entity_series: pd.Series, api: any, context: any) -> Optional[any]:
     raise NotImplementedError()
 
+  @property
+  def mutation_batch_size(self) -> Optional[int]:
+    return None
+
+  def mutate_entities(self, location: pd.DataFrame, api: any, context: any) -> Optional[List[any]]:
+    return None
+
   def finalize_action_report(self, action_report: pd.DataFrame, api: any, context: any) -> pd.DataFrame:
     action_report.loc[action_report[RuleActionReportColumn.error.value].notna(), RuleActionReportColumn.log.value] = None
     return action_report
@@ -517,7 +799,7 @@ class RuleMultiplierAction(RuleAction):
     return None
 
   def entity_adjustment(self, entity_series: pd.Series, context: any) -> Optional[any]:
-    unadjusted = entity_series[RuleActionReportColumn.unadjusted_state.value]
+    unadjusted = self.scalar_state(entity_series[RuleActionReportColumn.unadjusted_state.value])
     adjusted = unadjusted * self.adjustmentValue
     if self.precision is not None:
       adjusted = round(adjusted, self.precision)
@@ -533,6 +815,32 @@ class RuleMultiplierAction(RuleAction):
       return None
     return adjusted
 
+  def entities_adjustment(self, location: pd.DataFrame, context: any) -> Optional[pd.Series]:
+    unadjusted = location[RuleActionReportColumn.unadjusted_state.value]
+    # comparisons with a missing limit raise for each entity on the row-wise path
+    if unadjusted.isna().any() or not isinstance(self.adjustmentLimit, numbers.Real):
+      return None
+    # object arithmetic keeps Python's rounding and integer states, so both paths adjust to the same values
+    unadjusted = unadjusted.astype(object).map(self.scalar_state)
+    adjusted = unadjusted * self.adjustmentValue
+    if self.precision is not None:
+      adjusted = adjusted.map(lambda a: round(a, self.precision))
+    if self.adjustmentValue > 1:
+      limited = (adjusted > self.adjustmentLimit).astype(bool)
+      skipped = limited & (unadjusted >= self.adjustmentLimit).astype(bool)
+    elif self.adjustmentValue < 1:
+      limited = (adjusted < self.adjustmentLimit).astype(bool)
+      skipped = limited & (unadjusted <= self.adjustmentLimit).astype(bool)
+    else:
+      limited = skipped = pd.Series(False, index=location.index)
+    adjusted = adjusted.mask(limited, self.adjustmentLimit)
+    skipped = skipped | (adjusted == unadjusted).astype(bool)
+    return self.entities_column(location=location, values=np.where(skipped, None, adjusted.to_numpy(dtype=object)))
+
+  @classmethod
+  def scalar_state(cls, state: any) -> any:
+    return state.item() if isinstance(state, np.generic) else state
+
 class RuleNoAction(RuleAction):
   @property
   def adjustment_type(self) -> RuleActionAdjustmentType:
@@ -541,9 +849,15 @@ class RuleNoAction(RuleAction):
   def entity_adjustment(self, entity_series: pd.Series, context: any) -> Optional[any]:
     return True
 
+  def entities_adjustment(self, location: pd.DataFrame, context: any) -> Optional[pd.Series]:
+    return self.entities_column(location=location, values=True)
+
   def entity_request(self, entity_series: pd.Series, api: any, context: any) -> Optional[any]:
     return None
 
+  def entities_request(self, location: pd.DataFrame, api: any, context: any) -> Optional[pd.Series]:
+    return self.entities_column(location=location, values=None)
+
   def action_description(self, entity_series: pd.Series, context: any):
     return 'took no action'
 
@@ -562,6 +876,9 @@ class RulePauseAction(RuleAction):
 
   def entity_adjustment(self, entity_series: str, context: any) -> any:
     return None if entity_series[RuleActionReportColumn.unadjusted_state.value] == self.paused_value else self.paused_value
+
+  def entities_adjustment(self, location: pd.DataFrame, context: any) -> Optional[pd.Series]:
+    return self.entities_column(location=location, values=np.where(location[RuleActionReportColumn.unadjusted_state.value] == self.paused_value, None, self.paused_value))
   
   def action_description(self, entity_series: str, context: any) -> str:
     return f'paused {self.entity_type_description}'
@@ -0,0 +1,65 @@
+from typing import List, Optional
+from .rule_model import Rule
+from .report_models import RuleRawReportStore
+from .runner_models import RuleRunner, RuleRunResult
+from .mutation_models import RuleMutationCoalescer, RuleCoalescedMutation
+from .history_models import RuleHistorySink
+
+class RuleBatchExecutor:
+  rules: List[Rule]
+  raw_report_store: RuleRawReportStore
+  runner: RuleRunner
+  coalesced_mutations: List[RuleCoalescedMutation]
+
+  def __init__(self, rules: List[Rule], raw_report_store: Optional[RuleRawReportStore]=None, runner: Optional[RuleRunner]=None):
+    self.rules = [*rules]
+    self.raw_report_store = raw_report_store if raw_report_store is not None else RuleRawReportStore()
+    self.runner = runner if runner is not None else RuleRunner()
+    self.coalesced_mutations = []
+
+  @property
+  def mutation_coalescers(self) -> List[RuleMutationCoalescer]:
+    coalescers = {}
+    for rule in self.rules:
+      coalescer = rule.connection.mutation_coalescer
+      if coalescer is not None:
+        coalescers[id(coalescer)] = coalescer
+    return list(coalescers.values())
+
+  @property
+  def history_sinks(self) -> List[RuleHistorySink]:
+    sinks = {}
+    for rule in self.rules:
+      for collection in [rule.connection.history_collection, rule.connection.monitor_collection]:
+        if isinstance(collection, RuleHistorySink):
+          sinks[id(collection)] = collection
+    return list(sinks.values())
+
+  def execute(self, startDate, endDate, granularity, debugEndDate=None) -> List[RuleRunResult]:
+    for coalescer in self.mutation_coalescers:
+      coalescer.expect(rules=[r for r in self.rules if r.connection.mutation_coalescer is coalescer])
+    # rules of a channel start in rule ID order, so a rule waiting for its turn to adjust only waits for rules that are already running
+    order = sorted(range(len(self.rules)), key=lambda i: str(self.rules[i]._id))
+    ordered_results = self.runner.run(
+      rules=[self.rules[i] for i in order],
+      task=lambda rule: rule.execute(
+        startDate=startDate,
+        endDate=endDate,
+        granularity=granularity,
+        debugEndDate=debugEndDate,
+        rawReportStore=self.raw_report_store
+      )
+    )
+    results: List[Optional[RuleRunResult]] = [None] * len(self.rules)
+    for index, result in zip(order, ordered_results):
+      results[index] = result
+    self.coalesced_mutations = [m for c in self.mutation_coalescers for m in c.flush()]
+    for sink in self.history_sinks:
+      sink.flush()
+    return results
+
+  def getImpactReports(self) -> List[RuleRunResult]:
+    return self.runner.run(
+      rules=self.rules,
+      task=lambda rule: rule.getImpactReport(rawReportStore=self.raw_report_store)
+    )
@@ -2,7 +2,8 @@ import pandas as pd
 
 from bson import ObjectId
 from typing import Dict, Optional, TypeVar, Generic
-from .context_models import RuleContext
+from .context_models import RuleContext, RuleContextOption
+from .rate_limit_models import RuleRateLimiter
 from moda.connect import Connector
 from .action_models import RuleAction
 from .action_types import RuleActionType
@@ -19,6 +20,22 @@ class ChannelEntity(Enum):
   campaign = 'campaign'
   org = 'org'
 
+class ChannelOption(RuleContextOption, Enum):
+  mutation_workers = 'mutation_workers'
+  mutation_rate = 'mutation_rate'
+  mutation_burst = 'mutation_burst'
+
+  @property
+  def default(self) -> any:
+    if self is ChannelOption.mutation_workers:
+      return 1
+    elif self is ChannelOption.mutation_rate:
+      return None
+    elif self is ChannelOption.mutation_burst:
+      return None
+    else:
+      raise ValueError('Unsupported channel option', self)
+
 A = TypeVar(any)
 C = TypeVar(any)
 class Channel(Generic[A, C], Connector):
@@ -36,9 +53,34 @@ class Channel(Generic[A, C], Connector):
   def title(self) -> str:
     raise NotImplementedError()
 
+  @property
+  def concurrency_limit(self) -> Optional[int]:
+    return None
+
+  @property
+  def mutation_workers(self) -> int:
+    return self.options.get(ChannelOption.mutation_workers.value, ChannelOption.mutation_workers.default)
+
+  @property
+  def mutation_rate_limiter(self) -> Optional[RuleRateLimiter]:
+    rate = self.options.get(ChannelOption.mutation_rate.value, ChannelOption.mutation_rate.default)
+    if rate is None:
+      return None
+    return RuleRateLimiter.channel_limiter(
+      channel_identifier=self.identifier,
+      rate=rate,
+      burst=self.options.get(ChannelOption.mutation_burst.value, ChannelOption.mutation_burst.default)
+    )
+
   def disconnect(self):
     self.api = None
 
+  def suspend(self):
+    pass
+
+  def resume(self):
+    pass
+
   def rule_context(self, options: Dict[str, any]={}) -> C:
     raise NotImplementedError()
 
@@ -1,9 +1,13 @@
+import hashlib
+import threading
 import numpy as np
 import pandas as pd
 
 from enum import Enum
+from functools import reduce
+from collections import OrderedDict
 from bson import ObjectId
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from io_map import IOMap, IOMapKey, AllMap
 
 class RuleKPI(Enum):
@@ -17,25 +21,75 @@ class RuleKPI(Enum):
     conversionRate = 'reavgConversionRate'
     cpm = 'reavgCPM'
 
-    def _calculateTotalSpend(self, report, groupByID):
-        if "totalSpend" in report.columns: return
-
-        report["totalSpend"] = report.groupby(groupByID).localSpend.transform(sum)
-
-    def _calculateTotalImpressions(self, report, groupByID):
-        if "totalImpressions" in report.columns: return
+    @property
+    def sourceColumn(self):
+        if self is RuleKPI.spend:
+            return "localSpend"
+        elif self is RuleKPI.impressions:
+            return "impressions"
+        elif self is RuleKPI.taps:
+            return "taps"
+        elif self is RuleKPI.conversions:
+            return "installs"
+        else:
+            raise ValueError("KPI is not a total", self)
 
-        report["totalImpressions"] = report.groupby(groupByID).impressions.transform(sum)
+    @property
+    def totalKPIs(self):
+        if self is RuleKPI.cpa:
+            return [RuleKPI.spend, RuleKPI.conversions]
+        elif self is RuleKPI.cpt:
+            return [RuleKPI.spend, RuleKPI.taps]
+        elif self is RuleKPI.ttr:
+            return [RuleKPI.impressions, RuleKPI.taps]
+        elif self is RuleKPI.conversionRate:
+            return [RuleKPI.taps, RuleKPI.conversions]
+        elif self is RuleKPI.cpm:
+            return [RuleKPI.spend, RuleKPI.impressions]
+        elif self in [RuleKPI.spend, RuleKPI.impressions, RuleKPI.taps, RuleKPI.conversions]:
+            return [self]
+        else:
+            raise ValueError("unsupported KPI", self)
 
-    def _calculateTotalTaps(self, report, groupByID):
-        if "totalTaps" in report.columns: return
+    @classmethod
+    def requiredColumns(cls, kpis):
+        return list(dict.fromkeys([k.value for k in cls if any(k in kpi.totalKPIs for kpi in kpis)] + [kpi.value for kpi in kpis]))
+
+    @classmethod
+    def entityKPIs(cls, report, kpis, groupByID):
+        aggregations = {}
+        totalColumns = {}
+        for kpi in cls:
+            if not any(kpi in k.totalKPIs for k in kpis): continue
+            if kpi.value in report.columns:
+                aggregations[kpi.value] = "first"
+            else:
+                aggregations[kpi.sourceColumn] = "sum"
+                totalColumns[kpi.sourceColumn] = kpi.value
+        for kpi in kpis:
+            if kpi.value in report.columns:
+                aggregations[kpi.value] = "first"
+
+        if aggregations:
+            entities = report.groupby(groupByID).agg(aggregations).rename(columns=totalColumns)
+        else:
+            entities = pd.DataFrame(index=pd.Index(report[groupByID].dropna().unique(), name=groupByID))
+        for kpi in kpis:
+            kpi._reaverage(entities)
+        return entities.reset_index()
 
-        report["totalTaps"] = report.groupby(groupByID).taps.transform(sum)
+    @classmethod
+    def addEntityKPIs(cls, report, entities, groupByID):
+        entityColumns = entities.set_index(groupByID)
+        for column in entityColumns.columns:
+            if column in report.columns: continue
+            report[column] = report[groupByID].map(entityColumns[column])
 
-    def _calculateTotalConversions(self, report, groupByID):
-        if "totalConversions" in report.columns: return
+    @classmethod
+    def addRequiredColumnsForKPIs(cls, report, kpis, groupByID):
+        if all(c in report.columns for c in cls.requiredColumns(kpis)): return
 
-        report["totalConversions"] = report.groupby(groupByID).installs.transform(sum)
+        cls.addEntityKPIs(report, entities=cls.entityKPIs(report, kpis=kpis, groupByID=groupByID), groupByID=groupByID)
 
     def _reaverageCPT(self, report):
         if "reavgCPT" in report.columns: return
@@ -67,46 +121,29 @@ class RuleKPI(Enum):
       report[RuleKPI.cpm.value] = report[RuleKPI.spend.value] / (report[RuleKPI.impressions.value] / 1000)
       report.loc[report[RuleKPI.cpm.value] == np.inf, RuleKPI.cpm.value] = np.nan
 
-    def addRequiredColumns(self, report, groupByID):
+    def _reaverage(self, report):
         if self is RuleKPI.cpa:
-            self._calculateTotalSpend(report, groupByID=groupByID)
-            self._calculateTotalConversions(report, groupByID=groupByID)
             self._reaverageCPA(report)
         elif self is RuleKPI.cpt:
-            self._calculateTotalSpend(report, groupByID=groupByID)
-            self._calculateTotalTaps(report, groupByID=groupByID)
             self._reaverageCPT(report)
-        elif self is RuleKPI.spend:
-            self._calculateTotalSpend(report, groupByID=groupByID)
-        elif self is RuleKPI.impressions:
-            self._calculateTotalImpressions(report, groupByID=groupByID)
-        elif self is RuleKPI.taps:
-            self._calculateTotalTaps(report, groupByID=groupByID)
-        elif self is RuleKPI.conversions:
-            self._calculateTotalConversions(report, groupByID=groupByID)
         elif self is RuleKPI.ttr:
-            self._calculateTotalImpressions(report, groupByID=groupByID)
-            self._calculateTotalTaps(report, groupByID=groupByID)
             self._reaverageTTR(report)
         elif self is RuleKPI.conversionRate:
-            self._calculateTotalTaps(report, groupByID=groupByID)
-            self._calculateTotalConversions(report, groupByID=groupByID)
             self._reaverageConversionRate(report)
         elif self is RuleKPI.cpm:
-            self._calculateTotalSpend(report, groupByID=groupByID)
-            self._calculateTotalImpressions(report, groupByID=groupByID)
             self._reaverage_cpm(report)
-        else:
-            raise ValueError("unsupported KPI", self)
 
-    def selectedIndex(self, report, operator, value):
+    def addRequiredColumns(self, report, groupByID):
+        RuleKPI.addRequiredColumnsForKPIs(report, kpis=[self], groupByID=groupByID)
+
+    def selectedMask(self, report, operator, value):
+        mask = operator.selectedMask(report, column=self.value, value=value)
         if (self is RuleKPI.cpt or self is RuleKPI.cpa) and (operator is RuleConditionalOperator.greater or operator is RuleConditionalOperator.greaterThanOrEqual):
-            selectedIndices = operator.selectedIndex(report, column=self.value, value=value)
-            nanReport = report[np.isnan(report[self.value])]
-            selectedIndices = selectedIndices.union(operator.selectedIndex(nanReport, column=RuleKPI.spend.value, value=value))
-            return selectedIndices
-        else:
-            return operator.selectedIndex(report, column=self.value, value=value)
+            mask = mask | (np.isnan(report[self.value].values) & operator.selectedMask(report, column=RuleKPI.spend.value, value=value))
+        return mask
+
+    def selectedIndex(self, report, operator, value):
+        return report.index[self.selectedMask(report, operator=operator, value=value)]
 
 
 class RuleConditionalOperator(Enum):
@@ -116,20 +153,23 @@ class RuleConditionalOperator(Enum):
     greaterThanOrEqual = 'geq'
     equal = 'equal'
 
-    def selectedIndex(self, report, column, value):
+    def selectedMask(self, report, column, value):
         if self is RuleConditionalOperator.less:
-            return report.index[report[column] < value]
+            return (report[column] < value).values
         elif self is RuleConditionalOperator.greater:
-            return report.index[report[column] > value]
+            return (report[column] > value).values
         elif self is RuleConditionalOperator.lessThanOrEqual:
-            return report.index[report[column] <= value]
+            return (report[column] <= value).values
         elif self is RuleConditionalOperator.greaterThanOrEqual:
-            return report.index[report[column] >= value]
+            return (report[column] >= value).values
         elif self is RuleConditionalOperator.equal:
-            return report.index[report[column] == value]
+            return (report[column] == value).values
         else:
             raise ValueError("unsupported conditional operator", self)
 
+    def selectedIndex(self, report, column, value):
+        return report.index[self.selectedMask(report, column=column, value=value)]
+
 
 class RuleCondition(IOMap):
   def __init__(self,
@@ -140,9 +180,12 @@ class RuleCondition(IOMap):
     self.operator = operator
     self.comparisonValue = comparisonValue
 
-  def selectedIndex(self, report, groupByID):
+  def selectedMask(self, report, groupByID):
     self.kpi.addRequiredColumns(report, groupByID)
-    return self.kpi.selectedIndex(report, operator=self.operator, value=self.comparisonValue)
+    return self.kpi.selectedMask(report, operator=self.operator, value=self.comparisonValue)
+
+  def selectedIndex(self, report, groupByID):
+    return report.index[self.selectedMask(report, groupByID=groupByID)]
 
   #----------
   # IOMap
@@ -170,39 +213,116 @@ class RuleConditionGroupOperator(Enum):
     any = 'any'
     all = 'all'
 
-    def combineIndicies(self, first, second):
+    def initialMask(self, report):
         if self is RuleConditionGroupOperator.all:
-            return first.intersection(second)
+            return np.ones(len(report), dtype=bool)
         elif self is RuleConditionGroupOperator.any:
-            return first.union(second)
+            return np.zeros(len(report), dtype=bool)
         else:
             raise ValueError("unsupported condition group operator", self)
 
-    def undeterminedData(self, report, selectedIndex=None):
+    def combineMasks(self, first, second):
         if self is RuleConditionGroupOperator.all:
-            return report.loc[selectedIndex]
+            return first & second
         elif self is RuleConditionGroupOperator.any:
-            return report.loc[report.index.difference(selectedIndex)]
+            return first | second
         else:
             raise ValueError("unsupported condition group operator", self)
 
-    def selectedIndex(self, report, conditions, groupByID):
+    def isDetermined(self, mask):
         if self is RuleConditionGroupOperator.all:
-            index = report.index
+            return not mask.any()
         elif self is RuleConditionGroupOperator.any:
-            index = pd.Int64Index([])
+            return mask.all()
         else:
             raise ValueError("unsupported condition group operator", self)
 
-        undeterminedData = report
+    def selectedMask(self, report, conditions, groupByID):
+        mask = self.initialMask(report)
 
         for condition in conditions:
-            index = self.combineIndicies(index, condition.selectedIndex(undeterminedData, groupByID=groupByID))
-            undeterminedData = self.undeterminedData(report, selectedIndex=index)
+            if self.isDetermined(mask): break
+            mask = self.combineMasks(mask, condition.selectedMask(report, groupByID=groupByID))
+
+        return mask
+
+    def selectedIndex(self, report, conditions, groupByID):
+        return report.index[self.selectedMask(report, conditions=conditions, groupByID=groupByID)]
+
+class RuleConditionPlanStep(Enum):
+    condition = 'condition'
+    constant = 'constant'
+    combine = 'combine'
+
+class RuleConditionPlan:
+  steps: List[Tuple[any, ...]]
+  kpis: List[RuleKPI]
+
+  def __init__(self, steps: List[Tuple[any, ...]], kpis: List[RuleKPI]):
+    self.steps = steps
+    self.kpis = kpis
 
-        return index
+  @classmethod
+  def compile(cls, group: 'RuleConditionGroup') -> 'RuleConditionPlan':
+    steps = []
+    cls._emit(cls._node(group), steps=steps)
+    return cls(steps=steps, kpis=group.kpis)
+
+  @classmethod
+  def _node(cls, group: 'RuleConditionGroup') -> Tuple[any, ...]:
+    operator = group.operator
+    # an "all" group is false as soon as one operand is false, an "any" group true as soon as one is true
+    absorbing = operator is RuleConditionGroupOperator.any
+    children = []
+    for child in [(RuleConditionPlanStep.condition, c.kpi, c.operator, c.comparisonValue) for c in group.conditions] + [cls._node(g) for g in group.subgroups]:
+      if child[0] is RuleConditionPlanStep.constant:
+        if child[1] is absorbing:
+          return child
+        continue
+      nested = [child]
+      if child[0] is RuleConditionPlanStep.combine and child[1] is operator:
+        nested = child[2]
+      children.extend(n for n in nested if n not in children)
+
+    if not children:
+      return (RuleConditionPlanStep.constant, not absorbing)
+    if len(children) == 1:
+      return children[0]
+    return (RuleConditionPlanStep.combine, operator, children)
+
+  @classmethod
+  def _emit(cls, node: Tuple[any, ...], steps: List[Tuple[any, ...]]):
+    if node[0] is RuleConditionPlanStep.combine:
+      for child in node[2]:
+        cls._emit(child, steps=steps)
+      steps.append((RuleConditionPlanStep.combine, node[1], len(node[2])))
+    else:
+      steps.append(node)
+
+  def selectedMask(self, report, groupByID):
+    RuleKPI.addRequiredColumnsForKPIs(report, kpis=self.kpis, groupByID=groupByID)
+    stack = []
+    for step in self.steps:
+      if step[0] is RuleConditionPlanStep.condition:
+        _, kpi, operator, value = step
+        stack.append(kpi.selectedMask(report, operator=operator, value=value))
+      elif step[0] is RuleConditionPlanStep.constant:
+        stack.append(np.full(len(report), step[1], dtype=bool))
+      else:
+        _, operator, count = step
+        operands = stack[-count:]
+        del stack[-count:]
+        stack.append(reduce(operator.combineMasks, operands))
+    return stack.pop()
 
 class RuleConditionGroup(IOMap):
+  plans: OrderedDict = OrderedDict()
+  plansLock = threading.Lock()
+  maxCachedPlans: int = 1024
+
+  _id: Optional[str] = None
+  version: str
+
   def __init__(self,
                conditions=None,
                subgroups=None,
@@ -210,8 +330,18 @@ class RuleConditionGroup(IOMap):
     self.conditions = conditions
     self.subgroups = subgroups
     self.operator = operator
+    self.version = self.contentVersion(conditions=conditions, subgroups=subgroups, operator=operator)
     self.prepare_maps()
 
+  @classmethod
+  def contentVersion(cls, conditions, subgroups, operator):
+    content = (
+      operator.value if operator is not None else None,
+      [(c.kpi.value, c.operator.value, repr(c.comparisonValue)) for c in conditions or []],
+      [g.version for g in subgroups or []],
+    )
+    return hashlib.sha256(repr(content).encode()).hexdigest()
+
   @classmethod
   def groupWithID(cls, conditionGroupsCollection, id):
     data = conditionGroupsCollection.find_one({"_id": ObjectId(id)})
@@ -228,26 +358,51 @@ class RuleConditionGroup(IOMap):
     group = cls(conditions=conditions,
                 subgroups=subgroups,
                 operator=RuleConditionGroupOperator(data["operator"]))
+    group._id = id
 
     return group
 
-  def selectedIndex(self, report, groupByID):
-    index = self.operator.selectedIndex(report, conditions=self.conditions, groupByID=groupByID)
-
-    undeterminedData = self.operator.undeterminedData(report, selectedIndex=index)
+  @property
+  def plan(self) -> RuleConditionPlan:
+    # groups are rebuilt from the database on every run, so plans are shared by condition group ID and content version
+    key = (self._id, self.version)
+    cls = RuleConditionGroup
+    with cls.plansLock:
+      if key in cls.plans:
+        cls.plans.move_to_end(key)
+        return cls.plans[key]
+    plan = RuleConditionPlan.compile(self)
+    with cls.plansLock:
+      cls.plans[key] = plan
+      while len(cls.plans) > cls.maxCachedPlans:
+        cls.plans.popitem(last=False)
+    return plan
+
+  def selectedMask(self, report, groupByID):
+    return self.plan.selectedMask(report, groupByID=groupByID)
 
-    for subgroup in self.subgroups:
-      index = self.operator.combineIndicies(index, subgroup.selectedIndex(undeterminedData, groupByID=groupByID))
-      undeterminedData = self.operator.undeterminedData(undeterminedData, selectedIndex=index)
+  def selectedIndex(self, report, groupByID):
+    return report.index[self.selectedMask(report, groupByID=groupByID)]
 
-    return index
+  @property
+  def kpis(self):
+    return list(dict.fromkeys([c.kpi for c in self.conditions] + [k for g in self.subgroups for k in g.kpis]))
 
   def filterData(self, report, groupByID="keywordId"):
     if report.empty: return
 
-    index = self.selectedIndex(report, groupByID=groupByID)
-    dropIndex = report.index.difference(index)
-    report.drop(dropIndex, inplace=True)
+    columns = report.columns
+    entities = RuleKPI.entityKPIs(report, kpis=self.kpis, groupByID=groupByID)
+    RuleKPI.addEntityKPIs(report, entities=entities, groupByID=groupByID)
+    if report[groupByID].isna().any():
+      mask = self.selectedMask(report, groupByID=groupByID)
+    else:
+      # KPIs are constant within each entity, so evaluate the conditions once per entity
+      selectedIDs = entities[groupByID].values[self.selectedMask(entities, groupByID=groupByID)]
+      mask = report[groupByID].isin(selectedIDs).values
+    # only the first condition's KPI columns were ever added to the report itself, later conditions and subgroups evaluated copies
+    helperColumns = report.columns.difference(columns).difference(RuleKPI.requiredColumns([c.kpi for c in self.conditions[:1]]))
+    report.drop(index=report.index[~mask], columns=helperColumns, inplace=True)
 
   #----------
   # IOMap
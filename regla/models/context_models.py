@@ -1,6 +1,7 @@
 from __future__ import annotations
 from enum import Enum
 from typing import Dict
+from .monitor_models import RuleMonitorFormat
 
 class RuleContext(Enum):
   now = 'now'
@@ -11,6 +12,9 @@ class RuleContext(Enum):
   rule_collection = 'rule_collection'
   monitor_collection = 'monitor_collection'
   channel_context = 'channel_context'
+  channel_pool = 'channel_pool'
+  mutation_coalescer = 'mutation_coalescer'
+  mutation_journal = 'mutation_journal'
 
 class RuleContextOption:
   @classmethod
@@ -27,6 +31,7 @@ class RuleContextOption:
 class RuleOption(RuleContextOption, Enum):
   dynamic_window = 'dynamic_window'
   use_dry_run_history = 'use_dry_run_history'
+  monitor_format = 'monitor_format'
   
   @property
   def default(self) -> any:
@@ -34,5 +39,7 @@ class RuleOption(RuleContextOption, Enum):
       return True
     elif self is RuleOption.use_dry_run_history:
       return False
+    elif self is RuleOption.monitor_format:
+      return RuleMonitorFormat.csv.value
     else:
       raise ValueError('Unsupported rule option', self)
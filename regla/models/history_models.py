@@ -0,0 +1,158 @@
+import atexit
+import json
+import time
+import threading
+
+from typing import Callable, Dict, List, Optional
+
+class RuleHistorySink:
+  collection: any
+  max_documents: int
+  flush_interval: Optional[float]
+  clock: Callable[[], float]
+  buffer: List[Dict[str, any]]
+  callbacks: List[Callable[[], None]]
+  flushing_callbacks: Optional[List[Callable[[], None]]]
+  flushed: float
+  lock: threading.RLock
+  flush_lock: threading.Lock
+  stopped: threading.Event
+  thread: Optional[threading.Thread]
+
+  def __init__(self, collection: any, max_documents: int=500, flush_interval: Optional[float]=5., background: bool=True, clock: Callable[[], float]=time.monotonic):
+    assert max_documents > 0, 'History sink must buffer at least one document'
+    self.collection = collection
+    self.max_documents = max_documents
+    self.flush_interval = flush_interval
+    self.clock = clock
+    self.buffer = []
+    self.callbacks = []
+    self.flushing_callbacks = None
+    self.flushed = clock()
+    # the lock guards the buffer while the flush lock keeps writes in order, so rules keep buffering while history is written
+    self.lock = threading.RLock()
+    self.flush_lock = threading.Lock()
+    self.stopped = threading.Event()
+    self.thread = None
+    if background and flush_interval is not None:
+      self.thread = threading.Thread(target=self._flush_periodically, name='regla-history-sink', daemon=True)
+      self.thread.start()
+    atexit.register(self.close)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def insert_one(self, document: Dict[str, any]):
+    self.insert_many([document])
+
+  def insert_many(self, documents: List[Dict[str, any]]):
+    with self.lock:
+      self.buffer.extend(documents)
+      is_full = len(self.buffer) >= self.max_documents or self.is_due
+    if is_full:
+      # a flush that is already writing picks the documents up on its next pass
+      self.flush(wait=False)
+
+  def on_flush(self, callback: Callable[[], None]):
+    with self.lock:
+      if self.buffer:
+        self.callbacks.append(callback)
+        return
+      if self.flushing_callbacks is not None:
+        self.flushing_callbacks.append(callback)
+        return
+    callback()
+
+  @property
+  def is_due(self) -> bool:
+    return self.flush_interval is not None and self.clock() - self.flushed >= self.flush_interval
+
+  @classmethod
+  def matches(cls, document: Dict[str, any], conditions: Dict[str, any]) -> bool:
+    # only plain equality conditions are compared, so a document is flushed unless it cannot match the read
+    for key, value in conditions.items():
+      if key.startswith('$') or '.' in key or isinstance(value, dict):
+        continue
+      field = document.get(key)
+      if isinstance(field, (list, tuple)):
+        continue
+      if field != value:
+        return False
+    return True
+
+  def flush(self, conditions: Optional[Dict[str, any]]=None, wait: bool=True):
+    if not self.flush_lock.acquire(blocking=wait):
+      return
+    try:
+      with self.lock:
+        if conditions is None:
+          self.flushed = self.clock()
+          documents, self.buffer = self.buffer, []
+        else:
+          documents = [d for d in self.buffer if self.matches(document=d, conditions=conditions)]
+          self.buffer = [d for d in self.buffer if not self.matches(document=d, conditions=conditions)]
+        # callbacks wait for every document buffered before them
+        self.flushing_callbacks = []
+        if not self.buffer:
+          self.flushing_callbacks, self.callbacks = self.callbacks, []
+      try:
+        if documents:
+          self.collection.insert_many(documents)
+      except BaseException as e:
+        # keep unwritten history buffered in order so that the next flush retries it
+        documents = self.unwritten_documents(documents=documents, error=e)
+        with self.lock:
+          self.buffer = documents + self.buffer
+          self.callbacks = self.flushing_callbacks + self.callbacks
+          self.flushing_callbacks = None
+        raise
+      with self.lock:
+        callbacks, self.flushing_callbacks = self.flushing_callbacks, None
+    finally:
+      self.flush_lock.release()
+    for callback in callbacks:
+      callback()
+
+  @classmethod
+  def unwritten_documents(cls, documents: List[Dict[str, any]], error: BaseException) -> List[Dict[str, any]]:
+    # an ordered bulk write stops at its first error after writing the documents before it, and duplicate keys were already written by an earlier attempt
+    details = getattr(error, 'details', None)
+    if not isinstance(details, dict):
+      return documents
+    written = details.get('nInserted', 0)
+    duplicates = {e['index'] for e in details.get('writeErrors', []) if e.get('code') == 11000}
+    return [d for i, d in enumerate(documents) if i >= written and i not in duplicates]
+
+  def close(self):
+    self.stopped.set()
+    if self.thread is not None and self.thread is not threading.current_thread():
+      self.thread.join()
+    self.flush()
+    atexit.unregister(self.close)
+
+  # reads first flush the buffered documents they could return, so that rules see the history written earlier in the cycle
+  def find(self, *args, **kwargs):
+    self.flush(conditions=self._read_conditions(filter=args[0] if args else kwargs.get('filter')))
+    return self.collection.find(*args, **kwargs)
+
+  def find_one(self, *args, **kwargs):
+    self.flush(conditions=self._read_conditions(filter=args[0] if args else kwargs.get('filter')))
+    return self.collection.find_one(*args, **kwargs)
+
+  def aggregate(self, *args, **kwargs):
+    pipeline = args[0] if args else kwargs.get('pipeline')
+    self.flush(conditions=self._read_conditions(filter=pipeline[0].get('$match') if pipeline else None))
+    return self.collection.aggregate(*args, **kwargs)
+
+  def _read_conditions(self, filter: Optional[Dict[str, any]]) -> Optional[Dict[str, any]]:
+    return filter if isinstance(filter, dict) else None
+
+  def _flush_periodically(self):
+    while not self.stopped.wait(self.flush_interval):
+      try:
+        self.flush()
+      except Exception as e:
+        print(json.dumps({'log': 'history flush failed', 'error': repr(e)}))
@@ -0,0 +1,165 @@
+import json
+import sqlite3
+import threading
+import pandas as pd
+
+from enum import Enum
+from datetime import datetime
+from typing import Dict, List, Optional
+from .action_models import RuleAction, RuleActionReportColumn
+
+class RuleJournalStatus(Enum):
+  pending = 'pending'
+  committed = 'committed'
+  failed = 'failed'
+  logged = 'logged'
+
+class RuleJournalEntry:
+  id: int
+  rule_id: str
+  channel_identifier: str
+  action_type: str
+  adjustment_value: Optional[float]
+  adjustment_limit: Optional[float]
+  target_id: str
+  entity: Dict[str, any]
+  log: Optional[Dict[str, any]]
+  status: RuleJournalStatus
+  response: Optional[any]
+  error: Optional[str]
+
+  def __init__(self, id: int, rule_id: str, channel_identifier: str, action_type: str, adjustment_value: Optional[float], adjustment_limit: Optional[float], target_id: str, entity: Dict[str, any], log: Optional[Dict[str, any]], status: RuleJournalStatus, response: Optional[any]=None, error: Optional[str]=None):
+    self.id = id
+    self.rule_id = rule_id
+    self.channel_identifier = channel_identifier
+    self.action_type = action_type
+    self.adjustment_value = adjustment_value
+    self.adjustment_limit = adjustment_limit
+    self.target_id = target_id
+    self.entity = entity
+    self.log = log
+    self.status = status
+    self.response = response
+    self.error = error
+
+  @property
+  def entity_series(self) -> pd.Series:
+    return pd.Series(self.entity, dtype=object)
+
+  @property
+  def last_data_checked_date(self) -> Optional[datetime]:
+    date = pd.Timestamp(self.entity.get(RuleActionReportColumn.last_data_checked_date.value))
+    return None if pd.isna(date) else date
+
+class RuleMutationJournal:
+  path: str
+  connection: sqlite3.Connection
+  lock: threading.Lock
+
+  def __init__(self, path: str):
+    self.path = path
+    # mutations are committed from worker threads, so access to the connection is serialized by the lock
+    self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    self.lock = threading.Lock()
+    with self.lock:
+      self.connection.execute('PRAGMA journal_mode=WAL')
+      self.connection.execute('''
+        CREATE TABLE IF NOT EXISTS mutations (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          rule_id TEXT NOT NULL,
+          channel TEXT NOT NULL,
+          action_type TEXT,
+          adjustment_value REAL,
+          adjustment_limit REAL,
+          target_id TEXT NOT NULL,
+          entity TEXT NOT NULL,
+          log TEXT,
+          status TEXT NOT NULL,
+          response TEXT,
+          error TEXT,
+          created TEXT NOT NULL,
+          updated TEXT NOT NULL
+        )
+      ''')
+      self.connection.execute('CREATE INDEX IF NOT EXISTS mutations_rule_status ON mutations (rule_id, status)')
+
+  @classmethod
+  def encode(cls, value: any) -> str:
+    return json.dumps(value, default=lambda o: o.item() if hasattr(o, 'item') else str(o))
+
+  def close(self):
+    with self.lock:
+      self.connection.close()
+
+  def record(self, rule_id: str, channel_identifier: str, action: RuleAction, entities: List[pd.Series]) -> List[int]:
+    now = datetime.utcnow().isoformat()
+    ids = []
+    with self.lock:
+      self.connection.execute('BEGIN')
+      for entity_series in entities:
+        log = entity_series.get(RuleActionReportColumn.log.value)
+        cursor = self.connection.execute(
+          'INSERT INTO mutations (rule_id, channel, action_type, adjustment_value, adjustment_limit, target_id, entity, log, status, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+          (
+            rule_id,
+            channel_identifier,
+            action.type.value if action.type is not None else None,
+            action.adjustmentValue,
+            action.adjustmentLimit,
+            str(entity_series[RuleActionReportColumn.target_id.value]),
+            self.encode({c: entity_series[c] for c in action.journal_columns if c in entity_series.index}),
+            self.encode(log.dbRepresentation) if log is not None else None,
+            RuleJournalStatus.pending.value,
+            now,
+            now,
+          )
+        )
+        ids.append(cursor.lastrowid)
+      self.connection.execute('COMMIT')
+    return ids
+
+  def update(self, ids: List[int], status: RuleJournalStatus, response: Optional[any]=None, error: Optional[Exception]=None):
+    if not ids:
+      return
+    with self.lock:
+      self.connection.executemany(
+        'UPDATE mutations SET status = ?, response = ?, error = ?, updated = ? WHERE id = ?',
+        [(status.value, self.encode(response) if response is not None else None, repr(error) if error is not None else None, datetime.utcnow().isoformat(), i) for i in ids]
+      )
+
+  def mark_committed(self, id: int, response: Optional[any]):
+    self.update(ids=[id], status=RuleJournalStatus.committed, response=response)
+
+  def mark_failed(self, id: int, error: Exception):
+    self.update(ids=[id], status=RuleJournalStatus.failed, error=error)
+
+  def mark_logged(self, rule_id: str, ids: Optional[List[int]]=None):
+    with self.lock:
+      if ids is None:
+        self.connection.execute('UPDATE mutations SET status = ?, updated = ? WHERE rule_id = ? AND status = ?', (RuleJournalStatus.logged.value, datetime.utcnow().isoformat(), rule_id, RuleJournalStatus.committed.value))
+      else:
+        self.connection.executemany('UPDATE mutations SET status = ?, updated = ? WHERE id = ?', [(RuleJournalStatus.logged.value, datetime.utcnow().isoformat(), i) for i in ids])
+
+  def entries(self, rule_id: str, statuses: List[RuleJournalStatus]) -> List[RuleJournalEntry]:
+    with self.lock:
+      rows = self.connection.execute(
+        f'SELECT id, rule_id, channel, action_type, adjustment_value, adjustment_limit, target_id, entity, log, status, response, error FROM mutations WHERE rule_id = ? AND status IN ({", ".join("?" for _ in statuses)}) ORDER BY id',
+        (rule_id, *[s.value for s in statuses])
+      ).fetchall()
+    return [
+      RuleJournalEntry(
+        id=r[0],
+        rule_id=r[1],
+        channel_identifier=r[2],
+        action_type=r[3],
+        adjustment_value=r[4],
+        adjustment_limit=r[5],
+        target_id=r[6],
+        entity=json.loads(r[7]),
+        log=json.loads(r[8]) if r[8] is not None else None,
+        status=RuleJournalStatus(r[9]),
+        response=json.loads(r[10]) if r[10] is not None else None,
+        error=r[11]
+      )
+      for r in rows
+    ]
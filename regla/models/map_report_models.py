@@ -82,11 +82,12 @@ class MapReporter(RuleReporter, IOMap):
       context=campaign
     )['raw_report']
 
-  def _filterByLastActionDate(self, report, historyCollection):
+  def _lastActionDateMask(self, report, mask, historyCollection):
     if not self.context[RuleContext.rule_options.value][RuleOption.dynamic_window.value]:
-      return
-    return super()._filterByLastActionDate(
+      return None
+    return super()._lastActionDateMask(
       report=report,
+      mask=mask,
       historyCollection=historyCollection
     )
 
@@ -0,0 +1,46 @@
+import io
+import numpy as np
+import pandas as pd
+
+from enum import Enum
+
+class RuleMonitorFormat(Enum):
+  csv = 'csv'
+  parquet = 'parquet'
+
+  @property
+  def shares_source_report(self) -> bool:
+    # CSV monitor logs keep their original layout, with the source report repeated for each task
+    return self is not RuleMonitorFormat.csv
+
+  def encode(self, frame: pd.DataFrame) -> any:
+    if self is RuleMonitorFormat.csv:
+      return frame.to_csv()
+    elif self is RuleMonitorFormat.parquet:
+      buffer = io.BytesIO()
+      self.columnar_frame(frame).to_parquet(buffer, compression='zstd')
+      return buffer.getvalue()
+    else:
+      raise ValueError('Unsupported monitor format', self)
+
+  def decode(self, data: any) -> pd.DataFrame:
+    if self is RuleMonitorFormat.csv:
+      return pd.read_csv(io.StringIO(data), index_col=0)
+    elif self is RuleMonitorFormat.parquet:
+      return pd.read_parquet(io.BytesIO(data))
+    else:
+      raise ValueError('Unsupported monitor format', self)
+
+  @classmethod
+  def columnar_frame(cls, frame: pd.DataFrame) -> pd.DataFrame:
+    # action reports hold logs, errors and lists, which are stored by their string representation as they are in CSV
+    def column_value(value: any) -> any:
+      if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+      return str(value)
+    frame = frame.rename(columns=str)
+    return frame.assign(**{
+      c: frame[c].map(column_value)
+      for c in frame.columns
+      if frame[c].dtype == object
+    })
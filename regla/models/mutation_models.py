@@ -0,0 +1,188 @@
+import math
+import numbers
+import threading
+import traceback
+import pandas as pd
+
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from .context_models import RuleContext
+from .action_models import RuleAction, RuleActionLog, RuleActionReportColumn
+from ..errors import RuleActionEntityError
+
+class RuleDeferredLog:
+  rule: any
+  log: RuleActionLog
+  last_data_checked_date: Optional[datetime]
+
+  def __init__(self, rule: any, log: RuleActionLog, last_data_checked_date: Optional[datetime]=None):
+    self.rule = rule
+    self.log = log
+    self.last_data_checked_date = last_data_checked_date
+
+class RuleCoalescedMutation:
+  key: Tuple[str, str, str]
+  action: RuleAction
+  entity_series: pd.Series
+  api: any
+  context: any
+  original_state: any
+  state: any
+  contributions: int
+  deferred_logs: List[RuleDeferredLog]
+  response: Optional[any]
+  error: Optional[Exception]
+
+  def __init__(self, key: Tuple[str, str, str], action: RuleAction, entity_series: pd.Series, api: any, context: any):
+    self.key = key
+    self.original_state = entity_series[RuleActionReportColumn.unadjusted_state.value]
+    self.contributions = 0
+    self.deferred_logs = []
+    self.response = None
+    self.error = None
+    self.update(action=action, entity_series=entity_series, api=api, context=context)
+
+  def update(self, action: RuleAction, entity_series: pd.Series, api: any, context: any):
+    self.action = action
+    self.entity_series = entity_series
+    self.api = api
+    self.context = context
+    self.state = entity_series[RuleActionReportColumn.adjustment.value]
+    self.contributions += 1
+    log = entity_series.get(RuleActionReportColumn.log.value)
+    if log is not None:
+      self.deferred_logs.append(RuleDeferredLog(rule=context.get(RuleContext.rule.value), log=log))
+
+  @property
+  def is_noop(self) -> bool:
+    if isinstance(self.state, numbers.Real) and isinstance(self.original_state, numbers.Real):
+      # chained multipliers rarely return to exactly the original float
+      return math.isclose(self.state, self.original_state, rel_tol=1e-9, abs_tol=1e-9)
+    return self.state == self.original_state
+
+  def serialize_result(self):
+    return {
+      'key': list(self.key),
+      'originalState': self.original_state,
+      'state': self.state,
+      'contributions': self.contributions,
+      'response': self.response,
+      'error': repr(self.error) if self.error is not None else None,
+    }
+
+class RuleMutationCoalescer:
+  mutations: Dict[Tuple[str, str, str], RuleCoalescedMutation]
+  expected_rules: Set[Tuple[str, str]]
+  finished_rules: Set[Tuple[str, str]]
+  lock: threading.RLock
+  turn: threading.Condition
+
+  def __init__(self):
+    self.mutations = OrderedDict()
+    self.expected_rules = set()
+    self.finished_rules = set()
+    self.lock = threading.RLock()
+    self.turn = threading.Condition(self.lock)
+
+  def rule_key(self, rule: any) -> Tuple[str, str]:
+    return (rule.channel_identifier, str(rule._id))
+
+  def expect(self, rules: List[any]):
+    with self.lock:
+      self.expected_rules = {self.rule_key(rule=r) for r in rules}
+      self.finished_rules = set()
+
+  def wait_turn(self, rule: any):
+    # rules of a channel chain their adjustments in rule ID order rather than in the order their threads get here
+    channel_identifier, rule_id = self.rule_key(rule=rule)
+    with self.turn:
+      self.turn.wait_for(lambda: all(k in self.finished_rules for k in self.expected_rules if k[0] == channel_identifier and k[1] < rule_id))
+
+  def finish(self, rule: any):
+    with self.turn:
+      self.finished_rules.add(self.rule_key(rule=rule))
+      self.turn.notify_all()
+
+  def mutation_key(self, action: RuleAction, target_id: any, context: any) -> Tuple[str, str, str]:
+    return (context[RuleContext.channel.value].identifier, str(target_id), action.adjustment_type.value)
+
+  def apply_pending_states(self, action: RuleAction, action_report: pd.DataFrame, context: any):
+    # later rules adjust from the state that earlier rules in the cycle will leave, rather than the stale state in their reports
+    with self.lock:
+      for index, target_id in action_report[RuleActionReportColumn.target_id.value].items():
+        mutation = self.mutations.get(self.mutation_key(action=action, target_id=target_id, context=context))
+        if mutation is not None:
+          action_report.at[index, RuleActionReportColumn.unadjusted_state.value] = mutation.state
+
+  def defer(self, action: RuleAction, action_report: pd.DataFrame, location: pd.DataFrame, api: any, context: any):
+    with self.lock:
+      for index in location.index:
+        entity_series = action_report.loc[index].copy()
+        key = self.mutation_key(action=action, target_id=entity_series[RuleActionReportColumn.target_id.value], context=context)
+        if key in self.mutations:
+          self.mutations[key].update(action=action, entity_series=entity_series, api=api, context=context)
+        else:
+          self.mutations[key] = RuleCoalescedMutation(key=key, action=action, entity_series=entity_series, api=api, context=context)
+
+  def defer_history(self, logs: List[RuleActionLog], last_data_checked_date: Optional[datetime]) -> List[RuleActionLog]:
+    # the logs of deferred mutations are written to history by flush once the mutation is sent, the remaining logs are returned
+    with self.lock:
+      deferred_logs = {id(d.log): d for m in self.mutations.values() for d in m.deferred_logs}
+      for log in logs:
+        if id(log) in deferred_logs:
+          deferred_logs[id(log)].last_data_checked_date = last_data_checked_date
+      return [l for l in logs if id(l) not in deferred_logs]
+
+  def flush(self) -> List[RuleCoalescedMutation]:
+    with self.lock:
+      mutations = list(self.mutations.values())
+      self.mutations = OrderedDict()
+
+    for mutation in mutations:
+      if mutation.is_noop:
+        continue
+      entity_series = mutation.entity_series.copy()
+      # the net mutation runs from the state before the cycle to the state left by the last rule
+      entity_series[RuleActionReportColumn.unadjusted_state.value] = mutation.original_state
+      limiter = mutation.context[RuleContext.channel.value].mutation_rate_limiter
+      journal = mutation.context.get(RuleContext.mutation_journal.value)
+      journal_ids = mutation.action.journal_entities(
+        journal=journal,
+        location=pd.DataFrame([entity_series]),
+        context=mutation.context
+      )
+      try:
+        if limiter is not None:
+          limiter.acquire()
+        mutation.response = mutation.action.mutate_journaled_entity(
+          entity_series=entity_series,
+          api=mutation.api,
+          context=mutation.context,
+          journal=journal,
+          journal_id=journal_ids.get(entity_series.name)
+        )
+      except (KeyboardInterrupt, SystemExit):
+        raise
+      except Exception as e:
+        mutation.error = RuleActionEntityError(
+          target_id=entity_series[RuleActionReportColumn.target_id.value],
+          error=e,
+          traceback=traceback.format_exc()
+        )
+    self.log_history(mutations=mutations)
+    return mutations
+
+  def log_history(self, mutations: List[RuleCoalescedMutation]):
+    # contributing rule → (rule, logs with their last data checked date, errors)
+    histories: Dict[int, Tuple[any, List[Tuple[RuleActionLog, Optional[datetime]]], List[Exception]]] = OrderedDict()
+    for mutation in mutations:
+      for deferred_log in mutation.deferred_logs:
+        _, logs, errors = histories.setdefault(id(deferred_log.rule), (deferred_log.rule, [], []))
+        if mutation.error is None:
+          # a no-op leaves the target in the state the contributing rules chose, so their logs stand as well
+          logs.append((deferred_log.log, deferred_log.last_data_checked_date))
+        elif mutation.error not in errors:
+          errors.append(mutation.error)
+    for rule, logs, errors in histories.values():
+      rule.logDeferredHistory(logs=logs, errors=errors)
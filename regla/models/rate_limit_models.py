@@ -0,0 +1,48 @@
+from __future__ import annotations
+import time
+import threading
+
+from typing import Callable, Dict, Optional
+
+class RuleRateLimiter:
+  limiters: Dict[str, RuleRateLimiter] = {}
+  limiters_lock = threading.Lock()
+
+  rate: float
+  burst: float
+  tokens: float
+  updated: float
+  clock: Callable[[], float]
+  sleep: Callable[[float], None]
+  lock: threading.Lock
+
+  def __init__(self, rate: float, burst: Optional[float]=None, clock: Callable[[], float]=time.monotonic, sleep: Callable[[float], None]=time.sleep):
+    assert rate > 0, 'Rate limit must be positive'
+    self.rate = rate
+    self.burst = burst if burst is not None else max(rate, 1)
+    assert self.burst >= 1, 'Rate limit burst must allow at least one request'
+    self.clock = clock
+    self.sleep = sleep
+    self.tokens = self.burst
+    self.updated = clock()
+    self.lock = threading.Lock()
+
+  @classmethod
+  def channel_limiter(cls, channel_identifier: str, rate: float, burst: Optional[float]=None) -> RuleRateLimiter:
+    # API quotas apply to every rule running against a channel, so channel limiters are shared by the process and keep the first configured rate
+    with cls.limiters_lock:
+      if channel_identifier not in cls.limiters:
+        cls.limiters[channel_identifier] = cls(rate=rate, burst=burst)
+      return cls.limiters[channel_identifier]
+
+  def acquire(self, tokens: float=1):
+    while True:
+      with self.lock:
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= tokens:
+          self.tokens -= tokens
+          return
+        wait = (tokens - self.tokens) / self.rate
+      self.sleep(wait)
@@ -0,0 +1,229 @@
+import os
+import hashlib
+import threading
+import pandas as pd
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+from .report_models import RuleReporter, RuleReportGranularity, RuleRawReportStore
+
+class RuleRawReportCacheEntry:
+  raw_report: pd.DataFrame
+  fetch_raw_report_time: Optional[datetime]
+  expires: datetime
+  size: int
+
+  def __init__(self, raw_report: pd.DataFrame, fetch_raw_report_time: Optional[datetime], expires: datetime):
+    self.raw_report = raw_report
+    self.fetch_raw_report_time = fetch_raw_report_time
+    self.expires = expires
+    self.size = int(raw_report.memory_usage(deep=True).sum())
+
+class RuleRawReportCache(RuleRawReportStore):
+  default_ttls: Dict[RuleReportGranularity, timedelta] = {
+    RuleReportGranularity.hourly: timedelta(minutes=15),
+    RuleReportGranularity.daily: timedelta(hours=1),
+    RuleReportGranularity.weekly: timedelta(hours=6),
+    RuleReportGranularity.monthly: timedelta(hours=12),
+  }
+
+  entries: Dict[Tuple, RuleRawReportCacheEntry]
+  held_keys: Dict[Tuple, Tuple[Tuple, Tuple[RuleReporter, datetime, datetime, RuleReportGranularity]]]
+  max_bytes: int
+  size: int
+  ttls: Dict[RuleReportGranularity, timedelta]
+  closed_ttl: timedelta
+  directory: Optional[str]
+  max_disk_bytes: int
+  clock: Callable[[], datetime]
+  metrics: Dict[str, int]
+
+  def __init__(self, max_bytes: int=256 * 1024 * 1024, ttls: Dict[RuleReportGranularity, timedelta]={}, closed_ttl: timedelta=timedelta(days=7), directory: Optional[str]=None, max_disk_bytes: int=1024 * 1024 * 1024, clock: Callable[[], datetime]=datetime.utcnow):
+    super().__init__()
+    self.entries = OrderedDict()
+    # key → (series key, held reporter), so that reports leave the held reporters when they leave the cache
+    self.held_keys = {}
+    self.max_bytes = max_bytes
+    self.size = 0
+    self.ttls = {**self.default_ttls, **ttls}
+    self.closed_ttl = closed_ttl
+    self.directory = directory
+    self.max_disk_bytes = max_disk_bytes
+    self.clock = clock
+    self.metrics = {
+      'hits': 0,
+      'disk_hits': 0,
+      'misses': 0,
+      'evictions': 0,
+      'expirations': 0,
+      'disk_evictions': 0,
+    }
+    if directory is not None:
+      os.makedirs(directory, exist_ok=True)
+
+  def fetchRawReport(self, key: Tuple, reporter: RuleReporter, startDate, endDate, granularity, api, campaign, seriesKey: Optional[Tuple]=None):
+    with self.lock:
+      key_lock = self.key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+      entry = self.get(key=key)
+      if entry is not None:
+        # reporters get their own copy so that filtering can never modify the cached report
+        reporter.context = campaign
+        reporter.fetch_raw_report_time = entry.fetch_raw_report_time
+        reporter.rawReport = entry.raw_report.copy()
+      else:
+        self.expire()
+        if not self.rollUpRawReport(reporter=reporter, startDate=startDate, endDate=endDate, granularity=granularity, campaign=campaign, seriesKey=seriesKey):
+          reporter.fetchRawReport(startDate=startDate, endDate=endDate, granularity=granularity, api=api, campaign=campaign)
+        entry = RuleRawReportCacheEntry(
+          raw_report=reporter.rawReport.copy(),
+          fetch_raw_report_time=reporter.fetch_raw_report_time,
+          expires=self.clock() + self.ttl(granularity=RuleReportGranularity(granularity), endDate=endDate)
+        )
+        self.put(key=key, entry=entry)
+      self._hold(key=key, seriesKey=seriesKey, entry=entry, startDate=startDate, endDate=endDate, granularity=granularity)
+    with self.lock:
+      self._prune_key_lock(key=key)
+
+  def ttl(self, granularity: RuleReportGranularity, endDate) -> timedelta:
+    now = self.clock()
+    if pd.Timestamp(endDate) < pd.Timestamp(year=now.year, month=now.month, day=1):
+      # windows that ended before the current month are only restated rarely
+      return self.closed_ttl
+    return self.ttls[granularity]
+
+  def get(self, key: Tuple) -> Optional[RuleRawReportCacheEntry]:
+    now = self.clock()
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is not None and entry.expires <= now:
+        self._remove(key=key)
+        self.metrics['expirations'] += 1
+        entry = None
+      if entry is not None:
+        self.entries.move_to_end(key)
+        self.metrics['hits'] += 1
+        return entry
+
+    entry = self._read(key=key)
+    with self.lock:
+      if entry is not None and entry.expires > now:
+        self.metrics['disk_hits'] += 1
+        self._insert(key=key, entry=entry)
+        return entry
+      self.metrics['misses'] += 1
+    return None
+
+  def put(self, key: Tuple, entry: RuleRawReportCacheEntry):
+    self._write(key=key, entry=entry)
+    with self.lock:
+      self._insert(key=key, entry=entry)
+
+  def expire(self):
+    now = self.clock()
+    with self.lock:
+      for key in [k for k, e in self.entries.items() if e.expires <= now]:
+        self._remove(key=key)
+        self.metrics['expirations'] += 1
+
+  def clear(self):
+    with self.lock:
+      for key in list(self.entries):
+        self._remove(key=key)
+
+  def _insert(self, key: Tuple, entry: RuleRawReportCacheEntry):
+    self._remove(key=key)
+    if entry.size > self.max_bytes:
+      return
+    self.entries[key] = entry
+    self.size += entry.size
+    while self.size > self.max_bytes:
+      evicted_key = next(iter(self.entries))
+      self._remove(key=evicted_key)
+      self.metrics['evictions'] += 1
+
+  def _remove(self, key: Tuple):
+    entry = self.entries.pop(key, None)
+    if entry is not None:
+      self.size -= entry.size
+    if key in self.held_keys:
+      seriesKey, held = self.held_keys.pop(key)
+      self.held_reporters[seriesKey] = [h for h in self.held_reporters[seriesKey] if h is not held]
+      if not self.held_reporters[seriesKey]:
+        del self.held_reporters[seriesKey]
+    self._prune_key_lock(key=key)
+
+  def _hold(self, key: Tuple, seriesKey: Optional[Tuple], entry: RuleRawReportCacheEntry, startDate, endDate, granularity):
+    if seriesKey is None:
+      return
+    with self.lock:
+      # only reports the cache still holds in memory can be rolled up, and they are held as the cached report so that max_bytes accounts for them
+      if key in self.held_keys or self.entries.get(key) is not entry:
+        return
+      held = (RuleReporter(rawReport=entry.raw_report, fetch_raw_report_time=entry.fetch_raw_report_time), startDate, endDate, RuleReportGranularity(granularity))
+      self.held_reporters.setdefault(seriesKey, []).append(held)
+      self.held_keys[key] = (seriesKey, held)
+
+  def _prune_key_lock(self, key: Tuple):
+    key_lock = self.key_locks.get(key)
+    if key_lock is not None and key not in self.entries and not key_lock.locked():
+      del self.key_locks[key]
+
+  def _path(self, key: Tuple) -> str:
+    return os.path.join(self.directory, f'{hashlib.sha256(repr(key).encode()).hexdigest()}.pkl')
+
+  def _read(self, key: Tuple) -> Optional[RuleRawReportCacheEntry]:
+    if self.directory is None:
+      return None
+    path = self._path(key=key)
+    try:
+      data = pd.read_pickle(path)
+    except FileNotFoundError:
+      return None
+    if data['key'] != key:
+      return None
+    if data['expires'] <= self.clock():
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
+      return None
+    try:
+      # the directory is pruned least recently used first
+      os.utime(path)
+    except FileNotFoundError:
+      pass
+    return RuleRawReportCacheEntry(raw_report=data['raw_report'], fetch_raw_report_time=data['fetch_raw_report_time'], expires=data['expires'])
+
+  def _write(self, key: Tuple, entry: RuleRawReportCacheEntry):
+    if self.directory is None:
+      return
+    path = self._path(key=key)
+    # write to a temporary file first so that concurrent readers never load a partial report
+    temporary_path = f'{path}.{os.getpid()}.{threading.get_ident()}'
+    pd.to_pickle({'key': key, 'raw_report': entry.raw_report, 'fetch_raw_report_time': entry.fetch_raw_report_time, 'expires': entry.expires}, temporary_path)
+    os.replace(temporary_path, path)
+    self._prune_directory()
+
+  def _prune_directory(self):
+    files = []
+    for file in os.scandir(self.directory):
+      if not file.name.endswith('.pkl'):
+        continue
+      try:
+        stat = file.stat()
+      except FileNotFoundError:
+        continue
+      files.append((stat.st_mtime, stat.st_size, file.path))
+    size = sum(f[1] for f in files)
+    for _, file_size, path in sorted(files):
+      if size <= self.max_disk_bytes:
+        break
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
+      size -= file_size
+      with self.lock:
+        self.metrics['disk_evictions'] += 1
@@ -1,11 +1,13 @@
 from __future__ import annotations
 import bson
+import threading
 import pandas as pd
 import numpy as np
 
 from enum import Enum
 from datetime import datetime, timedelta
-from typing import Optional, Dict
+from collections import OrderedDict
+from typing import Callable, Optional, Dict, List, Tuple
 
 class RuleReportColumn(Enum):
   campaign_id = 'campaignId'
@@ -72,6 +74,7 @@ class RuleReporter:
   report: Optional[pd.DataFrame]
   context: Optional[any]
   fetch_raw_report_time: Optional[datetime]
+  filter_row_counts: Optional[Dict[str, int]]
 
   def __init__(self, reportType: Optional[RuleReportType]=None, adGroupID: Optional[any]=None, ruleID: Optional[bson.ObjectId]=None, dataCheckRange: Optional[int]=None, rawReport: Optional[pd.DataFrame]=None, report: Optional[pd.DataFrame]=None, context: Optional[any]=None, fetch_raw_report_time: Optional[datetime]=None):
     self.reportType = reportType
@@ -82,6 +85,7 @@ class RuleReporter:
     self.report = report
     self.context = context
     self.fetch_raw_report_time = fetch_raw_report_time
+    self.filter_row_counts = None
 
   @property
   def rule_column_map(self) -> Dict[RuleReportColumn, str]:
@@ -92,9 +96,111 @@ class RuleReporter:
     self.fetch_raw_report_time = datetime.utcnow()
     self.rawReport = self._getRawReport(startDate=startDate, endDate=endDate, granularity=granularity, api=api, campaign=campaign, adGroupIDs=adGroupIDs)
 
+  def fetchIncrementalRawReport(self, previous: Optional[RuleReporter], startDate, endDate, granularity, api, campaign, lookback: timedelta):
+    fetchStartDate = self.incrementalStartDate(previous=previous, startDate=startDate, endDate=endDate, granularity=granularity, lookback=lookback)
+    if fetchStartDate is None:
+      self.fetchRawReport(startDate=startDate, endDate=endDate, granularity=granularity, api=api, campaign=campaign)
+      return
+    self.context = campaign
+    self.fetch_raw_report_time = datetime.utcnow()
+    rawReport = self._getRawReport(startDate=fetchStartDate, endDate=endDate, granularity=granularity, api=api, campaign=campaign, adGroupIDs=None)
+    dates = self.raw_report_dates(rawReport=previous.rawReport)
+    retained = previous.rawReport.loc[(dates >= startDate) & (dates < fetchStartDate)]
+    self.rawReport = pd.concat([retained, rawReport], sort=True, ignore_index=True) if not rawReport.empty else retained.reset_index(drop=True)
+
+  def incrementalStartDate(self, previous: Optional[RuleReporter], startDate, endDate, granularity, lookback: timedelta) -> Optional[datetime]:
+    # fetches start at a day boundary so that APIs taking dates never return periods that are also retained
+    if RuleReportGranularity(granularity) not in [RuleReportGranularity.hourly, RuleReportGranularity.daily]:
+      return None
+    if previous is None or previous.rawReport is None or previous.rawReport.empty:
+      return None
+    dates = self.raw_report_dates(rawReport=previous.rawReport)
+    if dates is None:
+      return None
+    lastDate = dates.max() - lookback
+    fetchStartDate = datetime(lastDate.year, lastDate.month, lastDate.day)
+    if fetchStartDate <= startDate or fetchStartDate > endDate or dates.min() > startDate:
+      return None
+    return fetchStartDate
+
+  def raw_report_dates(self, rawReport: pd.DataFrame) -> Optional[pd.Series]:
+    if RuleReportColumn.date.value not in rawReport.columns:
+      return None
+    return pd.to_datetime(rawReport[RuleReportColumn.date.value])
+
+  @property
+  def raw_report_entity_columns(self) -> Optional[List[str]]:
+    return [self.reportType.groupByID]
+
+  @property
+  def raw_report_metric_columns(self) -> List[str]:
+    return []
+
+  @property
+  def raw_report_ratio_columns(self) -> Dict[str, Tuple[str, str]]:
+    return {}
+
+  def rollUpRawReport(self, rawReport: pd.DataFrame, startDate, endDate, granularity) -> Optional[pd.DataFrame]:
+    granularity = RuleReportGranularity(granularity)
+    entityColumns = self.raw_report_entity_columns
+    metricColumns = self.raw_report_metric_columns
+    dates = self.raw_report_dates(rawReport=rawReport)
+    if not entityColumns or not metricColumns or dates is None:
+      return None
+    metricColumns = [c for c in metricColumns if c in rawReport.columns]
+    if not metricColumns or any(c not in rawReport.columns for c in entityColumns) or any(not pd.api.types.is_numeric_dtype(rawReport[c]) for c in metricColumns):
+      return None
+
+    days = dates.dt.normalize()
+    location = (days >= pd.Timestamp(startDate).normalize()) & (days <= pd.Timestamp(endDate).normalize())
+    # merged reports are not in date order, so rows are sorted for the last value of each period to be the latest one
+    order = np.argsort(dates[location].to_numpy(), kind='stable')
+    days = days[location].iloc[order]
+    if granularity is RuleReportGranularity.daily:
+      periods = days
+    elif granularity is RuleReportGranularity.weekly:
+      periods = days - pd.to_timedelta(days.dt.weekday, unit='D')
+    elif granularity is RuleReportGranularity.monthly:
+      periods = days - pd.to_timedelta(days.dt.day - 1, unit='D')
+    else:
+      return None
+
+    report = rawReport.loc[location].iloc[order]
+    groups = report.groupby([*[report[c] for c in entityColumns], periods.rename('__period')], sort=True)
+    # entity attributes such as names, statuses and bids take their latest value in each period
+    aggregations = {
+      c: 'sum' if c in metricColumns else 'last'
+      for c in report.columns
+      if c not in entityColumns and c not in self.raw_report_ratio_columns
+    }
+    rolledUp = groups.agg(aggregations).reset_index()
+    rolledUp[RuleReportColumn.date.value] = rolledUp['__period']
+    rolledUp.drop(columns='__period', inplace=True)
+    for column, (numerator, denominator) in self.raw_report_ratio_columns.items():
+      if column not in rawReport.columns or numerator not in rolledUp.columns or denominator not in rolledUp.columns:
+        continue
+      rolledUp[column] = rolledUp[numerator] / rolledUp[denominator]
+      rolledUp.loc[np.isinf(rolledUp[column]), column] = np.nan
+    return rolledUp[[c for c in rawReport.columns if c in rolledUp.columns]]
+
+  def useRawReport(self, reporter: RuleReporter, campaign):
+    self.context = campaign
+    self.fetch_raw_report_time = reporter.fetch_raw_report_time
+    self.rawReport = reporter.rawReport
+
+  def raw_report_key(self, startDate, endDate, granularity, campaign) -> Tuple:
+    return (self.reportType.value, RuleReportGranularity(granularity).value, startDate, endDate, *self.raw_report_options(campaign=campaign))
+
+  def raw_report_series_key(self, campaign) -> Tuple:
+    return (self.reportType.value, *self.raw_report_options(campaign=campaign))
+
+  def raw_report_options(self, campaign) -> Tuple:
+    return ()
+
   def filterRawReport(self, historyCollection):
-    report = self.rawReport.copy()
-    self._filterReport(report, historyCollection=historyCollection)
+    # the shallow copy only gains or replaces whole columns, and zero divisors are invalidated on the filtered report, so the shared raw report is never modified
+    report = self._filteredReport(self.rawReport.copy(deep=False), historyCollection=historyCollection)
+    self._invalidateZeroDivisorData(report)
     self.report = report
 
   def processRawReportForImpact(self, historyCollection):
@@ -106,17 +212,41 @@ class RuleReporter:
     raise NotImplementedError()
 
   def _filterReport(self, report, historyCollection):
-    if report.empty: return
-    self._map_rule_columns(report=report)
-    self._filter_future(report)
-    self._filterProcessedData(report)
-    self._filterByAdGroup(report)
+    filtered = self._filteredReport(report, historyCollection=historyCollection)
+    if filtered is report: return
+    report.drop(report.index.difference(filtered.index), inplace=True)
     self._invalidateZeroDivisorData(report)
-    self._filterByLastActionDate(report, historyCollection=historyCollection)
+
+  def _filteredReport(self, report, historyCollection) -> pd.DataFrame:
+    self.filter_row_counts = OrderedDict([('raw', len(report))])
+    if report.empty: return report
+    self._map_rule_columns(report=report)
+    mask = np.ones(len(report), dtype=bool)
+    for stage, stageMask in self._filterStages(historyCollection=historyCollection):
+      selected = stageMask(report, mask)
+      if selected is not None:
+        mask &= selected
+      self.filter_row_counts[stage] = int(mask.sum())
+    return report.take(np.flatnonzero(mask))
+
+  def _filterStages(self, historyCollection) -> List[Tuple[str, Callable[[pd.DataFrame, np.ndarray], Optional[np.ndarray]]]]:
+    return [
+      ('future', self._futureMask),
+      ('processed_data', self._processedDataMask),
+      ('ad_group', self._adGroupMask),
+      ('last_action_date', lambda report, mask: self._lastActionDateMask(report, mask, historyCollection=historyCollection)),
+    ]
+
+  def _dropUnselected(self, report, selected: Optional[np.ndarray]):
+    if selected is None: return
+    report.drop(report.index[~selected], inplace=True)
 
   def _filter_future(self, report):
+    self._dropUnselected(report, self._futureMask(report, np.ones(len(report), dtype=bool)))
+
+  def _futureMask(self, report, mask) -> Optional[np.ndarray]:
     fetch_raw_report_hour = datetime(self.fetch_raw_report_time.year, self.fetch_raw_report_time.month, self.fetch_raw_report_time.day, self.fetch_raw_report_time.hour)
-    report.drop(report.index[report.date >= fetch_raw_report_hour], inplace=True)
+    return ~(report.date >= fetch_raw_report_hour).values
 
   def _processReportForImpact(self, report, historyCollection):
     if report.empty: return
@@ -125,50 +255,67 @@ class RuleReporter:
     self._filterByActionTarget(report, historyCollection=historyCollection)
 
   def _filterProcessedData(self, report):
-    if self.dataCheckRange is None: return
+    self._dropUnselected(report, self._processedDataMask(report, np.ones(len(report), dtype=bool)))
+
+  def _processedDataMask(self, report, mask) -> Optional[np.ndarray]:
+    if self.dataCheckRange is None: return None
 
-    maxDate = report.date.max()
+    maxDate = report.date[mask].max()
     checkDate = maxDate - timedelta(milliseconds=self.dataCheckRange)
 
-    report.drop(report.index[report.date <= checkDate], inplace=True)
+    return ~(report.date <= checkDate).values
 
   def _filterByAdGroup(self, report):
-    if self.adGroupID is None: return
+    self._dropUnselected(report, self._adGroupMask(report, np.ones(len(report), dtype=bool)))
 
-    report.drop(report.index[report.adGroupId != int(self.adGroupID)], inplace=True)
+  def _adGroupMask(self, report, mask) -> Optional[np.ndarray]:
+    if self.adGroupID is None: return None
+
+    return (report.adGroupId == int(self.adGroupID)).values
 
   def _filterByLastActionDate(self, report, historyCollection):
-    if self.ruleID is None: return
+    self._dropUnselected(report, self._lastActionDateMask(report, np.ones(len(report), dtype=bool), historyCollection=historyCollection))
+
+  def _lastActionDateMask(self, report, mask, historyCollection) -> Optional[np.ndarray]:
+    if self.ruleID is None: return None
 
-    history = historyCollection.aggregate([
+    history = pd.DataFrame(list(historyCollection.aggregate([
         {"$match": {"ruleID": self.ruleID, "targetType": self.reportType.historyTargetType, "consumedData": True}},
         {"$group": {"_id": "$targetID", "lastActionTakenDate": {"$max": "$lastDataCheckedDate"}}},
-        {"$sort": {"lastActionTakenDate": -1}},
-    ])
+    ])), columns=["_id", "lastActionTakenDate"])
+    if history.empty: return None
 
-    for h in history:
-        report.drop(report.index[(report[self.reportType.groupByID] == h["_id"]) & (report.date <= h["lastActionTakenDate"])],
-                    inplace=True)
+    lastActionTakenDates = report[self.reportType.groupByID].map(pd.to_datetime(history.lastActionTakenDate).set_axis(history["_id"]))
+    return ~(report.date <= lastActionTakenDates).values
 
   def _filterByActionTarget(self, report, historyCollection):
       if self.ruleID is None: return
 
-      report["actions"] = 0
-
-      history = historyCollection.find({"ruleID": self.ruleID, "targetType": self.reportType.historyTargetType}, {"historyCreationDate": True, "targetID": True})
-
-      for h in history:
-          targetID = h["targetID"]
-          historyDate = h["historyCreationDate"]
-          targetRows = report.loc[(report.date <= historyDate) & (report[self.reportType.groupByID] == targetID)]
-          if targetRows.empty: continue
-          report.at[targetRows.date.idxmax(), 'actions'] += 1
+      history = pd.DataFrame(list(historyCollection.find({"ruleID": self.ruleID, "targetType": self.reportType.historyTargetType}, {"historyCreationDate": True, "targetID": True})), columns=["historyCreationDate", "targetID"])
+      report["actions"] = self._countActionsByTarget(report, history=history)
 
       report["totalActions"] = report["actions"].groupby(report[self.reportType.groupByID]).transform('sum')
       report.drop(
           report.index[report.totalActions == 0],
           inplace=True)
 
+  def _countActionsByTarget(self, report, history):
+      # attribute each action to the latest report row of its target at or before the action, preferring the first of any rows with the same date
+      rows = pd.DataFrame({"target": report[self.reportType.groupByID].values, "date": report.date.values, "position": np.arange(len(report))})
+      rows = rows.loc[rows.target.notna() & rows.date.notna()]
+      rows = rows.loc[~rows.duplicated(subset=["target", "date"])]
+      targets = pd.Index(rows.target.unique())
+      rows["target"] = targets.get_indexer(rows.target)
+
+      history = pd.DataFrame({"target": targets.get_indexer(history.targetID), "date": pd.to_datetime(history.historyCreationDate)})
+      history = history.loc[(history.target >= 0) & history.date.notna()]
+      if history.empty or rows.empty:
+          return np.zeros(len(report), dtype=int)
+      history["date"] = history.date.astype(rows.date.dtype)
+
+      matches = pd.merge_asof(history.sort_values("date"), rows.sort_values("date"), on="date", by="target", direction="backward")
+      return np.bincount(matches.position.dropna().astype(int), minlength=len(report))
+
   def _invalidateZeroDivisorData(self, report):
       report.loc[report.taps == 0, "avgCPT"] = np.nan
       report.loc[report.installs == 0, "avgCPA"] = np.nan
@@ -176,4 +323,90 @@ class RuleReporter:
   def _map_rule_columns(self, report: pd.DataFrame):
     for rule_column, column in self.rule_column_map.items():
       report[rule_column.value] = report[column] if column in report.columns else None
-  
\ No newline at end of file
+
+class RuleRawReportStore:
+  raw_reporters: Dict[Tuple, RuleReporter]
+  held_reporters: Dict[Tuple, List[Tuple[RuleReporter, datetime, datetime, RuleReportGranularity]]]
+  key_locks: Dict[Tuple, threading.Lock]
+  lock: threading.Lock
+
+  def __init__(self):
+    self.raw_reporters = {}
+    self.held_reporters = {}
+    self.key_locks = {}
+    self.lock = threading.Lock()
+
+  def fetchRawReport(self, key: Tuple, reporter: RuleReporter, startDate, endDate, granularity, api, campaign, seriesKey: Optional[Tuple]=None):
+    with self.lock:
+      key_lock = self.key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+      if key in self.raw_reporters:
+        reporter.useRawReport(self.raw_reporters[key], campaign=campaign)
+        return
+      if not self.rollUpRawReport(reporter=reporter, startDate=startDate, endDate=endDate, granularity=granularity, campaign=campaign, seriesKey=seriesKey):
+        reporter.fetchRawReport(startDate=startDate, endDate=endDate, granularity=granularity, api=api, campaign=campaign)
+      self.raw_reporters[key] = reporter
+      if seriesKey is not None:
+        with self.lock:
+          self.held_reporters.setdefault(seriesKey, []).append((reporter, startDate, endDate, RuleReportGranularity(granularity)))
+
+  def rollUpRawReport(self, reporter: RuleReporter, startDate, endDate, granularity, campaign, seriesKey: Optional[Tuple]) -> bool:
+    if seriesKey is None:
+      return False
+    granularities = list(RuleReportGranularity)
+    with self.lock:
+      held = list(self.held_reporters.get(seriesKey, []))
+    # a finer report held for a window covering the requested one can be rolled up instead of fetched
+    for heldReporter, heldStartDate, heldEndDate, heldGranularity in held:
+      if granularities.index(heldGranularity) >= granularities.index(RuleReportGranularity(granularity)):
+        continue
+      if pd.Timestamp(heldStartDate).normalize() > pd.Timestamp(startDate).normalize() or pd.Timestamp(heldEndDate).normalize() < pd.Timestamp(endDate).normalize():
+        continue
+      rawReport = reporter.rollUpRawReport(rawReport=heldReporter.rawReport, startDate=startDate, endDate=endDate, granularity=granularity)
+      if rawReport is None:
+        continue
+      reporter.useRawReport(heldReporter, campaign=campaign)
+      reporter.rawReport = rawReport
+      return True
+    return False
+
+class RuleIncrementalRawReportStore(RuleRawReportStore):
+  series_reporters: Dict[Tuple, Tuple[RuleReporter, datetime, datetime]]
+  lookback: timedelta
+  refresh_interval: timedelta
+
+  def __init__(self, lookback: timedelta=timedelta(days=3), refresh_interval: timedelta=timedelta(minutes=5)):
+    super().__init__()
+    self.series_reporters = {}
+    self.lookback = lookback
+    self.refresh_interval = refresh_interval
+
+  def fetchRawReport(self, key: Tuple, reporter: RuleReporter, startDate, endDate, granularity, api, campaign, seriesKey: Optional[Tuple]=None):
+    if seriesKey is None:
+      return super().fetchRawReport(key=key, reporter=reporter, startDate=startDate, endDate=endDate, granularity=granularity, api=api, campaign=campaign)
+    granularitySeriesKey = (*seriesKey, RuleReportGranularity(granularity).value)
+    with self.lock:
+      key_lock = self.key_locks.setdefault(granularitySeriesKey, threading.Lock())
+    with key_lock:
+      self.expireRawReports()
+      # the store outlives a run, so only reports fetched moments ago are reused or rolled up as is
+      if key in self.raw_reporters:
+        reporter.useRawReport(self.raw_reporters[key], campaign=campaign)
+        return
+      previous, _, _ = self.series_reporters.get(granularitySeriesKey, (None, None, None))
+      if previous is not None or not self.rollUpRawReport(reporter=reporter, startDate=startDate, endDate=endDate, granularity=granularity, campaign=campaign, seriesKey=seriesKey):
+        reporter.fetchIncrementalRawReport(previous=previous, startDate=startDate, endDate=endDate, granularity=granularity, api=api, campaign=campaign, lookback=self.lookback)
+      self.series_reporters[granularitySeriesKey] = (reporter, startDate, endDate)
+      with self.lock:
+        self.raw_reporters[key] = reporter
+        self.held_reporters.setdefault(seriesKey, []).append((reporter, startDate, endDate, RuleReportGranularity(granularity)))
+
+  def expireRawReports(self):
+    now = datetime.utcnow()
+    isFresh = lambda r: r.fetch_raw_report_time is not None and now - r.fetch_raw_report_time < self.refresh_interval
+    with self.lock:
+      self.raw_reporters = {k: r for k, r in self.raw_reporters.items() if isFresh(r)}
+      for seriesKey in list(self.held_reporters):
+        self.held_reporters[seriesKey] = [h for h in self.held_reporters[seriesKey] if isFresh(h[0])]
+        if not self.held_reporters[seriesKey]:
+          del self.held_reporters[seriesKey]
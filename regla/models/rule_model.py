@@ -2,6 +2,8 @@ from bson import ObjectId
 import json
 import pandas as pd
 import pdb
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from functools import reduce
 from math import floor
@@ -9,11 +11,17 @@ from typing import List, Dict, Optional
 
 from .context_models import RuleContext, RuleOption
 from .action_types import RuleActionType
-from .report_models import RuleReporter, RuleReportGranularity
+from .report_models import RuleReporter, RuleReportGranularity, RuleRawReportStore
 from .condition_models import RuleKPI, RuleConditionGroup
 from moda.connect import Connector
 from .channel_models import Channel
-from ..factories import channel_factory
+from .mutation_models import RuleMutationCoalescer
+from .journal_models import RuleMutationJournal, RuleJournalEntry, RuleJournalStatus
+from .history_models import RuleHistorySink
+from .monitor_models import RuleMonitorFormat
+from .action_models import RuleActionLog
+from ..factories import channel_factory, ChannelPool
+from ..errors import RuleReporterError, RuleReportersError
 
 class RuleConnection:
   options: Dict[str, any]
@@ -41,6 +49,18 @@ class RuleConnection:
   def channel_context(self) -> any:
     return self.options[RuleContext.channel_context.value]
 
+  @property
+  def channel_pool(self) -> Optional[ChannelPool]:
+    return self.options[RuleContext.channel_pool.value]
+
+  @property
+  def mutation_coalescer(self) -> Optional[RuleMutationCoalescer]:
+    return self.options[RuleContext.mutation_coalescer.value]
+
+  @property
+  def mutation_journal(self) -> Optional[RuleMutationJournal]:
+    return self.options[RuleContext.mutation_journal.value]
+
 class Rule(Connector):
     channel_identifier: Optional[str]
     orgID: Optional[any]
@@ -119,10 +139,14 @@ class Rule(Connector):
     def __repr__(self):
         return "Rule {id} (tasks: {tasks})".format(id=self._id, tasks=self.tasks)
 
-    def connect(self, credentials: Optional[any]=None, rule_collection: Optional[any]=None, history_collection: Optional[any]=None, monitor_collection: Optional[any]=None, options: Dict[str, any]={}):
-      channel = channel_factory(channel_identifier=self.channel_identifier)
-      if credentials is not None:
-        channel.connect(credentials=credentials)
+    def connect(self, credentials: Optional[any]=None, rule_collection: Optional[any]=None, history_collection: Optional[any]=None, monitor_collection: Optional[any]=None, options: Dict[str, any]={}, channel_pool: Optional[ChannelPool]=None, mutation_coalescer: Optional[RuleMutationCoalescer]=None, mutation_journal: Optional[RuleMutationJournal]=None, channel_options: Dict[str, any]={}):
+      if channel_pool is not None and credentials is not None:
+        channel = channel_pool.acquire(channel_identifier=self.channel_identifier, credentials=credentials, options=channel_options)
+      else:
+        channel_pool = None
+        channel = channel_factory(channel_identifier=self.channel_identifier, options=channel_options)
+        if credentials is not None:
+          channel.connect(credentials=credentials)
       connection_options = {
         RuleContext.now.value: datetime.utcnow(),
         RuleContext.rule.value: self,
@@ -134,6 +158,9 @@ class Rule(Connector):
         RuleContext.rule_collection.value: rule_collection,
         RuleContext.history_collection.value: history_collection,
         RuleContext.monitor_collection.value: monitor_collection,
+        RuleContext.channel_pool.value: channel_pool,
+        RuleContext.mutation_coalescer.value: mutation_coalescer,
+        RuleContext.mutation_journal.value: mutation_journal,
         **options,
       }
       self.connection = RuleConnection(options={
@@ -142,10 +169,13 @@ class Rule(Connector):
       })
 
     def disconnect(self):
-      self.connection.channel.disconnect()
+      if self.connection.channel_pool is not None:
+        self.connection.channel_pool.release(self.connection.channel)
+      else:
+        self.connection.channel.disconnect()
       self.connection = None
 
-    def getReporters(self, startDate, endDate, granularity=None, processor=None):
+    def getReporters(self, startDate, endDate, granularity=None, processor=None, rawReportStore=None):
         if self.connection.api is None:
             raise ValueError("api property is None in Rule", self)
 
@@ -154,6 +184,7 @@ class Rule(Connector):
         [reportTypes.append(t) for t in allReportTypes if not reportTypes.count(t)]
 
         reporters = {}
+        fetches = []
         for reportType in reportTypes:
             report_granularity = self.connection.channel.highest_compatible_granularity(
               report_type=reportType, 
@@ -165,28 +196,82 @@ class Rule(Connector):
               rule_id=ObjectId(self._id),
               data_check_range=self.dataCheckRange
             )
-            reporter.fetchRawReport(startDate=startDate, endDate=endDate, granularity=report_granularity, api=self.connection.api, campaign=self.connection.channel_context)
-            if processor is not None:
-                processor(reporter)
             reporters[reportType.value] = reporter
+            fetches.append((reportType, reporter, report_granularity))
+
+        def fetch(reportType, reporter, report_granularity):
+            if rawReportStore is None:
+                reporter.fetchRawReport(startDate=startDate, endDate=endDate, granularity=report_granularity, api=self.connection.api, campaign=self.connection.channel_context)
+            else:
+                rawReportStore.fetchRawReport(
+                  key=self.rawReportKey(reporter=reporter, startDate=startDate, endDate=endDate, granularity=report_granularity),
+                  reporter=reporter,
+                  startDate=startDate,
+                  endDate=endDate,
+                  granularity=report_granularity,
+                  api=self.connection.api,
+                  campaign=self.connection.channel_context,
+                  seriesKey=self.rawReportSeriesKey(reporter=reporter)
+                )
+
+        def fetchReportingErrors(reportType, reporter, report_granularity):
+            try:
+                fetch(reportType, reporter, report_granularity)
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except Exception as e:
+                return RuleReporterError(report_type=reportType.value, error=e, traceback=traceback.format_exc())
+            return None
+
+        if len(fetches) > 1:
+            with ThreadPoolExecutor(max_workers=len(fetches)) as executor:
+                errors = [e for e in executor.map(lambda f: fetchReportingErrors(*f), fetches) if e is not None]
+            if errors:
+                raise RuleReportersError(errors=errors) from errors[0].error
+        else:
+            # a single report type fails with its own error, as it did before report types were fetched concurrently
+            for f in fetches:
+                fetch(*f)
+
+        if processor is not None:
+            for reporter in reporters.values():
+                processor(reporter)
 
         return reporters
     
+    def rawReportKey(self, reporter, startDate, endDate, granularity):
+        return (self.channel_identifier, str(self.orgID), str(self.campaignID), *reporter.raw_report_key(startDate=startDate, endDate=endDate, granularity=granularity, campaign=self.connection.channel_context))
+
+    def rawReportSeriesKey(self, reporter):
+        return (self.channel_identifier, str(self.orgID), str(self.campaignID), *reporter.raw_report_series_key(campaign=self.connection.channel_context))
+
     def impactReportMetadata(self):
       return RuleImpactReportMetadata(rule=self)
 
-    def getImpactReport(self):
+    def getImpactReport(self, rawReportStore=None):
       metadata = self.impactReportMetadata()
       if not metadata.is_valid: return None
 
-      reporters: List[RuleReporter] = self.getReporters(startDate=metadata.start_date, endDate=metadata.end_date, granularity=metadata.granularity.value, processor=lambda reporter : reporter.processRawReportForImpact(historyCollection=self.connection.history_collection))
+      reporters: List[RuleReporter] = self.getReporters(startDate=metadata.start_date, endDate=metadata.end_date, granularity=metadata.granularity.value, processor=lambda reporter : reporter.processRawReportForImpact(historyCollection=self.connection.history_collection), rawReportStore=rawReportStore)
 
       report = reduce(lambda r1, r2: r1.append(r2, sort=True), [reporters[k].report for k in reporters])
 
       return report
 
-    def execute(self, startDate, endDate, granularity, debugEndDate=None):
-        reporters = self.getReporters(startDate=startDate, endDate=endDate, granularity=granularity, processor=lambda reporter : reporter.filterRawReport(historyCollection=self.connection.history_collection))
+    def execute(self, startDate, endDate, granularity, debugEndDate=None, rawReportStore=None):
+        coalescer = self.connection.mutation_coalescer
+        if coalescer is None:
+            return self._execute(startDate=startDate, endDate=endDate, granularity=granularity, debugEndDate=debugEndDate, rawReportStore=rawReportStore)
+        try:
+            return self._execute(startDate=startDate, endDate=endDate, granularity=granularity, debugEndDate=debugEndDate, rawReportStore=rawReportStore, coalescer=coalescer)
+        finally:
+            coalescer.finish(rule=self)
+
+    def _execute(self, startDate, endDate, granularity, debugEndDate=None, rawReportStore=None, coalescer=None):
+        reporters = self.getReporters(startDate=startDate, endDate=endDate, granularity=granularity, processor=lambda reporter : reporter.filterRawReport(historyCollection=self.connection.history_collection), rawReportStore=rawReportStore)
+        if coalescer is not None:
+            # reports are fetched concurrently, but adjustments are chained in rule ID order
+            coalescer.wait_turn(rule=self)
 
         if debugEndDate is not None:
             for key in reporters:
@@ -196,28 +281,38 @@ class Rule(Connector):
         results = []
         finalReport = None
         monitorInfo = []
+        monitorFormat = RuleMonitorFormat(self.connection.options[RuleContext.rule_options.value][RuleOption.monitor_format.value])
+        sourceReports = {}
         for t in self.tasks:
             action = t.actions[0]
             if len(t.actions) > 1:
                 raise ValueError("Multiple search ads actions per task are not supported", t)
 
-            reporter = reporters[self.connection.channel.report_type(action_type=action.type).value]
+            reportType = self.connection.channel.report_type(action_type=action.type)
+            reporter = reporters[reportType.value]
             report = reporter.report
+            if self.monitor and monitorFormat.shares_source_report and reportType.value not in sourceReports:
+                # rows consumed by earlier tasks can be found from their reports, so the source report is encoded before any are dropped
+                sourceReports[reportType.value] = monitorFormat.encode(report)
             reportCopy = report.copy()
             t.conditionGroup.filterData(reportCopy, groupByID=self.connection.channel.report_type(action_type=action.type).groupByID)
             result = action.adjust(api=self.connection.api, campaign=self.connection.channel_context, report=reportCopy, dryRun=self.dryRun)
 
+            logs = list(filter(lambda l: l is not None, result.logs))
             self._logHistory(
               reportCopy,
-              logs=list(filter(lambda l: l is not None, result.logs)),
+              # deferred mutations are written to history by the coalescer once they are sent
+              logs=logs if coalescer is None else coalescer.defer_history(logs=logs, last_data_checked_date=reportCopy.date.max() if not reportCopy.empty else None),
               errors=list(filter(lambda e: e is not None, result.errors)),
-              history_collection=self.connection.history_collection
+              history_collection=self.connection.history_collection,
+              actionCount=len(logs)
             )
+            self._markJournalLogged()
             if self.monitor:
                 monitorInfo.append({
-                  'report': reportCopy.to_csv(),
-                  'sourceReport': report.to_csv(),
-                  'action_report': result.action_report.to_csv() if result.action_report is not None else None,
+                  'report': monitorFormat.encode(reportCopy),
+                  'sourceReport': reportType.value if monitorFormat.shares_source_report else monitorFormat.encode(report),
+                  'action_report': monitorFormat.encode(result.action_report) if result.action_report is not None else None,
                   'apiResponse': result.apiResponse,
                 })
 
@@ -229,40 +324,121 @@ class Rule(Connector):
                 finalReport = pd.concat([finalReport, reportCopy], sort=True)
 
         if self.monitor:
-            self._logMonitorInfo(monitorInfo=monitorInfo)
+            self._logMonitorInfo(monitorInfo=monitorInfo, monitorFormat=monitorFormat, sourceReports=sourceReports)
 
         return RuleResult(report=finalReport,
                                    actionResults=results)
 
-    def _logHistory(self, report, logs, errors, history_collection):
-        now = datetime.utcnow()
-        description = "{channel} ({orgID}) → {campaign} → {adGroup} | {description}".format(channel=self.connection.channel.title, orgID=self.orgID, campaign=self.metadata["campaignName"], adGroup=self.metadata["adGroupName"], description=self.metadata["description"])
-        rule_metadata = {"userID": ObjectId(self.userID), "ruleID": ObjectId(self._id), "historyCreationDate": now, "ruleDescription": description, "dryRun": self.dryRun}
-        if not report.empty:
-          rule_metadata['lastDataCheckedDate'] = report.date.max()
+    def recoverMutations(self) -> List[RuleJournalEntry]:
+        journal = self.connection.mutation_journal
+        if journal is None:
+            return []
+        entries = journal.entries(rule_id=str(self._id), statuses=[RuleJournalStatus.pending, RuleJournalStatus.committed])
+        errors = []
+        for entry in entries:
+            if entry.status is not RuleJournalStatus.pending:
+                continue
+            # only mutations that never reached the channel are sent again; committed ones only need their history
+            action = self._journalAction(entry=entry)
+            try:
+                entry.response = action.mutate_journaled_entity(
+                  entity_series=entry.entity_series,
+                  api=self.connection.api,
+                  context=self.connection.channel_context,
+                  journal=journal,
+                  journal_id=entry.id
+                )
+                entry.status = RuleJournalStatus.committed
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except Exception as e:
+                entry.status = RuleJournalStatus.failed
+                entry.error = repr(e)
+                errors.append(e)
+
+        committed = [e for e in entries if e.status is RuleJournalStatus.committed]
+        if committed or errors:
+            self.logDeferredHistory(
+              logs=[(RuleActionLog.logWithDBRepresentation(e.log), e.last_data_checked_date) for e in committed if e.log is not None],
+              errors=errors
+            )
+        return entries
+
+    def _markJournalLogged(self):
+        journal = self.connection.mutation_journal
+        if journal is None:
+            return
+        ids = [e.id for e in journal.entries(rule_id=str(self._id), statuses=[RuleJournalStatus.committed])]
+        mark = lambda: journal.mark_logged(rule_id=str(self._id), ids=ids)
+        history_collection = self.connection.history_collection
+        if isinstance(history_collection, RuleHistorySink):
+            # buffered history is not durable until it is flushed
+            history_collection.on_flush(mark)
+        else:
+            mark()
+
+    def _journalAction(self, entry):
+        for t in self.tasks:
+            for a in t.actions:
+                if a.type.value == entry.action_type and a.adjustmentValue == entry.adjustment_value and a.adjustmentLimit == entry.adjustment_limit:
+                    return a
+        raise ValueError('Journaled mutation does not match an action of the rule', entry.id)
+
+    def logDeferredHistory(self, logs, errors):
+        description = self._historyDescription()
+        history = [{**l.dbRepresentation, **self._historyMetadata(description=description, lastDataCheckedDate=d)} for l, d in logs]
+        if errors:
+          history.append({
+            'historyType': 'error',
+            'targetID': -1,
+            'actionDescription': f'<strong>ERROR:</strong> {len(errors)} error{"s" if len(errors) != 1 else ""} occurred while sending deferred actions for rule {description}',
+            'errorDescriptions': [repr(e) for e in errors],
+            **self._historyMetadata(description=description),
+          })
+        if history:
+          self.connection.history_collection.insert_many(history)
+        self._markJournalLogged()
+
+    def _historyDescription(self):
+        return "{channel} ({orgID}) → {campaign} → {adGroup} | {description}".format(channel=self.connection.channel.title, orgID=self.orgID, campaign=self.metadata["campaignName"], adGroup=self.metadata["adGroupName"], description=self.metadata["description"])
+
+    def _historyMetadata(self, description, lastDataCheckedDate=None):
+        rule_metadata = {"userID": ObjectId(self.userID), "ruleID": ObjectId(self._id), "historyCreationDate": datetime.utcnow(), "ruleDescription": description, "dryRun": self.dryRun}
+        if lastDataCheckedDate is not None:
+          rule_metadata['lastDataCheckedDate'] = lastDataCheckedDate
+        return rule_metadata
+
+    def _logHistory(self, report, logs, errors, history_collection, actionCount=None):
+        if actionCount is None:
+          actionCount = len(logs)
+        description = self._historyDescription()
+        rule_metadata = self._historyMetadata(description=description, lastDataCheckedDate=report.date.max() if not report.empty else None)
         history = [{**l.dbRepresentation, **rule_metadata} for l in logs]
         if errors:
           history.append({
             'historyType': 'error',
             'targetID': -1,
-            'actionDescription': f'<strong>ERROR:</strong> {len(errors)} error{"s" if len(errors) != 1 else ""} occurred while attempting the last {len(logs)} action{"s" if len(logs) != 1 else ""} for rule {description}',
+            'actionDescription': f'<strong>ERROR:</strong> {len(errors)} error{"s" if len(errors) != 1 else ""} occurred while attempting the last {actionCount} action{"s" if actionCount != 1 else ""} for rule {description}',
             'errorDescriptions': [repr(e) for e in errors],
             **rule_metadata,
           })
         history.append({
           'historyType': 'execute',
           'targetID': -1,
-          'actionCount': len(logs),
-          'actionDescription': f'Attempting {len(logs)} action{"s" if len(logs) != 1 else ""} for rule {description}',
+          'actionCount': actionCount,
+          'actionDescription': f'Attempting {actionCount} action{"s" if actionCount != 1 else ""} for rule {description}',
           **rule_metadata,
         })
         history_collection.insert_many(history)
 
-    def _logMonitorInfo(self, monitorInfo):
+    def _logMonitorInfo(self, monitorInfo, monitorFormat=RuleMonitorFormat.csv, sourceReports={}):
         if not monitorInfo: return
 
         now = datetime.utcnow()
         log = {"ruleID": ObjectId(self._id), "logCreationDate": now, "ruleDescription": self.metadata["description"], "tasks": monitorInfo}
+        if monitorFormat.shares_source_report:
+            log["format"] = monitorFormat.value
+            log["sourceReports"] = sourceReports
         self.connection.monitor_collection.insert_one(log)
 
 
@@ -0,0 +1,79 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Deque, Dict, List, Optional
+from .rule_model import Rule
+from ..factories import channel_factory
+
+class RuleRunResult:
+  rule: Rule
+  result: Optional[any]
+  error: Optional[Exception]
+
+  def __init__(self, rule: Rule, result: Optional[any]=None, error: Optional[Exception]=None):
+    self.rule = rule
+    self.result = result
+    self.error = error
+
+  def serialize_result(self):
+    return {
+      'ruleID': str(self.rule._id),
+      'result': self.result,
+      'error': repr(self.error) if self.error is not None else None,
+    }
+
+class RuleRunner:
+  max_workers: int
+  channel_limits: Dict[str, Optional[int]]
+
+  def __init__(self, max_workers: int=1, channel_limits: Dict[str, Optional[int]]={}):
+    assert max_workers > 0
+    self.max_workers = max_workers
+    self.channel_limits = {**channel_limits}
+
+  def channel_limit(self, channel_identifier: str) -> Optional[int]:
+    if channel_identifier in self.channel_limits:
+      return self.channel_limits[channel_identifier]
+    return channel_factory(channel_identifier=channel_identifier).concurrency_limit
+
+  def run(self, rules: List[Rule], task: Callable[[Rule], any]) -> List[RuleRunResult]:
+    results: List[Optional[RuleRunResult]] = [None] * len(rules)
+    pending: Dict[str, Deque[int]] = {}
+    for index, rule in enumerate(rules):
+      pending.setdefault(rule.channel_identifier, deque()).append(index)
+    limits = {c: self.channel_limit(channel_identifier=c) for c in pending}
+    assert all(l is None or l > 0 for l in limits.values()), 'Channel concurrency limits must be positive'
+    running = {c: 0 for c in pending}
+    futures = {}
+
+    def can_submit(channel_identifier: str) -> bool:
+      if not pending[channel_identifier] or len(futures) >= self.max_workers:
+        return False
+      return limits[channel_identifier] is None or running[channel_identifier] < limits[channel_identifier]
+
+    with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+      while any(pending.values()) or futures:
+        # submit one rule per channel in turn so that no channel starves the others
+        submitted = True
+        while submitted:
+          submitted = False
+          for channel_identifier in pending:
+            if not can_submit(channel_identifier=channel_identifier):
+              continue
+            index = pending[channel_identifier].popleft()
+            futures[executor.submit(self.run_rule, rules[index], task)] = (index, channel_identifier)
+            running[channel_identifier] += 1
+            submitted = True
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+          index, channel_identifier = futures.pop(future)
+          running[channel_identifier] -= 1
+          results[index] = future.result()
+    return results
+
+  def run_rule(self, rule: Rule, task: Callable[[Rule], any]) -> RuleRunResult:
+    try:
+      return RuleRunResult(rule=rule, result=task(rule))
+    except (KeyboardInterrupt, SystemExit):
+      raise
+    except Exception as e:
+      return RuleRunResult(rule=rule, error=e)
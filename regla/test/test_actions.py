@@ -0,0 +1,304 @@
+import unittest
+from unittest import mock
+import pandas as pd
+import numpy as np
+from datetime import datetime, timedelta
+
+from ..models.context_models import RuleContext, RuleOption
+from ..models.rate_limit_models import RuleRateLimiter
+from ..models.channel_models import Channel, ChannelOption
+from ..models.rule_model import Rule
+from ..models.action_models import RuleMultiplierAction, RuleActionReportColumn, RuleActionPreference, RuleActionAdjustmentType, RuleActionTargetType
+from ..errors import RuleActionEntityError
+
+
+class BudgetAction(RuleMultiplierAction):
+    @property
+    def adjustment_type(self):
+        return RuleActionAdjustmentType.budget
+
+    @property
+    def entity_granularity(self):
+        return RuleActionTargetType.campaign
+
+    @property
+    def precision(self):
+        return 2
+
+
+class RowBudgetAction(BudgetAction):
+    adjustedEntities = 0
+
+    def entity_adjustment(self, entity_series, context):
+        RowBudgetAction.adjustedEntities += 1
+        return super().entity_adjustment(entity_series=entity_series, context=context)
+
+
+def action_report(states):
+    report = pd.DataFrame({
+        RuleActionReportColumn.target_id.value: [str(i) for i in range(len(states))],
+        RuleActionReportColumn.unadjusted_state.value: pd.Series(states, dtype=object),
+    })
+    report[RuleActionReportColumn.preference.value] = RuleActionPreference.make_adjustment.code
+    report[RuleActionReportColumn.preference_messages.value] = [[] for _ in range(len(report))]
+    for column in [RuleActionReportColumn.adjustment.value, RuleActionReportColumn.error.value]:
+        report[column] = None
+    return report
+
+
+class Test_entity_columns(unittest.TestCase):
+    def setUp(self):
+        self.states = [1., 9.5, 10., 12., 0., 3.333]
+
+    def test_multiplier_adjustments(self):
+        """
+        Test vectorized multiplier adjustments against the row-wise adjustments
+        """
+        for value, limit in [(1.5, 10.), (0.5, 2.), (1., 5.)]:
+            vectorized = action_report(self.states)
+            BudgetAction(adjustmentValue=value, adjustmentLimit=limit).add_action_report_adjustments(action_report=vectorized, api=None, context={})
+            RowBudgetAction.adjustedEntities = 0
+            rowwise = action_report(self.states)
+            RowBudgetAction(adjustmentValue=value, adjustmentLimit=limit).add_action_report_adjustments(action_report=rowwise, api=None, context={})
+
+            self.assertEqual(RowBudgetAction.adjustedEntities, len(self.states))
+            self.assertEqual(list(vectorized.adjustment), list(rowwise.adjustment))
+
+    def test_multiplier_rounding(self):
+        """
+        Test vectorized multiplier adjustments rounding and limiting like the row-wise adjustments
+        """
+        for states, value, limit in [([15., 16.11, 2.675, 1.005], 1.005, 100.), ([15., 16.11, 2.675, 1.005], 0.5, 0.), ([3, 5, 40], 2, 50), ([1., 2.], 1.5, None)]:
+            vectorized = action_report(states)
+            BudgetAction(adjustmentValue=value, adjustmentLimit=limit).add_action_report_adjustments(action_report=vectorized, api=None, context={})
+            rowwise = action_report(states)
+            RowBudgetAction(adjustmentValue=value, adjustmentLimit=limit).add_action_report_adjustments(action_report=rowwise, api=None, context={})
+
+            self.assertEqual([(a, type(a)) for a in vectorized.adjustment], [(a, type(a)) for a in rowwise.adjustment])
+            self.assertEqual([type(e) for e in vectorized.error], [type(e) for e in rowwise.error])
+        self.assertEqual(list(vectorized.error.map(type)), [RuleActionEntityError] * 2)
+
+    def test_entity_errors(self):
+        """
+        Test falling back to row-wise adjustments to capture entity errors
+        """
+        report = action_report([1., "unknown", 3.])
+        BudgetAction(adjustmentValue=2., adjustmentLimit=10.).add_action_report_adjustments(action_report=report, api=None, context={})
+
+        self.assertEqual(list(report.adjustment), [2., None, 6.])
+        self.assertIsNone(report.error[0])
+        self.assertIsInstance(report.error[1], RuleActionEntityError)
+        self.assertIsNone(report.error[2])
+
+    def test_preference(self):
+        """
+        Test adding a preference to selected entities
+        """
+        report = action_report(self.states)
+        BudgetAction().add_preference(
+            action_report=report,
+            location=report.loc[report.unadjusted_state.astype(float) > 9.],
+            preference=RuleActionPreference.modify_adjustment,
+            message_callback=lambda e: f'state {e[RuleActionReportColumn.unadjusted_state.value]}'
+        )
+
+        self.assertEqual(list(report.preference), [RuleActionPreference.make_adjustment.code] + [RuleActionPreference.modify_adjustment.code] * 3 + [RuleActionPreference.make_adjustment.code] * 2)
+        self.assertEqual(report.preference.dtype, np.int64)
+        self.assertEqual(list(report.preference_messages), [[], ['state 9.5'], ['state 10.0'], ['state 12.0'], [], []])
+
+
+class Test_preference(unittest.TestCase):
+    def test_codes(self):
+        """
+        Test ordering preferences by code
+        """
+        codes = [p.code for p in RuleActionPreference]
+        self.assertEqual(codes, sorted(codes))
+        self.assertEqual([RuleActionPreference.from_code(c) for c in codes], list(RuleActionPreference))
+        self.assertLess(RuleActionPreference.make_adjustment, RuleActionPreference.prevent_adjustment)
+
+
+class HistoryAction(BudgetAction):
+    def __init__(self, history):
+        super().__init__()
+        self.history = history
+
+    def get_entity_history(self, entity_ids, context):
+        return self.history
+
+
+class Test_entity_history(unittest.TestCase):
+    def test_history(self):
+        """
+        Test attaching sorted history to each entity
+        """
+        history = [
+            {"targetID": 1, "historyCreationDate": datetime(2020, 1, 3)},
+            {"targetID": 0, "historyCreationDate": datetime(2020, 1, 2)},
+            {"historyCreationDate": datetime(2020, 1, 2)},
+            {"targetID": 1, "historyCreationDate": datetime(2020, 1, 1)},
+        ]
+        report = action_report([1., 2., 3.])
+        HistoryAction(history=history).add_action_report_history(entity_ids=[], action_report=report, context={})
+
+        self.assertEqual(list(report.history), [[history[1]], [history[3], history[0]], []])
+
+
+class HistoryCursor(list):
+    def sort(self, key):
+        return self
+
+
+class HistoryCollection:
+    def __init__(self):
+        self.queries = []
+
+    def find(self, filter, projection=None):
+        self.queries.append((filter, projection))
+        return HistoryCursor()
+
+
+class WindowAction(BudgetAction):
+    def __init__(self, lookback):
+        super().__init__()
+        self.lookback = lookback
+
+    @property
+    def history_fields(self):
+        return ['adjustmentFrom']
+
+    def history_lookback(self, context):
+        return self.lookback
+
+
+class Test_entity_history_query(unittest.TestCase):
+    def setUp(self):
+        class Rule:
+            userID = '5c9a7d2e8f1b4a0012345678'
+        class Channel:
+            identifier = 'channel'
+        self.collection = HistoryCollection()
+        self.context = {
+            RuleContext.now.value: datetime(2020, 1, 10),
+            RuleContext.rule.value: Rule(),
+            RuleContext.channel.value: Channel(),
+            RuleContext.history_collection.value: self.collection,
+            RuleContext.rule_options.value: RuleOption.get_defaults(),
+        }
+
+    def test_pushdown(self):
+        """
+        Test projecting history fields and bounding the history window
+        """
+        WindowAction(lookback=timedelta(days=2)).get_entity_history(entity_ids=['1'], context=self.context)
+
+        filter, projection = self.collection.queries[0]
+        self.assertEqual(filter['historyCreationDate'], {'$gte': datetime(2020, 1, 8)})
+        self.assertEqual(projection, {'targetID': True, 'historyCreationDate': True, 'adjustmentFrom': True})
+
+    def test_no_history(self):
+        """
+        Test skipping the history query for an empty window
+        """
+        self.assertEqual(WindowAction(lookback=timedelta()).get_entity_history(entity_ids=['1'], context=self.context), [])
+        self.assertEqual(self.collection.queries, [])
+
+
+class SingleMutationAction(BudgetAction):
+    def mutate_entity(self, entity_series, api, context):
+        if entity_series[RuleActionReportColumn.target_id.value] == '1':
+            raise ValueError('rejected')
+        return {'mutated': entity_series[RuleActionReportColumn.target_id.value]}
+
+
+class BatchMutationAction(SingleMutationAction):
+    batches = []
+
+    @property
+    def mutation_batch_size(self):
+        return 2
+
+    def mutate_entities(self, location, api, context):
+        BatchMutationAction.batches.append(list(location[RuleActionReportColumn.target_id.value]))
+        return [ValueError('rejected') if i == '1' else {'mutated': i} for i in location[RuleActionReportColumn.target_id.value]]
+
+
+class MutationChannel(Channel):
+    @property
+    def identifier(self):
+        return "mutation_channel"
+
+    def rule_context(self, options={}):
+        return None
+
+
+class Test_mutation(unittest.TestCase):
+    def report(self):
+        report = action_report([1., 2., 3.])
+        report[RuleActionReportColumn.api_request.value] = True
+        report[RuleActionReportColumn.api_response.value] = None
+        report[RuleActionReportColumn.dry_run.value] = False
+        return report
+
+    def test_batches(self):
+        """
+        Test mapping batch mutation responses and errors to entities
+        """
+        BatchMutationAction.batches = []
+        report = self.report()
+        BatchMutationAction().commit_action_report_requests(api=None, action_report=report, context={})
+
+        self.assertEqual(BatchMutationAction.batches, [['0', '1'], ['2']])
+        self.assertEqual(list(report.api_response), [{'mutated': '0'}, None, {'mutated': '2'}])
+        self.assertEqual([type(e) for e in report.error], [type(None), RuleActionEntityError, type(None)])
+
+    def test_single_fallback(self):
+        """
+        Test mutating entities one by one without a batch mutation
+        """
+        report = self.report()
+        SingleMutationAction().commit_action_report_requests(api=None, action_report=report, context={})
+
+        self.assertEqual(list(report.api_response), [{'mutated': '0'}, None, {'mutated': '2'}])
+        self.assertEqual([type(e) for e in report.error], [type(None), RuleActionEntityError, type(None)])
+
+    def test_single_rate_limit(self):
+        """
+        Test spending rate limit tokens only on mutations that are sent
+        """
+        limiter = mock.Mock()
+        report = self.report()
+        committed = SingleMutationAction().commit_action_report_batches(action_report=report, location=report, api=None, context={}, limiter=limiter)
+
+        self.assertEqual(committed, 0)
+        limiter.acquire.assert_not_called()
+
+    def test_concurrent(self):
+        """
+        Test recording concurrent mutations by entity
+        """
+        channel = MutationChannel(options={
+            ChannelOption.mutation_workers.value: 3,
+            ChannelOption.mutation_rate.value: 1000.,
+        })
+        report = self.report()
+        SingleMutationAction().commit_action_report_requests(api=None, action_report=report, context={RuleContext.channel.value: channel})
+
+        self.assertEqual(list(report.api_response), [{'mutated': '0'}, None, {'mutated': '2'}])
+        self.assertEqual([type(e) for e in report.error], [type(None), RuleActionEntityError, type(None)])
+        self.assertEqual(channel.mutation_workers, 3)
+        self.assertIs(channel.mutation_rate_limiter, RuleRateLimiter.channel_limiter(channel_identifier="mutation_channel", rate=1.))
+        self.assertLess(channel.mutation_rate_limiter.tokens, channel.mutation_rate_limiter.burst)
+
+    def test_connect_channel_options(self):
+        """
+        Test passing channel options to the channel a rule connects
+        """
+        with mock.patch("regla.models.rule_model.channel_factory", side_effect=lambda channel_identifier, options: MutationChannel(options=options)):
+            rule = Rule(channel_identifier="mutation_channel", options={})
+            rule.connect(channel_options={ChannelOption.mutation_workers.value: 3})
+
+        self.assertEqual(rule.connection.channel.mutation_workers, 3)
+
+if __name__ == '__main__':
+    unittest.main()
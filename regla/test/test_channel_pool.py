@@ -0,0 +1,75 @@
+import unittest
+from unittest import mock
+
+from ..models.channel_models import Channel
+from ..factories.channel_pool import ChannelPool
+
+
+class CountingChannel(Channel):
+    connectCount = 0
+
+    def connect(self, credentials):
+        CountingChannel.connectCount += 1
+        self.api = credentials
+
+
+class Test_channel_pool(unittest.TestCase):
+    def setUp(self):
+        CountingChannel.connectCount = 0
+        patcher = mock.patch("regla.factories.channel_pool.channel_factory", side_effect=lambda channel_identifier, options: CountingChannel(options=options))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reuse(self):
+        """
+        Test reusing a released channel with the same credentials
+        """
+        pool = ChannelPool()
+        channel = pool.acquire(channel_identifier="google_ads", credentials={"token": "a"})
+        pool.release(channel)
+
+        self.assertIs(pool.acquire(channel_identifier="google_ads", credentials={"token": "a"}), channel)
+        self.assertIsNot(pool.acquire(channel_identifier="google_ads", credentials={"token": "b"}), channel)
+        self.assertIsNot(pool.acquire(channel_identifier="google_ads", credentials={"token": "a"}), channel)
+        self.assertEqual(CountingChannel.connectCount, 3)
+
+    def test_options(self):
+        """
+        Test creating channels with their options and sharing them only with the same options
+        """
+        pool = ChannelPool()
+        channel = pool.acquire(channel_identifier="google_ads", credentials={"token": "a"}, options={"mutation_workers": 4})
+        pool.release(channel)
+
+        self.assertEqual(channel.mutation_workers, 4)
+        self.assertIsNot(pool.acquire(channel_identifier="google_ads", credentials={"token": "a"}), channel)
+        self.assertIs(pool.acquire(channel_identifier="google_ads", credentials={"token": "a"}, options={"mutation_workers": 4}), channel)
+
+    def test_max_size(self):
+        """
+        Test disconnecting the least recently released channels beyond the maximum size
+        """
+        pool = ChannelPool(max_size=1)
+        first = pool.acquire(channel_identifier="google_ads", credentials={"token": "a"})
+        second = pool.acquire(channel_identifier="google_ads", credentials={"token": "b"})
+        pool.release(first)
+        pool.release(second)
+
+        self.assertIsNone(first.api)
+        self.assertIsNotNone(second.api)
+        self.assertIs(pool.acquire(channel_identifier="google_ads", credentials={"token": "b"}), second)
+
+    def test_idle_timeout(self):
+        """
+        Test disconnecting channels that have been idle too long
+        """
+        pool = ChannelPool(idle_timeout=0)
+        channel = pool.acquire(channel_identifier="google_ads", credentials={"token": "a"})
+        pool.release(channel)
+        pool.evict_idle()
+
+        self.assertIsNone(channel.api)
+        self.assertIsNot(pool.acquire(channel_identifier="google_ads", credentials={"token": "a"}), channel)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,7 @@ import pandas as pd
 import numpy as np
 from pandas.util.testing import assert_frame_equal, assert_index_equal
 
-from ..models.condition_models import RuleKPI, RuleCondition, RuleConditionalOperator, RuleConditionGroup, RuleConditionGroupOperator
+from ..models.condition_models import RuleKPI, RuleCondition, RuleConditionalOperator, RuleConditionGroup, RuleConditionGroupOperator, RuleConditionPlanStep
 
 
 class Test_conditional_operator(unittest.TestCase):
@@ -271,6 +271,138 @@ class Test_condition_group(unittest.TestCase):
         }
         assert_frame_equal(self.df.sort_index(axis=1), pd.DataFrame(d).sort_index(axis=1))
 
+    def test_mask(self):
+        """
+        Test the selected mask of a nested group
+        """
+        df = pd.DataFrame({
+            "keywordId": [1, 2, 3, 4],
+            "localSpend": [4., 4., 1., 0.],
+            "installs": [1., 0., 0., 2.],
+        }, index=[10, 20, 30, 40])
+        subgroup = RuleConditionGroup(conditions=[RuleCondition(kpi=RuleKPI("totalSpend"),
+                                                                       operator=RuleConditionalOperator("equal"),
+                                                                       comparisonValue=0.)],
+                                        subgroups=[],
+                                        operator=RuleConditionGroupOperator.all)
+        group = RuleConditionGroup(conditions=[RuleCondition(kpi=RuleKPI("reavgCPA"),
+                                                                       operator=RuleConditionalOperator("greater"),
+                                                                       comparisonValue=3.)],
+                                        subgroups=[subgroup],
+                                        operator=RuleConditionGroupOperator.any)
+
+        mask = group.selectedMask(df, groupByID="keywordId")
+
+        np.testing.assert_array_equal(mask, np.array([True, True, False, True]))
+        assert_index_equal(group.selectedIndex(df, groupByID="keywordId"), pd.Int64Index([10, 20, 40]))
+
+    def test_filter_entity_rows(self):
+        """
+        Test filtering data with several rows per entity
+        """
+        df = pd.DataFrame({
+            "keywordId": pd.Series([1, 2, 1, 2, 3]),
+            "localSpend": pd.Series([1., 1., 3., 0., 1.]),
+            "installs": pd.Series([1., 0., 0., 1., 0.]),
+        })
+        group = RuleConditionGroup(conditions=[RuleCondition(kpi=RuleKPI("reavgCPA"),
+                                                                       operator=RuleConditionalOperator("greater"),
+                                                                       comparisonValue=1.5)],
+                                        subgroups=[],
+                                        operator=RuleConditionGroupOperator.all)
+
+        group.filterData(df, groupByID="keywordId")
+
+        assert_index_equal(df.index, pd.Int64Index([0, 2]))
+        self.assertEqual(list(df.totalSpend), [4., 4.])
+        self.assertEqual(list(df.totalConversions), [1., 1.])
+        self.assertEqual(list(df.reavgCPA), [4., 4.])
+
+    def test_filter_helper_columns(self):
+        """
+        Test filtering data keeps only the first condition's KPI columns
+        """
+        df = pd.DataFrame({
+            "keywordId": pd.Series([1, 2, 3]),
+            "localSpend": pd.Series([1., 2., 3.]),
+            "taps": pd.Series([1., 1., 1.]),
+            "installs": pd.Series([1., 1., 0.]),
+        })
+        subgroup = RuleConditionGroup(conditions=[RuleCondition(kpi=RuleKPI("reavgCPT"),
+                                                                       operator=RuleConditionalOperator("greater"),
+                                                                       comparisonValue=1.)],
+                                        subgroups=[],
+                                        operator=RuleConditionGroupOperator.all)
+        group = RuleConditionGroup(conditions=[RuleCondition(kpi=RuleKPI("totalSpend"),
+                                                                       operator=RuleConditionalOperator("less"),
+                                                                       comparisonValue=3.),
+                                               RuleCondition(kpi=RuleKPI("reavgCPA"),
+                                                                       operator=RuleConditionalOperator("less"),
+                                                                       comparisonValue=3.)],
+                                        subgroups=[subgroup],
+                                        operator=RuleConditionGroupOperator.all)
+
+        group.filterData(df, groupByID="keywordId")
+
+        assert_index_equal(df.index, pd.Int64Index([1]))
+        self.assertEqual(list(df.columns), ["keywordId", "localSpend", "taps", "installs", "totalSpend"])
+
+class Test_condition_plan(unittest.TestCase):
+    def setUp(self):
+        """
+        Create sample data
+        """
+        self.df = pd.DataFrame({
+            "keywordId": [1, 2, 3, 4],
+            "localSpend": [1., 2., 3., 4.],
+        })
+
+    def condition(self, operator, value):
+        return RuleCondition(kpi=RuleKPI("totalSpend"),
+                             operator=RuleConditionalOperator(operator),
+                             comparisonValue=value)
+
+    def test_flatten(self):
+        """
+        Test flattening nested groups with the same operator
+        """
+        inner = RuleConditionGroup(conditions=[self.condition("less", 4.), self.condition("greater", 1.)],
+                                   subgroups=[RuleConditionGroup(conditions=[], subgroups=[], operator=RuleConditionGroupOperator.all)],
+                                   operator=RuleConditionGroupOperator.all)
+        group = RuleConditionGroup(conditions=[self.condition("greater", 1.)],
+                                   subgroups=[inner],
+                                   operator=RuleConditionGroupOperator.all)
+
+        steps = group.plan.steps
+        self.assertEqual([s[0] for s in steps], [RuleConditionPlanStep.condition, RuleConditionPlanStep.condition, RuleConditionPlanStep.combine])
+        self.assertEqual(steps[-1][2], 2)
+        np.testing.assert_array_equal(group.selectedMask(self.df, groupByID="keywordId"), np.array([False, True, True, False]))
+
+    def test_constant(self):
+        """
+        Test folding empty groups
+        """
+        group = RuleConditionGroup(conditions=[self.condition("greater", 1.)],
+                                   subgroups=[RuleConditionGroup(conditions=[], subgroups=[], operator=RuleConditionGroupOperator.all)],
+                                   operator=RuleConditionGroupOperator.any)
+
+        self.assertEqual(group.plan.steps, [(RuleConditionPlanStep.constant, True)])
+        np.testing.assert_array_equal(group.selectedMask(self.df, groupByID="keywordId"), np.ones(4, dtype=bool))
+
+    def test_cache(self):
+        """
+        Test sharing plans between groups with the same ID and content
+        """
+        first = RuleConditionGroup(conditions=[self.condition("greater", 1.)], subgroups=[], operator=RuleConditionGroupOperator.all)
+        second = RuleConditionGroup(conditions=[self.condition("greater", 1.)], subgroups=[], operator=RuleConditionGroupOperator.all)
+        changed = RuleConditionGroup(conditions=[self.condition("greater", 2.)], subgroups=[], operator=RuleConditionGroupOperator.all)
+        first._id = second._id = changed._id = "5c9a7d2e8f1b4a0012345678"
+
+        self.assertEqual(first.version, second.version)
+        self.assertNotEqual(first.version, changed.version)
+        self.assertIs(first.plan, second.plan)
+        self.assertIsNot(first.plan, changed.plan)
+
 if __name__ == '__main__':
     unittest.main()
 
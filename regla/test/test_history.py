@@ -0,0 +1,159 @@
+import unittest
+import threading
+
+from ..models.history_models import RuleHistorySink
+
+
+class Collection:
+    def __init__(self):
+        self.writes = []
+        self.fail = False
+
+    def insert_many(self, documents):
+        if self.fail:
+            raise ConnectionError('unavailable')
+        self.writes.append(list(documents))
+
+    def find(self, filter):
+        return [d for w in self.writes for d in w]
+
+    def aggregate(self, pipeline):
+        return []
+
+
+class BulkWriteError(Exception):
+    def __init__(self, details):
+        super().__init__('batch op errors occurred')
+        self.details = details
+
+
+class PartialCollection(Collection):
+    def insert_many(self, documents):
+        if self.fail:
+            # an ordered bulk write that fails at its second document, assigning ids to every document
+            for document in documents:
+                document.setdefault('_id', id(document))
+            self.writes.append(list(documents[:1]))
+            raise BulkWriteError(details={'nInserted': 1, 'writeErrors': [{'index': 1, 'code': 6}]})
+        super().insert_many(documents)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+class Test_history_sink(unittest.TestCase):
+    def setUp(self):
+        self.collection = Collection()
+        self.clock = Clock()
+        self.sink = RuleHistorySink(collection=self.collection, max_documents=3, flush_interval=10., background=False, clock=self.clock)
+
+    def tearDown(self):
+        self.sink.close()
+
+    def test_size_flush(self):
+        """
+        Test writing buffered history once the buffer is full
+        """
+        self.sink.insert_many([{'targetID': 1}, {'targetID': 2}])
+        self.assertEqual(self.collection.writes, [])
+        self.sink.insert_one({'targetID': 3})
+        self.assertEqual(self.collection.writes, [[{'targetID': 1}, {'targetID': 2}, {'targetID': 3}]])
+
+    def test_time_flush(self):
+        """
+        Test writing buffered history once the flush interval has passed
+        """
+        self.sink.insert_one({'targetID': 1})
+        self.clock.now = 10.
+        self.sink.insert_one({'targetID': 2})
+        self.assertEqual(self.collection.writes, [[{'targetID': 1}, {'targetID': 2}]])
+
+    def test_read_flush(self):
+        """
+        Test flushing buffered history before reading it
+        """
+        self.sink.insert_one({'targetID': 1})
+        self.assertEqual(self.sink.find({}), [{'targetID': 1}])
+
+    def test_read_flush_matching(self):
+        """
+        Test flushing only the buffered history a read could return
+        """
+        self.sink.insert_many([{'ruleID': 1, 'targetID': 1}, {'ruleID': 2, 'targetID': 2}])
+        self.sink.find({'ruleID': 1, 'historyCreationDate': {'$gte': 0}})
+        self.sink.aggregate([{'$match': {'ruleID': 3}}, {'$group': {'_id': '$targetID'}}])
+
+        self.assertEqual(self.collection.writes, [[{'ruleID': 1, 'targetID': 1}]])
+        self.assertEqual(self.sink.buffer, [{'ruleID': 2, 'targetID': 2}])
+
+    def test_buffer_while_writing(self):
+        """
+        Test buffering history while a flush is writing
+        """
+        writing, release = threading.Event(), threading.Event()
+        def insert_many(documents):
+            writing.set()
+            release.wait(5)
+            self.collection.writes.append(list(documents))
+        self.collection.insert_many = insert_many
+        self.sink.insert_one({'targetID': 1})
+        flush = threading.Thread(target=self.sink.flush)
+        flush.start()
+        writing.wait(5)
+
+        self.sink.insert_many([{'targetID': 2}, {'targetID': 3}])
+        self.assertEqual(self.sink.buffer, [{'targetID': 2}, {'targetID': 3}])
+        release.set()
+        flush.join(5)
+        self.sink.flush()
+        self.assertEqual(self.collection.writes, [[{'targetID': 1}], [{'targetID': 2}, {'targetID': 3}]])
+
+    def test_failed_flush(self):
+        """
+        Test keeping history and its callbacks buffered when a write fails
+        """
+        flushed = []
+        self.sink.insert_one({'targetID': 1})
+        self.sink.on_flush(lambda: flushed.append(True))
+        self.collection.fail = True
+        with self.assertRaises(ConnectionError):
+            self.sink.flush()
+        self.assertEqual((self.sink.buffer, flushed), ([{'targetID': 1}], []))
+
+        self.collection.fail = False
+        self.sink.close()
+        self.assertEqual((self.collection.writes, flushed), ([[{'targetID': 1}]], [True]))
+
+    def test_partial_flush(self):
+        """
+        Test buffering only the history a partially failed write did not insert
+        """
+        collection = PartialCollection()
+        sink = RuleHistorySink(collection=collection, max_documents=10, flush_interval=None, background=False)
+        sink.insert_many([{'targetID': 1}, {'targetID': 2}, {'targetID': 3}])
+        collection.fail = True
+        with self.assertRaises(BulkWriteError):
+            sink.flush()
+        self.assertEqual([d['targetID'] for d in sink.buffer], [2, 3])
+
+        collection.fail = False
+        sink.close()
+        self.assertEqual([d['targetID'] for d in collection.find({})], [1, 2, 3])
+
+    def test_background_flush(self):
+        """
+        Test flushing buffered history from the background thread
+        """
+        with RuleHistorySink(collection=self.collection, flush_interval=0.01) as sink:
+            sink.insert_one({'targetID': 1})
+            sink.stopped.wait(0.5)
+            self.assertEqual(self.collection.writes, [[{'targetID': 1}]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+
+from ..models.context_models import RuleContext
+from ..models.action_models import RuleActionReportColumn, RuleActionLog, RuleActionTargetType, RuleActionAdjustmentType
+from ..models.journal_models import RuleMutationJournal, RuleJournalStatus
+from ..models.action_types import RuleActionType
+from ..models.rule_model import Rule, RuleConnection, RuleTask
+from .test_actions import SingleMutationAction, BatchMutationAction, action_report
+
+
+class HistoryCollection(list):
+    def insert_many(self, documents):
+        self.extend(documents)
+
+
+class Test_mutation_journal(unittest.TestCase):
+    def setUp(self):
+        class Rule:
+            _id = 'rule'
+        class Channel:
+            identifier = 'channel'
+            mutation_workers = 1
+            mutation_rate_limiter = None
+        self.directory = tempfile.TemporaryDirectory()
+        self.journal = RuleMutationJournal(path=os.path.join(self.directory.name, 'journal.db'))
+        self.context = {
+            RuleContext.rule.value: Rule(),
+            RuleContext.channel.value: Channel(),
+            RuleContext.mutation_journal.value: self.journal,
+        }
+
+    def tearDown(self):
+        self.journal.close()
+        self.directory.cleanup()
+
+    def report(self):
+        report = action_report([1., 2., 3.])
+        report[RuleActionReportColumn.adjustment.value] = [2., 4., 6.]
+        report[RuleActionReportColumn.api_request.value] = True
+        report[RuleActionReportColumn.api_response.value] = None
+        report[RuleActionReportColumn.dry_run.value] = False
+        report[RuleActionReportColumn.log.value] = RuleActionLog(targetID='0', targetType=RuleActionTargetType.campaign, adjustmentType=RuleActionAdjustmentType.budget, adjustmentFrom=1., adjustmentTo=2., actionDescription='adjusted budget')
+        return report
+
+    def statuses(self):
+        return {e.target_id: e.status for e in self.journal.entries(rule_id='rule', statuses=list(RuleJournalStatus))}
+
+    def test_commit(self):
+        """
+        Test journaling mutations before and after they are committed
+        """
+        for action in [SingleMutationAction(adjustmentValue=2., adjustmentLimit=10.), BatchMutationAction(adjustmentValue=2., adjustmentLimit=10.)]:
+            action.commit_action_report_requests(api=None, action_report=self.report(), context=self.context)
+            self.assertEqual(self.statuses(), {'0': RuleJournalStatus.committed, '1': RuleJournalStatus.failed, '2': RuleJournalStatus.committed})
+            self.journal.mark_logged(rule_id='rule')
+            self.assertEqual(self.journal.entries(rule_id='rule', statuses=[RuleJournalStatus.pending, RuleJournalStatus.committed]), [])
+
+    def test_pending(self):
+        """
+        Test reading back pending mutations for replay
+        """
+        report = self.report()
+        ids = self.journal.record(rule_id='rule', channel_identifier='channel', action=SingleMutationAction(adjustmentValue=2., adjustmentLimit=10.), entities=[report.loc[i] for i in report.index])
+        self.journal.mark_committed(id=ids[0], response={'mutated': '0'})
+
+        entries = self.journal.entries(rule_id='rule', statuses=[RuleJournalStatus.pending])
+        self.assertEqual([e.target_id for e in entries], ['1', '2'])
+        self.assertEqual(entries[1].entity_series[RuleActionReportColumn.adjustment.value], 6.)
+        self.assertEqual((entries[1].adjustment_value, entries[1].adjustment_limit), (2., 10.))
+        self.assertEqual(RuleActionLog.logWithDBRepresentation(entries[1].log).dbRepresentation, report.log[2].dbRepresentation)
+
+    def test_recover(self):
+        """
+        Test replaying a pending mutation and logging it with the date of the data it was decided on
+        """
+        class Channel:
+            identifier = 'channel'
+            title = 'Channel'
+            api = None
+        action = SingleMutationAction(type=RuleActionType.increaseBid, adjustmentValue=2., adjustmentLimit=10.)
+        rule = Rule(ruleID='rule', userID='5c9a7d2e8f1b4a0012345678', metadata={'campaignName': 'campaign', 'adGroupName': 'ad group', 'description': 'rule'}, tasks=[RuleTask(actions=[action])])
+        history = HistoryCollection()
+        rule.connection = RuleConnection(options={
+            RuleContext.channel.value: Channel(),
+            RuleContext.channel_context.value: self.context,
+            RuleContext.history_collection.value: history,
+            RuleContext.mutation_journal.value: self.journal,
+        })
+        report = self.report()
+        report[RuleActionReportColumn.last_data_checked_date.value] = pd.Timestamp(2020, 1, 9)
+        self.journal.record(rule_id='rule', channel_identifier='channel', action=action, entities=[report.loc[2]])
+
+        entries = rule.recoverMutations()
+
+        self.assertEqual([e.status for e in entries], [RuleJournalStatus.committed])
+        self.assertEqual(len(history), 1)
+        self.assertEqual(history[0]['targetID'], report.log[2].dbRepresentation['targetID'])
+        self.assertEqual(history[0]['lastDataCheckedDate'], pd.Timestamp(2020, 1, 9))
+        self.assertEqual(self.statuses(), {'2': RuleJournalStatus.logged})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -170,6 +170,34 @@ class Test_kpi(unittest.TestCase):
         }
         assert_frame_equal(df.loc[:, ["keywordId", "reavgCPA"]], pd.DataFrame(d))
 
+    def test_multiple_kpis(self):
+        """
+        Test adding data for several KPIs at once
+        """
+        d = {
+            "keywordId": pd.Series([1, 2, 1]),
+            "localSpend": pd.Series([1., 2., 3.]),
+            "impressions": pd.Series([4., 0., 4.]),
+            "taps": pd.Series([1., 0., 3.]),
+            "installs": pd.Series([0., 1., 2.]),
+             }
+        df = pd.DataFrame(d)
+
+        RuleKPI.addRequiredColumnsForKPIs(df, kpis=[RuleKPI.cpa, RuleKPI.cpt, RuleKPI.ttr], groupByID="keywordId")
+
+        dataIndex = [0, 1, 2]
+        d = {
+            "keywordId": pd.Series([1, 2, 1], index=dataIndex),
+            "totalSpend": pd.Series([4., 2., 4.], index=dataIndex),
+            "totalImpressions": pd.Series([8., 0., 8.], index=dataIndex),
+            "totalTaps": pd.Series([4., 0., 4.], index=dataIndex),
+            "totalConversions": pd.Series([2., 1., 2.], index=dataIndex),
+            "reavgCPA": pd.Series([2., 2., 2.], index=dataIndex),
+            "reavgCPT": pd.Series([1., np.nan, 1.], index=dataIndex),
+            "reavgTTR": pd.Series([0.5, np.nan, 0.5], index=dataIndex),
+        }
+        assert_frame_equal(df.loc[:, list(d.keys())], pd.DataFrame(d))
+
 class Test_kpi_selection(unittest.TestCase):
     def test_spend(self):
         """
@@ -0,0 +1,51 @@
+import unittest
+import importlib.util
+import pandas as pd
+from datetime import datetime
+
+from ..models.monitor_models import RuleMonitorFormat
+from ..models.action_models import RuleActionLog, RuleActionTargetType
+
+
+class Test_monitor_format(unittest.TestCase):
+    def setUp(self):
+        self.report = pd.DataFrame({
+            "date": [datetime(2020, 1, 1), datetime(2020, 1, 2)],
+            "campaignId": [1, 2],
+            "localSpend": [1.5, None],
+        }, index=[3, 7])
+        self.action_report = pd.DataFrame({
+            "target_id": ['1', '2'],
+            "log": [RuleActionLog(targetID='1', targetType=RuleActionTargetType.campaign), None],
+            "preference_messages": [['capped'], []],
+        })
+
+    def test_csv(self):
+        """
+        Test keeping the CSV monitor layout
+        """
+        self.assertFalse(RuleMonitorFormat.csv.shares_source_report)
+        self.assertEqual(RuleMonitorFormat.csv.encode(self.report), self.report.to_csv())
+
+    def test_columnar_frame(self):
+        """
+        Test storing action report objects by their string representation
+        """
+        frame = RuleMonitorFormat.columnar_frame(self.action_report)
+        self.assertEqual(list(frame.preference_messages), ["['capped']", "[]"])
+        self.assertIsInstance(frame.log[0], str)
+        self.assertTrue(pd.isna(frame.log[1]))
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_parquet(self):
+        """
+        Test round-tripping monitor reports through Parquet
+        """
+        self.assertTrue(RuleMonitorFormat.parquet.shares_source_report)
+        decoded = RuleMonitorFormat.parquet.decode(RuleMonitorFormat.parquet.encode(self.report))
+        pd.testing.assert_frame_equal(decoded, self.report, check_freq=False, check_index_type=False)
+        self.assertIsInstance(RuleMonitorFormat.parquet.encode(self.action_report), bytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import unittest
+import threading
+import pandas as pd
+from datetime import datetime, timedelta
+
+from ..models.context_models import RuleContext, RuleOption
+from ..models.action_models import RuleMultiplierAction, RuleActionReportColumn, RuleActionAdjustmentType, RuleActionTargetType
+from ..models.mutation_models import RuleMutationCoalescer
+
+
+class CoalescedBudgetAction(RuleMultiplierAction):
+    mutations = []
+
+    @property
+    def adjustment_type(self):
+        return RuleActionAdjustmentType.budget
+
+    @property
+    def entity_granularity(self):
+        return RuleActionTargetType.campaign
+
+    def get_entity_ids(self, report, context):
+        return ['1']
+
+    def get_raw_action_report(self, entity_ids, api, report, context):
+        return pd.DataFrame({
+            RuleActionReportColumn.target_id.value: ['1'],
+            RuleActionReportColumn.target_name.value: ['campaign'],
+            RuleActionReportColumn.unadjusted_state.value: [10.],
+        })
+
+    def history_lookback(self, context):
+        return timedelta()
+
+    def action_description(self, entity_series, context):
+        return 'adjusted budget'
+
+    def entity_request(self, entity_series, api, context):
+        return True
+
+    def mutate_entity(self, entity_series, api, context):
+        CoalescedBudgetAction.mutations.append((entity_series[RuleActionReportColumn.unadjusted_state.value], entity_series[RuleActionReportColumn.adjustment.value]))
+        return {'mutated': True}
+
+
+class FailingBudgetAction(CoalescedBudgetAction):
+    def mutate_entity(self, entity_series, api, context):
+        raise ValueError('rejected')
+
+
+class HistoryRule:
+    safe_mode = False
+    channel_identifier = 'channel'
+
+    def __init__(self, _id='rule'):
+        self._id = _id
+        self.histories = []
+
+    def logDeferredHistory(self, logs, errors):
+        self.histories.append((logs, errors))
+
+
+class Test_mutation_coalescer(unittest.TestCase):
+    def setUp(self):
+        class Channel:
+            identifier = 'channel'
+            mutation_rate_limiter = None
+        CoalescedBudgetAction.mutations = []
+        self.coalescer = RuleMutationCoalescer()
+        self.rule = HistoryRule()
+        self.context = {
+            RuleContext.now.value: datetime(2020, 1, 10),
+            RuleContext.rule.value: self.rule,
+            RuleContext.channel.value: Channel(),
+            RuleContext.rule_options.value: RuleOption.get_defaults(),
+            RuleContext.mutation_coalescer.value: self.coalescer,
+        }
+        self.report = pd.DataFrame({"campaignId": [1]})
+
+    def adjust(self, value, limit, action_class=CoalescedBudgetAction):
+        return action_class(adjustmentValue=value, adjustmentLimit=limit).adjust(api=None, campaign=self.context, report=self.report, dryRun=False)
+
+    def test_net_mutation(self):
+        """
+        Test merging adjustments of the same target into one mutation
+        """
+        first = self.adjust(1.2, 100.)
+        second = self.adjust(1.5, 15.)
+
+        self.assertEqual(first.logs[0].adjustmentFrom, 10.)
+        self.assertEqual(first.logs[0].adjustmentTo, 12.)
+        self.assertEqual(second.logs[0].adjustmentFrom, 12.)
+        self.assertEqual(second.logs[0].adjustmentTo, 15.)
+        self.assertEqual(CoalescedBudgetAction.mutations, [])
+
+        mutations = self.coalescer.flush()
+        self.assertEqual(CoalescedBudgetAction.mutations, [(10., 15.)])
+        self.assertEqual(mutations[0].contributions, 2)
+        self.assertEqual(mutations[0].response, {'mutated': True})
+
+    def test_deferred_history(self):
+        """
+        Test logging deferred mutations only once they are sent
+        """
+        result = self.adjust(1.2, 100.)
+        date = datetime(2020, 1, 9)
+
+        self.assertEqual(self.coalescer.defer_history(logs=result.logs, last_data_checked_date=date), [])
+        self.assertEqual(self.rule.histories, [])
+
+        self.coalescer.flush()
+        self.assertEqual(self.rule.histories, [([(result.logs[0], date)], [])])
+
+    def test_failed_history(self):
+        """
+        Test logging an error instead of the logs of a failed mutation
+        """
+        result = self.adjust(1.2, 100., action_class=FailingBudgetAction)
+        self.coalescer.defer_history(logs=result.logs, last_data_checked_date=datetime(2020, 1, 9))
+
+        mutations = self.coalescer.flush()
+        self.assertEqual(self.rule.histories, [([], [mutations[0].error])])
+
+    def test_noop(self):
+        """
+        Test skipping mutations that cancel out
+        """
+        self.adjust(2., 100.)
+        self.adjust(0.5, 1.)
+
+        mutations = self.coalescer.flush()
+        self.assertTrue(mutations[0].is_noop)
+        self.assertEqual(CoalescedBudgetAction.mutations, [])
+
+    def test_noop_tolerance(self):
+        """
+        Test skipping mutations that cancel out up to floating point error
+        """
+        self.adjust(2.3, 100.)
+        self.adjust(1 / 2.3, 1.)
+
+        mutations = self.coalescer.flush()
+        self.assertNotEqual(mutations[0].state, mutations[0].original_state)
+        self.assertTrue(mutations[0].is_noop)
+        self.assertEqual(CoalescedBudgetAction.mutations, [])
+
+    def test_turn(self):
+        """
+        Test chaining the rules of a channel in rule ID order
+        """
+        first, second = HistoryRule(_id='1'), HistoryRule(_id='2')
+        self.coalescer.expect(rules=[first, second])
+        order = []
+        waiting = threading.Thread(target=lambda: (self.coalescer.wait_turn(rule=second), order.append(second._id)))
+        waiting.start()
+        waiting.join(timeout=0.1)
+        self.assertTrue(waiting.is_alive())
+
+        self.coalescer.wait_turn(rule=first)
+        order.append(first._id)
+        self.coalescer.finish(rule=first)
+        waiting.join(timeout=5)
+        self.assertEqual(order, ['1', '2'])
+
+if __name__ == '__main__':
+    unittest.main()
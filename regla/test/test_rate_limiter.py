@@ -0,0 +1,58 @@
+import unittest
+
+from ..models.rate_limit_models import RuleRateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.time = 0.
+        self.sleeps = []
+
+    def __call__(self):
+        return self.time
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.time += seconds
+
+
+class Test_rate_limiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+
+    def test_burst(self):
+        """
+        Test acquiring a burst without waiting
+        """
+        limiter = RuleRateLimiter(rate=2., burst=3., clock=self.clock, sleep=self.clock.sleep)
+        for _ in range(3):
+            limiter.acquire()
+
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_rate(self):
+        """
+        Test waiting for tokens at the configured rate
+        """
+        limiter = RuleRateLimiter(rate=2., burst=1., clock=self.clock, sleep=self.clock.sleep)
+        for _ in range(3):
+            limiter.acquire()
+
+        self.assertEqual(self.clock.sleeps, [0.5, 0.5])
+        self.assertEqual(self.clock.time, 1.)
+
+    def test_channel_limiter(self):
+        """
+        Test sharing limiters by channel
+        """
+        first = RuleRateLimiter.channel_limiter(channel_identifier="channel", rate=5.)
+        second = RuleRateLimiter.channel_limiter(channel_identifier="channel", rate=5.)
+        reconfigured = RuleRateLimiter.channel_limiter(channel_identifier="channel", rate=10., burst=2.)
+        other = RuleRateLimiter.channel_limiter(channel_identifier="other", rate=5.)
+
+        self.assertIs(first, second)
+        self.assertIs(first, reconfigured)
+        self.assertIsNot(first, other)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,524 @@
+import os
+import unittest
+import tempfile
+import threading
+import pandas as pd
+from datetime import datetime, timedelta
+from pandas.util.testing import assert_frame_equal, assert_index_equal
+
+from ..models.report_models import RuleReporter, RuleReportType, RuleReportGranularity, RuleRawReportStore, RuleIncrementalRawReportStore
+from ..models.report_cache_models import RuleRawReportCache
+from ..models.rule_model import Rule, RuleConnection, RuleTask
+from ..models.action_types import RuleActionType
+from ..models.context_models import RuleContext
+from ..errors import RuleReportersError
+
+
+class CountingReporter(RuleReporter):
+    fetchCount = 0
+
+    def _getRawReport(self, startDate, endDate, granularity, api, campaign, adGroupIDs):
+        CountingReporter.fetchCount += 1
+        return pd.DataFrame({
+            "keywordId": pd.Series([1, 2]),
+            "date": pd.Series([startDate, endDate]),
+        })
+
+
+class Test_raw_report_store(unittest.TestCase):
+    def setUp(self):
+        CountingReporter.fetchCount = 0
+        self.startDate = datetime(2020, 1, 1)
+        self.endDate = datetime(2020, 1, 2)
+
+    def fetch(self, store, reporter, campaign):
+        key = reporter.raw_report_key(startDate=self.startDate, endDate=self.endDate, granularity=RuleReportGranularity.daily, campaign=campaign)
+        store.fetchRawReport(key=key, reporter=reporter, startDate=self.startDate, endDate=self.endDate, granularity=RuleReportGranularity.daily, api=None, campaign=campaign)
+
+    def test_shared_fetch(self):
+        """
+        Test fetching a raw report once for reporters with the same key
+        """
+        store = RuleRawReportStore()
+        first = CountingReporter(reportType=RuleReportType.keyword)
+        second = CountingReporter(reportType=RuleReportType.keyword)
+        self.fetch(store, first, campaign="first")
+        self.fetch(store, second, campaign="second")
+
+        self.assertEqual(CountingReporter.fetchCount, 1)
+        self.assertEqual(second.context, "second")
+        self.assertEqual(second.fetch_raw_report_time, first.fetch_raw_report_time)
+        assert_frame_equal(second.rawReport, first.rawReport)
+
+    def test_distinct_fetch(self):
+        """
+        Test fetching a raw report for each distinct report type
+        """
+        store = RuleRawReportStore()
+        self.fetch(store, CountingReporter(reportType=RuleReportType.keyword), campaign=None)
+        self.fetch(store, CountingReporter(reportType=RuleReportType.adGroup), campaign=None)
+
+        self.assertEqual(CountingReporter.fetchCount, 2)
+
+class Clock:
+    def __init__(self):
+        self.now = datetime(2020, 1, 2, 12)
+
+    def __call__(self):
+        return self.now
+
+
+class Test_raw_report_cache(unittest.TestCase):
+    def setUp(self):
+        CountingReporter.fetchCount = 0
+        self.startDate = datetime(2020, 1, 1)
+        self.endDate = datetime(2020, 1, 2)
+        self.clock = Clock()
+
+    fetch = Test_raw_report_store.fetch
+
+    def test_cached_copy(self):
+        """
+        Test handing out copies of cached raw reports
+        """
+        cache = RuleRawReportCache(clock=self.clock)
+        first = CountingReporter(reportType=RuleReportType.keyword)
+        second = CountingReporter(reportType=RuleReportType.keyword)
+        self.fetch(cache, first, campaign=None)
+        first.rawReport.drop(first.rawReport.index, inplace=True)
+        self.fetch(cache, second, campaign=None)
+
+        self.assertEqual(CountingReporter.fetchCount, 1)
+        self.assertEqual(len(second.rawReport), 2)
+        self.assertEqual((cache.metrics['hits'], cache.metrics['misses']), (1, 1))
+
+    def test_expiration(self):
+        """
+        Test fetching raw reports again once their granularity's TTL has passed
+        """
+        cache = RuleRawReportCache(ttls={RuleReportGranularity.daily: timedelta(minutes=10)}, clock=self.clock)
+        self.fetch(cache, CountingReporter(reportType=RuleReportType.keyword), campaign=None)
+        self.clock.now += timedelta(minutes=10)
+        self.fetch(cache, CountingReporter(reportType=RuleReportType.keyword), campaign=None)
+
+        self.assertEqual(CountingReporter.fetchCount, 2)
+        self.assertEqual(cache.metrics['expirations'], 1)
+
+    def test_eviction(self):
+        """
+        Test evicting the least recently used raw reports beyond the byte limit
+        """
+        cache = RuleRawReportCache(clock=self.clock)
+        self.fetch(cache, CountingReporter(reportType=RuleReportType.keyword), campaign=None)
+        cache.max_bytes = cache.size
+        self.fetch(cache, CountingReporter(reportType=RuleReportType.adGroup), campaign=None)
+        self.fetch(cache, CountingReporter(reportType=RuleReportType.adGroup), campaign=None)
+        self.fetch(cache, CountingReporter(reportType=RuleReportType.keyword), campaign=None)
+
+        self.assertEqual(CountingReporter.fetchCount, 3)
+        self.assertEqual(cache.metrics['evictions'], 2)
+        self.assertLessEqual(cache.size, cache.max_bytes)
+
+    def test_disk(self):
+        """
+        Test reading raw reports back from the disk tier
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            self.fetch(RuleRawReportCache(directory=directory, clock=self.clock), CountingReporter(reportType=RuleReportType.keyword), campaign=None)
+            cache = RuleRawReportCache(directory=directory, clock=self.clock)
+            reporter = CountingReporter(reportType=RuleReportType.keyword)
+            self.fetch(cache, reporter, campaign=None)
+
+        self.assertEqual(CountingReporter.fetchCount, 1)
+        self.assertEqual(cache.metrics['disk_hits'], 1)
+        self.assertEqual(list(reporter.rawReport.keywordId), [1, 2])
+
+    def test_disk_limit(self):
+        """
+        Test pruning the disk tier beyond its byte limit
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            cache = RuleRawReportCache(directory=directory, clock=self.clock)
+            self.fetch(cache, CountingReporter(reportType=RuleReportType.keyword), campaign=None)
+            cache.max_disk_bytes = sum(f.stat().st_size for f in os.scandir(directory))
+            self.fetch(cache, CountingReporter(reportType=RuleReportType.adGroup), campaign=None)
+            files = os.listdir(directory)
+
+        self.assertEqual(len(files), 1)
+        self.assertEqual(cache.metrics['disk_evictions'], 1)
+
+    def test_roll_up(self):
+        """
+        Test rolling cached finer reports up and releasing them on eviction
+        """
+        HourlyReporter.fetchCount = 0
+        cache = self.store = RuleRawReportCache(clock=self.clock)
+        hourly = Test_roll_up_raw_report.fetch(self, RuleReportGranularity.hourly)
+        daily = Test_roll_up_raw_report.fetch(self, RuleReportGranularity.daily)
+        held = cache.held_reporters[daily.raw_report_series_key(campaign=None)]
+
+        self.assertEqual(HourlyReporter.fetchCount, 1)
+        self.assertEqual(list(daily.rawReport.localSpend), [4., 2., 5.])
+        self.assertEqual([h[3] for h in held], [RuleReportGranularity.hourly, RuleReportGranularity.daily])
+        self.assertFalse(any(h[0] is hourly or h[0] is daily for h in held))
+        self.assertEqual([id(h[0].rawReport) for h in held], [id(e.raw_report) for e in cache.entries.values()])
+        self.assertEqual(set(cache.key_locks), set(cache.entries))
+
+        cache.clear()
+        self.assertEqual((cache.held_reporters, cache.held_keys, cache.key_locks), ({}, {}, {}))
+
+class DailyReporter(RuleReporter):
+    fetches = []
+    conversions = 1
+
+    def _getRawReport(self, startDate, endDate, granularity, api, campaign, adGroupIDs):
+        DailyReporter.fetches.append((startDate, endDate))
+        dates = pd.date_range(startDate, endDate, freq='D')
+        return pd.DataFrame({
+            "campaignId": [1] * len(dates),
+            "date": dates,
+            "installs": [DailyReporter.conversions] * len(dates),
+        })
+
+
+class MetricDailyReporter(DailyReporter):
+    @property
+    def raw_report_metric_columns(self):
+        return ["installs"]
+
+
+class Test_incremental_raw_report_store(unittest.TestCase):
+    def setUp(self):
+        DailyReporter.fetches = []
+        DailyReporter.conversions = 1
+        self.store = RuleIncrementalRawReportStore(lookback=timedelta(days=1), refresh_interval=timedelta())
+
+    def fetch(self, startDate, endDate, granularity=RuleReportGranularity.daily, reporterType=DailyReporter):
+        reporter = reporterType(reportType=RuleReportType.campaign)
+        self.store.fetchRawReport(key=reporter.raw_report_key(startDate=startDate, endDate=endDate, granularity=granularity, campaign=None), reporter=reporter, startDate=startDate, endDate=endDate, granularity=granularity, api=None, campaign=None, seriesKey=reporter.raw_report_series_key(campaign=None))
+        return reporter
+
+    def test_incremental_fetch(self):
+        """
+        Test fetching only the restatement lookback and new periods of a sliding window
+        """
+        self.fetch(datetime(2020, 1, 1), datetime(2020, 1, 10))
+        DailyReporter.conversions = 2
+        reporter = self.fetch(datetime(2020, 1, 2), datetime(2020, 1, 11))
+
+        self.assertEqual(DailyReporter.fetches, [(datetime(2020, 1, 1), datetime(2020, 1, 10)), (datetime(2020, 1, 9), datetime(2020, 1, 11))])
+        self.assertEqual(list(reporter.rawReport.date), list(pd.date_range(datetime(2020, 1, 2), datetime(2020, 1, 11), freq='D')))
+        self.assertEqual(list(reporter.rawReport.installs), [1] * 7 + [2] * 3)
+
+    def test_full_fetch(self):
+        """
+        Test fetching the whole window when stored data cannot be extended
+        """
+        self.fetch(datetime(2020, 1, 5), datetime(2020, 1, 10))
+        self.fetch(datetime(2020, 1, 1), datetime(2020, 1, 10))
+        self.fetch(datetime(2020, 1, 1), datetime(2020, 1, 10), granularity=RuleReportGranularity.weekly)
+
+        self.assertEqual(DailyReporter.fetches, [(datetime(2020, 1, 5), datetime(2020, 1, 10)), (datetime(2020, 1, 1), datetime(2020, 1, 10)), (datetime(2020, 1, 1), datetime(2020, 1, 10))])
+
+    def test_held_reports(self):
+        """
+        Test reusing and rolling up recently fetched reports by key
+        """
+        self.store.refresh_interval = timedelta(minutes=5)
+        daily = self.fetch(datetime(2020, 1, 1), datetime(2020, 1, 10), reporterType=MetricDailyReporter)
+        reused = self.fetch(datetime(2020, 1, 1), datetime(2020, 1, 10), reporterType=MetricDailyReporter)
+        weekly = self.fetch(datetime(2020, 1, 1), datetime(2020, 1, 10), granularity=RuleReportGranularity.weekly, reporterType=MetricDailyReporter)
+
+        self.assertEqual(DailyReporter.fetches, [(datetime(2020, 1, 1), datetime(2020, 1, 10))])
+        self.assertIs(reused.rawReport, daily.rawReport)
+        self.assertEqual(weekly.rawReport.installs.sum(), 10)
+        self.assertEqual(len(self.store.raw_reporters), 2)
+        self.assertEqual(len(self.store.held_reporters[daily.raw_report_series_key(campaign=None)]), 2)
+
+        self.store.refresh_interval = timedelta()
+        self.store.expireRawReports()
+        self.assertEqual((self.store.raw_reporters, self.store.held_reporters), ({}, {}))
+
+
+class HourlyReporter(RuleReporter):
+    fetchCount = 0
+
+    @property
+    def raw_report_metric_columns(self):
+        return ["localSpend", "installs"]
+
+    @property
+    def raw_report_ratio_columns(self):
+        return {"avgCPA": ("localSpend", "installs")}
+
+    def _getRawReport(self, startDate, endDate, granularity, api, campaign, adGroupIDs):
+        HourlyReporter.fetchCount += 1
+        dates = [datetime(2020, 1, 1, 10), datetime(2020, 1, 1, 11), datetime(2020, 1, 2, 10), datetime(2020, 1, 1, 10)]
+        return pd.DataFrame({
+            "campaignId": [1, 1, 1, 2],
+            "date": dates,
+            "status": ["ENABLED", "PAUSED", "PAUSED", "ENABLED"],
+            "localSpend": [1., 3., 2., 5.],
+            "installs": [1, 1, 0, 0],
+            "avgCPA": [1., 3., None, None],
+        })
+
+
+class Test_roll_up_raw_report(unittest.TestCase):
+    def setUp(self):
+        HourlyReporter.fetchCount = 0
+        self.store = RuleRawReportStore()
+
+    def fetch(self, granularity, startDate=datetime(2020, 1, 1), endDate=datetime(2020, 1, 2)):
+        reporter = HourlyReporter(reportType=RuleReportType.campaign)
+        self.store.fetchRawReport(key=reporter.raw_report_key(startDate=startDate, endDate=endDate, granularity=granularity, campaign=None), reporter=reporter, startDate=startDate, endDate=endDate, granularity=granularity, api=None, campaign=None, seriesKey=reporter.raw_report_series_key(campaign=None))
+        return reporter
+
+    def test_daily(self):
+        """
+        Test rolling a held hourly report up to daily periods
+        """
+        hourly = self.fetch(RuleReportGranularity.hourly)
+        daily = self.fetch(RuleReportGranularity.daily)
+
+        self.assertEqual(HourlyReporter.fetchCount, 1)
+        self.assertEqual(daily.fetch_raw_report_time, hourly.fetch_raw_report_time)
+        self.assertEqual(list(daily.rawReport.columns), list(hourly.rawReport.columns))
+        self.assertEqual(list(daily.rawReport.date), [datetime(2020, 1, 1), datetime(2020, 1, 2), datetime(2020, 1, 1)])
+        self.assertEqual(list(daily.rawReport.localSpend), [4., 2., 5.])
+        self.assertEqual(list(daily.rawReport.status), ["PAUSED", "PAUSED", "ENABLED"])
+        self.assertEqual(list(daily.rawReport.avgCPA.fillna(-1)), [2., -1, -1])
+
+    def test_weekly(self):
+        """
+        Test rolling a held hourly report up to weekly periods
+        """
+        self.fetch(RuleReportGranularity.hourly)
+        weekly = self.fetch(RuleReportGranularity.weekly)
+
+        self.assertEqual(HourlyReporter.fetchCount, 1)
+        self.assertEqual(list(weekly.rawReport.date), [datetime(2019, 12, 30)] * 2)
+        self.assertEqual(list(weekly.rawReport.localSpend), [6., 5.])
+
+    def test_unsorted(self):
+        """
+        Test rolling up the latest attributes of a report that is not in date order
+        """
+        reporter = HourlyReporter(reportType=RuleReportType.campaign)
+        rawReport = reporter._getRawReport(startDate=None, endDate=None, granularity=None, api=None, campaign=None, adGroupIDs=None)
+        daily = reporter.rollUpRawReport(rawReport=rawReport.iloc[::-1], startDate=datetime(2020, 1, 1), endDate=datetime(2020, 1, 2), granularity=RuleReportGranularity.daily)
+
+        self.assertEqual(list(daily.status), ["PAUSED", "PAUSED", "ENABLED"])
+        self.assertEqual(list(daily.localSpend), [4., 2., 5.])
+
+    def test_uncovered_window(self):
+        """
+        Test fetching when no finer report covers the window
+        """
+        self.fetch(RuleReportGranularity.hourly)
+        self.fetch(RuleReportGranularity.daily, endDate=datetime(2020, 1, 3))
+        self.fetch(RuleReportGranularity.hourly, startDate=datetime(2020, 1, 2))
+
+        self.assertEqual(HourlyReporter.fetchCount, 3)
+
+
+class BarrierReporter(RuleReporter):
+    def __init__(self, barrier, **kwargs):
+        super().__init__(**kwargs)
+        self.barrier = barrier
+
+    def _getRawReport(self, startDate, endDate, granularity, api, campaign, adGroupIDs):
+        # both report types must be fetching at the same time to pass the barrier
+        self.barrier.wait()
+        if self.reportType is RuleReportType.adGroup and api == "failing":
+            raise ValueError("report unavailable")
+        return pd.DataFrame({"date": [startDate]})
+
+
+class ReportTypeChannel:
+    def __init__(self, api, parties=2):
+        self.api = api
+        self.barrier = threading.Barrier(parties, timeout=5)
+
+    def report_type(self, action_type):
+        return RuleReportType.keyword if action_type is RuleActionType.increaseBid else RuleReportType.adGroup
+
+    def highest_compatible_granularity(self, report_type, start_date, end_date):
+        return RuleReportGranularity.daily
+
+    def rule_reporter(self, report_type, ad_group_id, rule_id, data_check_range):
+        return BarrierReporter(barrier=self.barrier, reportType=report_type)
+
+
+class Test_rule_reporters(unittest.TestCase):
+    def rule(self, api, actionTypes=[RuleActionType.increaseBid, RuleActionType.increaseCPAGoal]):
+        class Action:
+            def __init__(self, type):
+                self.type = type
+        rule = Rule(ruleID="5c9a7d2e8f1b4a0012345678", tasks=[RuleTask(actions=[Action(t)]) for t in actionTypes])
+        rule.connection = RuleConnection(options={
+            RuleContext.channel.value: ReportTypeChannel(api=api, parties=len(actionTypes)),
+            RuleContext.channel_context.value: None,
+        })
+        return rule
+
+    def test_concurrent_fetch(self):
+        """
+        Test fetching each report type concurrently
+        """
+        processed = []
+        reporters = self.rule(api="api").getReporters(startDate=datetime(2020, 1, 1), endDate=datetime(2020, 1, 2), processor=lambda r: processed.append(r.reportType))
+
+        self.assertEqual(list(reporters), [RuleReportType.keyword.value, RuleReportType.adGroup.value])
+        self.assertEqual(processed, [RuleReportType.keyword, RuleReportType.adGroup])
+
+    def test_reporter_errors(self):
+        """
+        Test surfacing fetch errors by report type
+        """
+        with self.assertRaises(RuleReportersError) as context:
+            self.rule(api="failing").getReporters(startDate=datetime(2020, 1, 1), endDate=datetime(2020, 1, 2))
+
+        self.assertEqual([e.report_type for e in context.exception.errors], [RuleReportType.adGroup.value])
+        self.assertIsInstance(context.exception.errors[0].error, ValueError)
+        self.assertIs(context.exception.__cause__, context.exception.errors[0].error)
+
+    def test_single_reporter_error(self):
+        """
+        Test raising the fetch error of a single report type unchanged
+        """
+        with self.assertRaisesRegex(ValueError, "report unavailable"):
+            self.rule(api="failing", actionTypes=[RuleActionType.increaseCPAGoal]).getReporters(startDate=datetime(2020, 1, 1), endDate=datetime(2020, 1, 2))
+
+
+class HistoryCollection:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def aggregate(self, pipeline):
+        return iter(self.documents)
+
+    def find(self, filter, projection=None):
+        return iter(self.documents)
+
+
+class Test_filter_by_last_action_date(unittest.TestCase):
+    def setUp(self):
+        """
+        Create sample data
+        """
+        d = {
+            "keywordId": pd.Series([1, 1, 1, 2, 2, 3]),
+            "date": pd.Series([datetime(2020, 1, d) for d in [1, 2, 3, 1, 2, 1]]),
+        }
+        self.df = pd.DataFrame(d)
+        self.reporter = RuleReporter(reportType=RuleReportType.keyword, ruleID="rule")
+
+    def test_filter(self):
+        """
+        Test dropping data up to the last action date of each target
+        """
+        history = HistoryCollection([
+            {"_id": 1, "lastActionTakenDate": datetime(2020, 1, 2)},
+            {"_id": 2, "lastActionTakenDate": datetime(2019, 12, 31)},
+            {"_id": 4, "lastActionTakenDate": datetime(2020, 1, 3)},
+        ])
+        self.reporter._filterByLastActionDate(self.df, historyCollection=history)
+        assert_index_equal(self.df.index, pd.Index([2, 3, 4, 5], dtype="int64"))
+
+    def test_empty_history(self):
+        """
+        Test keeping all data without action history
+        """
+        self.reporter._filterByLastActionDate(self.df, historyCollection=HistoryCollection([]))
+        self.assertEqual(len(self.df), 6)
+
+class Test_filter_pipeline(unittest.TestCase):
+    def setUp(self):
+        """
+        Create sample data
+        """
+        self.rawReport = pd.DataFrame({
+            "keywordId": [1, 1, 1, 2, 2, 3, 3],
+            "adGroupId": [7, 7, 7, 7, 7, 8, 7],
+            "date": [datetime(2020, 1, d) for d in [1, 2, 3, 2, 5, 3, 4]],
+            "taps": [0, 1, 1, 1, 1, 1, 0],
+            "installs": [1, 1, 0, 1, 1, 1, 1],
+            "avgCPT": [1., 1., 1., 1., 1., 1., 1.],
+            "avgCPA": [1., 1., 1., 1., 1., 1., 1.],
+        })
+        self.history = HistoryCollection([{"_id": 1, "lastActionTakenDate": datetime(2020, 1, 2)}])
+
+    def reporter(self):
+        return RuleReporter(reportType=RuleReportType.keyword, adGroupID="7", ruleID="rule", dataCheckRange=3 * 24 * 60 * 60 * 1000, rawReport=self.rawReport, fetch_raw_report_time=datetime(2020, 1, 5))
+
+    def test_filter(self):
+        """
+        Test filtering the raw report with every stage's mask at once
+        """
+        reporter = self.reporter()
+        reporter.filterRawReport(historyCollection=self.history)
+
+        assert_index_equal(reporter.report.index, pd.Index([2, 3, 6], dtype="int64"))
+        self.assertEqual(list(reporter.filter_row_counts.items()), [("raw", 7), ("future", 6), ("processed_data", 5), ("ad_group", 4), ("last_action_date", 3)])
+        self.assertEqual(reporter.report.avgCPT.isna().tolist(), [False, False, True])
+        self.assertEqual(reporter.report.avgCPA.isna().tolist(), [True, False, False])
+        self.assertFalse(self.rawReport.avgCPT.isna().any())
+
+    def test_shared_raw_report(self):
+        """
+        Test filtering leaves the raw report shared through the store unchanged
+        """
+        store = RuleRawReportStore()
+        first = self.reporter()
+        second = self.reporter()
+        store.raw_reporters[("keyword",)] = first
+        second.rawReport = None
+        store.fetchRawReport(key=("keyword",), reporter=second, startDate=None, endDate=None, granularity=RuleReportGranularity.daily, api=None, campaign=None)
+        rawReport = store.raw_reporters[("keyword",)].rawReport
+        original = rawReport.copy()
+        first.filterRawReport(historyCollection=self.history)
+        second.filterRawReport(historyCollection=self.history)
+
+        self.assertIs(second.rawReport, rawReport)
+        assert_frame_equal(rawReport, original)
+        assert_frame_equal(second.report, first.report)
+
+    def test_in_place_filter(self):
+        """
+        Test filtering a report in place with the same result
+        """
+        reporter = self.reporter()
+        reporter.filterRawReport(historyCollection=self.history)
+        report = self.rawReport.copy()
+        self.reporter()._filterReport(report, historyCollection=self.history)
+
+        assert_frame_equal(report, reporter.report)
+
+
+class Test_filter_by_action_target(unittest.TestCase):
+    def test_filter(self):
+        """
+        Test counting actions on the latest row of each target at or before the action
+        """
+        d = {
+            "keywordId": pd.Series([1, 1, 1, 2, 2, 3]),
+            "date": pd.Series([datetime(2020, 1, d) for d in [1, 2, 3, 1, 1, 1]]),
+        }
+        df = pd.DataFrame(d)
+        history = HistoryCollection([
+            {"targetID": 1, "historyCreationDate": datetime(2020, 1, 2, 12)},
+            {"targetID": 1, "historyCreationDate": datetime(2020, 1, 3)},
+            {"targetID": 1, "historyCreationDate": datetime(2020, 1, 2)},
+            {"targetID": 2, "historyCreationDate": datetime(2020, 1, 5)},
+            {"targetID": 3, "historyCreationDate": datetime(2019, 12, 31)},
+        ])
+        reporter = RuleReporter(reportType=RuleReportType.keyword, ruleID="rule")
+        reporter._filterByActionTarget(df, historyCollection=history)
+
+        assert_index_equal(df.index, pd.Index([0, 1, 2, 3, 4], dtype="int64"))
+        self.assertEqual(df.actions.tolist(), [0, 2, 1, 1, 0])
+        self.assertEqual(df.totalActions.tolist(), [3, 3, 3, 1, 1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import threading
+import time
+
+from ..models.rule_model import Rule
+from ..models.runner_models import RuleRunner
+
+
+class Test_rule_runner(unittest.TestCase):
+    def setUp(self):
+        """
+        Create sample rules
+        """
+        self.rules = [Rule(channel_identifier="first", ruleID=i) for i in range(6)] + [Rule(channel_identifier="second", ruleID=i) for i in range(6, 9)]
+        self.lock = threading.Lock()
+        self.running = {"first": 0, "second": 0}
+        self.maximum = {"first": 0, "second": 0, "total": 0}
+
+    def task(self, rule):
+        with self.lock:
+            self.running[rule.channel_identifier] += 1
+            self.maximum[rule.channel_identifier] = max(self.maximum[rule.channel_identifier], self.running[rule.channel_identifier])
+            self.maximum["total"] = max(self.maximum["total"], sum(self.running.values()))
+        time.sleep(0.01)
+        with self.lock:
+            self.running[rule.channel_identifier] -= 1
+        if rule._id == 3:
+            raise ValueError("task error", rule._id)
+        return rule._id
+
+    def test_channel_limits(self):
+        """
+        Test running rules within per-channel and global limits
+        """
+        runner = RuleRunner(max_workers=3, channel_limits={"first": 2, "second": None})
+        results = runner.run(rules=self.rules, task=self.task)
+
+        self.assertEqual([r.rule for r in results], self.rules)
+        self.assertLessEqual(self.maximum["first"], 2)
+        self.assertLessEqual(self.maximum["total"], 3)
+
+    def test_errors(self):
+        """
+        Test capturing errors per rule
+        """
+        runner = RuleRunner(max_workers=4, channel_limits={"first": 1, "second": 1})
+        results = runner.run(rules=self.rules, task=self.task)
+
+        self.assertEqual([r.result for r in results], [0, 1, 2, None, 4, 5, 6, 7, 8])
+        self.assertIsInstance(results[3].error, ValueError)
+        self.assertTrue(all(r.error is None for i, r in enumerate(results) if i != 3))
+        self.assertEqual(self.maximum["first"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
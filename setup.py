@@ -12,4 +12,7 @@ setup(name='regla',
           "pandas",
           "numpy",
       ],
+      extras_require={
+          "parquet": ["pyarrow"],
+      },
       zip_safe=False)